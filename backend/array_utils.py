@@ -0,0 +1,41 @@
+"""
+Array helpers shared by the vectorized scoring and analytics engines
+Each reproduces the result of the equivalent pure-Python loop exactly
+"""
+import numpy as np
+from typing import List
+
+
+class Vocabulary(dict):
+    """name -> code mapping; unseen names get the next code (first-appearance order)"""
+
+    def __missing__(self, key):
+        code = self[key] = len(self)
+        return code
+
+    @property
+    def names(self) -> List[str]:
+        return list(self)
+
+
+def top_k(scores: np.ndarray, k: int = 10) -> np.ndarray:
+    """
+    Indices of the k highest scores, descending, ties kept in index order
+    (identical to sorted(..., reverse=True)[:k] over first-appearance order).
+    """
+    n = len(scores)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    if n > k:
+        # O(n) selection of the k-th largest score, then only sort the candidates
+        threshold = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        candidates = np.flatnonzero(scores >= threshold)
+    else:
+        candidates = np.arange(n)
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order][:k]
+
+
+def sequential_sum(values: np.ndarray) -> float:
+    """Left-to-right float sum (matches Python's sum(), unlike pairwise np.sum)"""
+    return float(np.cumsum(values)[-1]) if len(values) else 0
@@ -0,0 +1,42 @@
+"""
+Per-cluster summarize (compute_cluster_summary + compute_wts_classification +
+paint_persona_profile) vs the grouped summarize_clusters pass; the crossover k
+is what CLUSTER_SUMMARY_GROUPED_MIN_K should be set to
+Usage (from backend/):
+    python -m benchmarks.bench_cluster_summary [n_insights ...] [--clusters K]
+"""
+import sys
+import time
+import numpy as np
+from benchmarks.synthetic import make_insights
+from services.cluster_summary_service import ClusterColumns, summarize_clusters, summarize_per_cluster
+
+
+def run(sizes, n_clusters):
+    print(f"k={n_clusters}")
+    for n in sizes:
+        insights = make_insights(n)
+        labels = np.random.default_rng(0).integers(0, n_clusters, size=n)
+
+        started = time.perf_counter()
+        expected = summarize_per_cluster(insights, labels, n_clusters)
+        legacy_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        columns = ClusterColumns.from_insights(insights)
+        encode_seconds = time.perf_counter() - started
+        actual = summarize_clusters(columns, labels, n_clusters)
+        grouped_seconds = time.perf_counter() - started
+
+        identical = repr(expected) == repr(actual)
+        print(f"{n:>8} insights  per-cluster {legacy_seconds:7.3f}s  grouped {grouped_seconds:7.3f}s "
+              f"(encode {encode_seconds:.3f}s)  x{legacy_seconds / grouped_seconds:4.1f}  identical={identical}")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    n_clusters = 5
+    if '--clusters' in args:
+        position = args.index('--clusters')
+        n_clusters = int(args[position + 1])
+        del args[position:position + 2]
+    run([int(arg) for arg in args] or [1000, 10000, 100000], n_clusters)
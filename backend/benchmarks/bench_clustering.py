@@ -0,0 +1,24 @@
+"""
+Wall-clock and inertia of the clustering engines
+Usage (from backend/):
+    python -m benchmarks.bench_clustering [n_insights ...]
+"""
+import sys
+import time
+from benchmarks.synthetic import make_insights
+from services.clustering_service import build_feature_vocabulary, encode_insights, fit_kmeans
+
+
+def run(sizes):
+    for n in sizes:
+        insights = make_insights(n)
+        vectors = encode_insights(insights, build_feature_vocabulary(insights))
+        print(f"\n{n} insights, {vectors.shape[1]} features")
+        for engine in ('kmeans', 'minibatch'):
+            started = time.perf_counter()
+            fit = fit_kmeans(vectors, 3, engine=engine)
+            elapsed = time.perf_counter() - started
+            print(f"  {engine:<10} {elapsed:8.3f}s  inertia {fit['inertia']:.1f}")
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or [2000, 20000, 100000])
@@ -0,0 +1,49 @@
+"""
+Linear filename scan vs the trigram FileSearchIndex
+Usage (from backend/):
+    python -m benchmarks.bench_file_search [n_files ...]
+"""
+import random
+import sys
+import time
+from services.file_search_index_service import FileSearchIndex
+
+WORDS = ["report", "campaign", "brief", "moodboard", "shade", "foundation", "launch", "budget",
+         "Q1", "Q2", "Q3", "Q4", "final", "draft", "v2", "review", "TikTok", "persona", "deck", "Résumé"]
+EXTENSIONS = [".pdf", ".docx", ".xlsx", ".png", ".mp4", ".pptx"]
+QUERIES = ["report", "repo", "q3", "final.pdf", "shade-launch", "resume", "tiktok persona", "zzz"]
+
+
+def make_names(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [
+        "-".join(rng.sample(WORDS, rng.randint(1, 4))) + f" {rng.randint(1, 9999)}" + rng.choice(EXTENSIONS)
+        for _ in range(n)
+    ]
+
+
+def run(sizes):
+    for n in sizes:
+        names = make_names(n)
+
+        started = time.perf_counter()
+        index = FileSearchIndex()
+        for i, name in enumerate(names):
+            index.add(f"file_{i}", name)
+        build_seconds = time.perf_counter() - started
+
+        print(f"{n:>8} files  index build {build_seconds:6.3f}s")
+        for query in QUERIES:
+            started = time.perf_counter()
+            lowered = query.lower()
+            scanned = [i for i, name in enumerate(names) if lowered in name.lower()]
+            scan_ms = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            top = index.ranked(query, count=100)
+            index_ms = (time.perf_counter() - started) * 1000
+            print(f"           {query!r:>18}  scan {scan_ms:8.2f}ms ({len(scanned):>6} hits)  "
+                  f"index top-100 {index_ms:8.2f}ms ({len(top):>3} returned)")
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
@@ -0,0 +1,50 @@
+"""
+Full recompute vs merging appended rows into stored aggregates
+Usage (from backend/):
+    python -m benchmarks.bench_incremental_analytics [n_rows ...]
+Appends 5% to each dataset; sections that differ from the full run are listed
+"""
+import sys
+import time
+from benchmarks.synthetic import make_social_posts, make_keywords
+from services.analytics_engine_service import AnalyticsEngineService
+from services.analytics_aggregate_service import (
+    social_partial, merge_social, merge_posts, finalize_social,
+    search_partial, merge_search, finalize_search, compare_results
+)
+
+
+def run(sizes):
+    for n in sizes:
+        appended = max(1, n // 20)
+        for name, make_rows in (('social', make_social_posts), ('search', make_keywords)):
+            rows = make_rows(n + appended)
+            base, tail = rows[:n], rows[n:]
+            if name == 'social':
+                previous = AnalyticsEngineService.social_media_analytics(base)
+                state = social_partial(base)[0]
+            else:
+                previous = AnalyticsEngineService.search_marketing_analytics(base)
+                state = search_partial(base)[0]
+
+            started = time.perf_counter()
+            if name == 'social':
+                partial, new_posts = social_partial(tail, n, with_rows=True)
+                merged = finalize_social(merge_social(state, partial), merge_posts(previous['post_level_data'], new_posts, True))
+            else:
+                partial, new_entries = search_partial(tail, n, with_rows=True)
+                merged = finalize_search(merge_search(state, partial), previous['opportunity_map'] + new_entries)
+            incremental_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            if name == 'social':
+                full = AnalyticsEngineService.social_media_analytics(rows)
+            else:
+                full = AnalyticsEngineService.search_marketing_analytics(rows)
+            full_seconds = time.perf_counter() - started
+
+            print(f"{name:>6} {n:>8} + {appended:>6} rows  full {full_seconds:7.3f}s  "
+                  f"incremental {incremental_seconds:7.3f}s  differs={compare_results(merged, full)}")
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000])
@@ -0,0 +1,41 @@
+"""
+Per-row dict mapping vs compiled columnar projection, through social_media_analytics
+Usage (from backend/):
+    python -m benchmarks.bench_mapped_projection [n_rows ...]
+"""
+import sys
+import time
+from benchmarks.synthetic import make_social_posts
+from services.analytics_engine_service import AnalyticsEngineService
+from services.dynamic_data_service import DynamicDataService
+from services.mapped_projection_service import MappingProjection
+
+CHUNK_ROWS = 250
+
+
+def run(sizes):
+    for n in sizes:
+        posts = make_social_posts(n)
+        # Stored rows use the user's column names
+        mappings = {field: field.replace('_', ' ').title() for field in posts[0]}
+        stored = [{mappings[field]: value for field, value in post.items()} for post in posts]
+        chunks = [stored[i:i + CHUNK_ROWS] for i in range(0, n, CHUNK_ROWS)]
+
+        started = time.perf_counter()
+        rows = [DynamicDataService._map_row(row, mappings) for rows in chunks for row in rows]
+        dict_map_seconds = time.perf_counter() - started
+        expected = AnalyticsEngineService.social_media_analytics(rows)
+        dict_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        table = MappingProjection(mappings).project(chunks)
+        projection_seconds = time.perf_counter() - started
+        actual = AnalyticsEngineService.social_media_analytics(table)
+        table_seconds = time.perf_counter() - started
+
+        identical = repr(expected) == repr(actual)
+        print(f"{n:>8} rows  dicts {dict_map_seconds:6.3f}s map / {dict_seconds:6.3f}s total  "
+              f"projection {projection_seconds:6.3f}s / {table_seconds:6.3f}s total  identical={identical}")
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000])
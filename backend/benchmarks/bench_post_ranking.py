@@ -0,0 +1,74 @@
+"""
+Post ranking for social media analytics: the previous three full sorts
+(display order, percentile thresholds, top posts) vs selection
+(np.partition thresholds, top-k top posts / class lists, argmax/argmin
+best and worst)
+Usage (from backend/):
+    python -m benchmarks.bench_post_ranking [n_posts ...]
+"""
+import heapq
+import sys
+import time
+import numpy as np
+from array_utils import top_k
+
+
+def sorted_ranking(posts):
+    """Previous approach: sort the post dicts, sort them again for thresholds, sort for top 5"""
+    post_level_data = sorted(posts, key=lambda x: x['engagement_rate'], reverse=True)
+    by_engagement = sorted(post_level_data, key=lambda x: x['engagement_rate'], reverse=True)
+    n = len(by_engagement)
+    high = by_engagement[max(0, int(n * 0.25) - 1)]['engagement_rate']
+    low = by_engagement[min(n - 1, int(n * 0.75))]['engagement_rate']
+    top_posts = sorted(posts, key=lambda x: x['total_engagement'], reverse=True)[:5]
+    return high, low, top_posts, post_level_data[0], post_level_data[-1]
+
+
+def heap_ranking(posts):
+    """Row engine: heap top-k over the dicts, np.partition thresholds"""
+    by_engagement = lambda x: x['engagement_rate']
+    rates = np.array([post['engagement_rate'] for post in posts])
+    n = len(rates)
+    high_position = n - 1 - max(0, int(n * 0.25) - 1)
+    low_position = n - 1 - min(n - 1, int(n * 0.75))
+    selected = np.partition(rates, [low_position, high_position])
+    top_posts = heapq.nlargest(5, posts, key=lambda x: x['total_engagement'])
+    best = heapq.nlargest(1, posts, key=by_engagement)[0]
+    worst = heapq.nsmallest(1, reversed(posts), key=by_engagement)[0]
+    return selected[high_position].item(), selected[low_position].item(), top_posts, best, worst
+
+
+def array_ranking(rates, totals, posts):
+    """Columnar engine: the same selections over the rate / total arrays"""
+    n = len(rates)
+    high_position = n - 1 - max(0, int(n * 0.25) - 1)
+    low_position = n - 1 - min(n - 1, int(n * 0.75))
+    selected = np.partition(rates, [low_position, high_position])
+    top_posts = [posts[i] for i in top_k(totals, 5).tolist()]
+    best = posts[int(np.argmax(rates))]
+    worst = posts[n - 1 - int(np.argmin(rates[::-1]))]
+    return selected[high_position].item(), selected[low_position].item(), top_posts, best, worst
+
+
+def run(sizes):
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        rates = np.round(rng.gamma(2.0, 0.02, size=n), 4)
+        totals = rng.integers(0, 50000, size=n).astype(np.float64)
+        posts = [{'engagement_rate': r, 'total_engagement': t} for r, t in zip(rates.tolist(), totals.tolist())]
+
+        timings = {}
+        results = {}
+        for name, ranking in (('sorted', lambda: sorted_ranking(posts)),
+                              ('heap', lambda: heap_ranking(posts)),
+                              ('arrays', lambda: array_ranking(rates, totals, posts))):
+            started = time.perf_counter()
+            results[name] = ranking()
+            timings[name] = time.perf_counter() - started
+
+        identical = results['sorted'] == results['heap'] == results['arrays']
+        print(f"{n:>8} posts  sorted {timings['sorted']:7.3f}s  heap {timings['heap']:7.3f}s  "
+              f"arrays {timings['arrays']:7.3f}s  identical={identical}")
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000])
@@ -0,0 +1,29 @@
+"""
+Row-by-row vs columnar social_media_analytics
+Usage (from backend/):
+    python -m benchmarks.bench_social_analytics [n_rows ...]
+"""
+import sys
+import time
+from benchmarks.synthetic import make_social_posts
+from services.analytics_engine_service import AnalyticsEngineService
+
+
+def run(sizes):
+    for n in sizes:
+        rows = make_social_posts(n)
+
+        started = time.perf_counter()
+        expected = AnalyticsEngineService.social_media_analytics(rows, engine='rows')
+        rows_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        actual = AnalyticsEngineService.social_media_analytics(rows, engine='columnar')
+        columnar_seconds = time.perf_counter() - started
+
+        identical = repr(expected) == repr(actual)
+        print(f"{n:>8} rows  rows {rows_seconds:7.3f}s  columnar {columnar_seconds:7.3f}s  "
+              f"x{rows_seconds / columnar_seconds:4.1f}  identical={identical}")
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000])
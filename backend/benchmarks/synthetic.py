@@ -0,0 +1,87 @@
+"""
+Synthetic insight generator for benchmarks (shape matches InsightCreate)
+"""
+import random
+from typing import Any, Dict, List
+
+MOTIVATIONS = ["Long-lasting", "Natural look", "Shade match", "Affordability", "Skin benefits", "Brand trust", "Coverage", "Trendy"]
+PAINS = ["Oxidation", "Cakey", "Price", "Shade range", "Breakouts", "Transfer", "Dryness"]
+PLATFORMS = ["TikTok", "Instagram", "Xiaohongshu 小红书", "YouTube", "Lazada Review", "Shopee Review", "Face to Face", "Reddit", "FB Group", "Blog/Article", "Other"]
+
+
+def make_insight(rng: random.Random, index: int) -> Dict[str, Any]:
+    return {
+        'id': f"insight_{index}",
+        'age_group': rng.choice(["18-24", "25-32", "33-40", "41+"]),
+        'gender': rng.choice(["Female", "Male"]),
+        'skin_type': rng.choice(["Dry", "Oily", "Combination"]),
+        'skin_tone': rng.choice(["Fair", "Medium", "Tan", "Deep"]),
+        'lifestyle': rng.choice(["Student", "Young Working Adult", "Freelancer/Creative"]),
+        'platform': rng.choice(PLATFORMS),
+        'research_method': "User Interview",
+        'products': rng.sample(["Foundation", "Concealer", "Lipstick", "Powder", "Primer"], rng.randint(0, 3)),
+        'motivations': [{'name': n, 'strength': rng.randint(0, 100)} for n in rng.sample(MOTIVATIONS, rng.randint(1, 4))],
+        'pains': [{'name': n, 'strength': rng.randint(0, 100)} for n in rng.sample(PAINS, rng.randint(0, 3))],
+        'behaviours': rng.sample(["Reads reviews", "Compares prices", "Watches tutorials", "Tries samples"], rng.randint(0, 3)),
+        'channels': rng.sample(["TikTok", "Instagram", "YouTube", "Sephora"], rng.randint(0, 2)),
+        'purchase_intent': rng.randint(0, 100),
+        'influencer_effect': rng.randint(0, 100),
+        'quote': "",
+        'notes': ""
+    }
+
+
+def make_insights(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [make_insight(rng, i) for i in range(n)]
+
+
+SOCIAL_PLATFORMS = ["TikTok", "Instagram", "Facebook", "YouTube", "Xiaohongshu"]
+POST_TYPES = ["Tutorial", "Review", "Promo", "UGC", "Behind the Scenes", "Giveaway"]
+SENTIMENTS = ["Positive", "Neutral", "Negative", "pos", "neg"]
+THEMES = ["Shade range", "Longwear", "Price", "Packaging", "Skin care", "Routine"]
+
+
+def make_social_post(rng: random.Random, index: int) -> Dict[str, Any]:
+    """One mapped social media row (shape matches the social_media module mapping)"""
+    views = rng.choice([0, rng.randint(100, 500000)])
+    return {
+        'platform': rng.choice(SOCIAL_PLATFORMS),
+        'post_type': rng.choice(POST_TYPES),
+        'post_url': f"https://example.com/p/{index}",
+        'likes': str(rng.randint(0, 20000)),
+        'comments': rng.randint(0, 2000),
+        'shares': rng.randint(0, 1500),
+        'saves': rng.randint(0, 3000),
+        'views': views,
+        'posting_date': f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        'sentiment': rng.choice(SENTIMENTS),
+        'key_themes': rng.choice(THEMES)
+    }
+
+
+def make_social_posts(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [make_social_post(rng, i) for i in range(n)]
+
+
+INTENTS = ["awareness", "Consideration", "purchase", "Navigational"]
+COMPETITION_LEVELS = ["Low", "Medium", "High"]
+
+
+def make_keyword(rng: random.Random, index: int) -> Dict[str, Any]:
+    """One mapped search marketing row (shape matches the search_marketing module mapping)"""
+    return {
+        'keyword': f"keyword {index}",
+        'search_volume': rng.choice([str(rng.randint(10, 200000)), rng.randint(10, 200000)]),
+        'keyword_difficulty': rng.randint(1, 100),
+        'competition_level': rng.choice(COMPETITION_LEVELS),
+        'intent': rng.choice(INTENTS),
+        'brand_ranking': rng.choice([None, '', rng.randint(1, 100)]),
+        'competitor_ranking': rng.choice([None, rng.randint(1, 100), str(rng.randint(1, 100))])
+    }
+
+
+def make_keywords(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [make_keyword(rng, i) for i in range(n)]
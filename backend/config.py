@@ -16,5 +16,53 @@ class Settings:
     
     # CORS
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*').split(',')
+    
+    # Report cache (seconds before writes on other instances become visible)
+    REPORT_CACHE_TTL_SECONDS = float(os.getenv('REPORT_CACHE_TTL_SECONDS', '30'))
+    
+    # Settings snapshot (persona threshold, module settings, module order)
+    SETTINGS_CACHE_TTL_SECONDS = float(os.getenv('SETTINGS_CACHE_TTL_SECONDS', '60'))
+    
+    # Shared folder directory cache; the listener keeps it live across instances
+    FOLDER_CACHE_TTL_SECONDS = float(os.getenv('FOLDER_CACHE_TTL_SECONDS', '60'))
+    FOLDER_CACHE_LISTENER = os.getenv('FOLDER_CACHE_LISTENER', 'false').lower() == 'true'
+    
+    # Shared file search index: how often to pick up uploads made on other instances
+    FILE_SEARCH_SYNC_SECONDS = float(os.getenv('FILE_SEARCH_SYNC_SECONDS', '15'))
+    
+    # Clustering
+    CLUSTERING_RANDOM_STATE = int(os.getenv('CLUSTERING_RANDOM_STATE', '42'))
+    CLUSTERING_N_JOBS = int(os.getenv('CLUSTERING_N_JOBS', '-1'))  # -1 = all cores
+    CLUSTERING_MINIBATCH_THRESHOLD = int(os.getenv('CLUSTERING_MINIBATCH_THRESHOLD', '100000'))
+    CLUSTERING_K_MIN = int(os.getenv('CLUSTERING_K_MIN', '2'))
+    CLUSTERING_K_MAX = int(os.getenv('CLUSTERING_K_MAX', '8'))
+    CLUSTERING_SILHOUETTE_SAMPLE = int(os.getenv('CLUSTERING_SILHOUETTE_SAMPLE', '2000'))
+    # Persona summaries use the grouped pass from this many clusters up; below it the
+    # per-cluster functions beat encoding ClusterColumns (benchmarks/bench_cluster_summary
+    # breaks even around k=40 for 10k-100k insights, well above CLUSTERING_K_MAX)
+    CLUSTER_SUMMARY_GROUPED_MIN_K = int(os.getenv('CLUSTER_SUMMARY_GROUPED_MIN_K', '40'))
+    
+    # Incremental cluster assignment: flag a full re-cluster past these limits
+    CLUSTER_DRIFT_DISTANCE_RATIO = float(os.getenv('CLUSTER_DRIFT_DISTANCE_RATIO', '1.2'))
+    CLUSTER_DRIFT_IMBALANCE_RATIO = float(os.getenv('CLUSTER_DRIFT_IMBALANCE_RATIO', '1.5'))
+    CLUSTER_DRIFT_MAX_INCREMENTAL_SHARE = float(os.getenv('CLUSTER_DRIFT_MAX_INCREMENTAL_SHARE', '0.25'))
+    
+    # Bulk Firestore writes
+    FIRESTORE_BATCH_SIZE = int(os.getenv('FIRESTORE_BATCH_SIZE', '500'))
+    FIRESTORE_WRITE_CONCURRENCY = int(os.getenv('FIRESTORE_WRITE_CONCURRENCY', '4'))
+    
+    # Chunked marketing datasets
+    # A chunk closes at DATASET_CHUNK_ROWS rows or an estimated DATASET_CHUNK_BYTES
+    # stored bytes, whichever comes first (Firestore documents are capped at 1 MiB)
+    DATASET_CHUNK_ROWS = int(os.getenv('DATASET_CHUNK_ROWS', '250'))
+    DATASET_CHUNK_BYTES = int(os.getenv('DATASET_CHUNK_BYTES', '900000'))
+    # DATASET_CHUNKS_PER_BATCH full chunks must stay under Firestore's 10 MiB request limit
+    DATASET_CHUNKS_PER_BATCH = int(os.getenv('DATASET_CHUNKS_PER_BATCH', '8'))
+    DATASET_READ_BATCH = int(os.getenv('DATASET_READ_BATCH', '20'))
+    
+    # Persona generation jobs
+    PERSONA_JOB_LOCK_TTL_SECONDS = int(os.getenv('PERSONA_JOB_LOCK_TTL_SECONDS', '900'))
+    # Lease renewal interval while a stage (e.g. the k sweep) runs without progress calls
+    PERSONA_JOB_HEARTBEAT_SECONDS = int(os.getenv('PERSONA_JOB_HEARTBEAT_SECONDS', '60'))
 
 settings = Settings()
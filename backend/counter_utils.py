@@ -0,0 +1,28 @@
+"""
+Nested counter helpers shared by the incrementally maintained aggregate documents
+Deltas are nested dicts of numbers mirroring the stored document's maps; string
+leaves (display names) are labels that overwrite rather than add
+"""
+from firebase_admin import firestore
+from typing import Any, Dict
+
+
+def add_nested(target: Dict[str, Any], deltas: Dict[str, Any]) -> None:
+    """Recursively add a nested dict of numbers into target (strings overwrite)"""
+    for key, value in deltas.items():
+        if isinstance(value, dict):
+            add_nested(target.setdefault(key, {}), value)
+        elif isinstance(value, str):
+            target[key] = value
+        else:
+            target[key] = target.get(key, 0) + value
+
+
+def to_increments(deltas: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert leaf numbers into Firestore Increment transforms (strings are written as-is)"""
+    return {
+        key: to_increments(value) if isinstance(value, dict)
+        else value if isinstance(value, str)
+        else firestore.Increment(value)
+        for key, value in deltas.items()
+    }
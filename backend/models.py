@@ -28,6 +28,19 @@ class InsightCreate(BaseModel):
     created_by: Optional[str] = None  # Username of creator
     created_at: Optional[str] = None  # Timestamp
 
+class DatasetPatchOperation(BaseModel):
+    op: str  # insert | update | delete | add_column | rename_column | remove_column
+    id: Optional[str] = None  # update / delete: row id
+    row: Optional[Dict[str, Any]] = None  # insert
+    values: Optional[Dict[str, Any]] = None  # update: changed cells only
+    column: Optional[str] = None  # add_column / rename_column / remove_column
+    new_name: Optional[str] = None  # rename_column
+
+class DatasetPatchRequest(BaseModel):
+    version: int  # Dataset version the edits were made against
+    operations: List[DatasetPatchOperation]
+    updated_at: Optional[str] = None
+
 # ==================== Response Models ====================
 
 class InsightResponse(BaseModel):
@@ -126,7 +139,29 @@ class ReportResponse(BaseModel):
     intent_distribution: Dict[str, int]
     influence_distribution: Dict[str, int]
 
+class ClusterCountScore(BaseModel):
+    k: int
+    inertia: float
+    calinski_harabasz: float
+    silhouette: Optional[float] = None
+
 class GeneratePersonasResponse(BaseModel):
     success: bool
     message: str
     personas_count: int
+    n_clusters: Optional[int] = None  # k used for clustering
+    k_scores: Optional[List[ClusterCountScore]] = None  # Per-k scores when k was selected automatically
+
+class PersonaJobResponse(BaseModel):
+    job_id: str
+    state: str  # queued | encoding | clustering | writing | done | failed | cancelled
+    progress: float  # 0.0 - 1.0
+    message: Optional[str] = ''
+    n_clusters: Optional[int] = None
+    requested_by: Optional[str] = None
+    persona_threshold: Optional[float] = None  # Settings snapshot taken at job start
+    cancel_requested: bool = False
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: str
+    updated_at: str
@@ -31,7 +31,8 @@ class FolderResponse(BaseModel):
     icon: Optional[str] = "folder"
     color: Optional[str] = "#A62639"
     order: Optional[int] = 0  # Display order
-    fileCount: Optional[int] = 0  # Computed field
+    fileCount: Optional[int] = 0  # Maintained on the folder document
+    totalSize: Optional[int] = 0  # Bytes, maintained alongside fileCount
     isPersonal: Optional[bool] = False  # Personal folder flag
     ownerUserID: Optional[str] = None  # Owner of personal folder
 
@@ -70,6 +71,13 @@ class SharedFileListResponse(BaseModel):
     folder: Optional[str] = None
 
 
+class SharedFilePageResponse(BaseModel):
+    """Response model for one page of files (keyset pagination)"""
+    files: List[SharedFileResponse]
+    next_page_token: Optional[str] = None  # Pass back as pageToken; None on the last page
+    limit: int
+
+
 # ==================== Permission Models ====================
 
 class SharedFolderPermissions(BaseModel):
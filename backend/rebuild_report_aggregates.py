@@ -0,0 +1,47 @@
+"""
+Rebuild or verify the incrementally maintained report aggregates
+Usage:
+    python rebuild_report_aggregates.py           # verify, rebuild only if drift is found
+    python rebuild_report_aggregates.py --verify  # verify only, never write
+    python rebuild_report_aggregates.py --force   # always rebuild from a full scan
+"""
+import sys
+from services.report_aggregates_service import ReportAggregatesService
+
+
+def run(verify_only: bool = False, force: bool = False):
+    """Verify aggregates against a full insights scan and repair drift"""
+    if not force:
+        result = ReportAggregatesService.verify()
+        print(f"Insights scanned: {result['total_insights']}")
+
+        if result['in_sync']:
+            print("  ✅ Aggregates are in sync")
+            return
+
+        print(f"  ⚠️  {len(result['mismatches'])} mismatched field(s):")
+        for mismatch in result['mismatches'][:25]:
+            print(f"     {mismatch['field']}: expected {mismatch['expected']}, stored {mismatch['stored']}")
+
+        if verify_only:
+            return
+
+    aggregates = ReportAggregatesService.rebuild()
+    print(f"  ✅ Rebuilt aggregates from {aggregates['total_insights']} insights")
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("REPORT AGGREGATES REBUILD SCRIPT")
+    print("=" * 60)
+    print("\nThis script will:")
+    print("1. Recompute report aggregates with a full scan of insights")
+    print("2. Compare them with the stored aggregates document")
+    print("3. Overwrite the stored document if they drifted (unless --verify)")
+    print("\nRun while nobody is adding or deleting insights")
+    print("=" * 60)
+
+    run(verify_only='--verify' in sys.argv, force='--force' in sys.argv)
+
+    print("\n" + "=" * 60)
+    print("✅ DONE")
+    print("=" * 60)
@@ -0,0 +1,47 @@
+"""
+Rebuild or verify the incrementally maintained shared folder analytics
+Usage:
+    python rebuild_shared_folder_analytics.py           # verify, rebuild only if drift is found
+    python rebuild_shared_folder_analytics.py --verify  # verify only, never write
+    python rebuild_shared_folder_analytics.py --force   # always rebuild from a full scan
+"""
+import sys
+from services.shared_folder_analytics_service import SharedFolderAnalyticsService
+
+
+def run(verify_only: bool = False, force: bool = False):
+    """Verify analytics against a full sharedFiles scan and repair drift"""
+    if not force:
+        result = SharedFolderAnalyticsService.verify()
+        print(f"Files scanned: {result['total_files']}")
+
+        if result['in_sync']:
+            print("  ✅ Analytics are in sync")
+            return
+
+        print(f"  ⚠️  {len(result['mismatches'])} mismatched field(s):")
+        for mismatch in result['mismatches'][:25]:
+            print(f"     {mismatch['field']}: expected {mismatch['expected']}, stored {mismatch['stored']}")
+
+        if verify_only:
+            return
+
+    aggregates = SharedFolderAnalyticsService.rebuild()
+    print(f"  ✅ Rebuilt analytics from {aggregates['total_files']} files")
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("SHARED FOLDER ANALYTICS REBUILD SCRIPT")
+    print("=" * 60)
+    print("\nThis script will:")
+    print("1. Recompute shared folder analytics with a full scan of sharedFiles")
+    print("2. Compare them with the stored analytics document")
+    print("3. Overwrite the stored document if they drifted (unless --verify)")
+    print("\nRun while nobody is uploading or deleting files")
+    print("=" * 60)
+
+    run(verify_only='--verify' in sys.argv, force='--force' in sys.argv)
+
+    print("\n" + "=" * 60)
+    print("✅ DONE")
+    print("=" * 60)
@@ -0,0 +1,44 @@
+"""
+Verify or repair the fileCount/totalSize counters stored on shared folders
+Usage:
+    python reconcile_folder_counters.py           # verify, repair drifted folders
+    python reconcile_folder_counters.py --verify  # verify only, never write
+"""
+import sys
+from services.shared_folder_service import SharedFolderService
+
+
+def run(verify_only: bool = False):
+    """Recount files per folder and repair drifted counters"""
+    result = SharedFolderService.reconcile_counters(apply=not verify_only)
+    print(f"Files scanned: {result['total_files']} across {result['folders_checked']} folder(s)")
+    if result['orphaned_files']:
+        print(f"  ⚠️  {result['orphaned_files']} file(s) point at folders that no longer exist")
+
+    if result['in_sync']:
+        print("  ✅ Folder counters are in sync")
+        return
+
+    print(f"  ⚠️  {len(result['mismatches'])} mismatched counter(s):")
+    for mismatch in result['mismatches'][:25]:
+        print(f"     {mismatch['folder_id']}.{mismatch['field']}: expected {mismatch['expected']}, stored {mismatch['stored']}")
+
+    if not verify_only:
+        print(f"  ✅ Repaired {result['repaired']} folder(s)")
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("FOLDER COUNTERS RECONCILIATION SCRIPT")
+    print("=" * 60)
+    print("\nThis script will:")
+    print("1. Count files and bytes per folder with a full scan of sharedFiles")
+    print("2. Compare them with fileCount/totalSize on each folder")
+    print("3. Overwrite drifted counters (unless --verify)")
+    print("\nRun once after deploying folder counters, and while nobody is uploading files")
+    print("=" * 60)
+
+    run(verify_only='--verify' in sys.argv)
+
+    print("\n" + "=" * 60)
+    print("✅ DONE")
+    print("=" * 60)
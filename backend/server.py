@@ -3,7 +3,7 @@ import os
 # Ensure the parent directory is in the Python path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from fastapi import FastAPI, HTTPException, Header, Request
+from fastapi import FastAPI, HTTPException, Header, Request, Query, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
@@ -15,7 +15,9 @@ from models import (
     InsightResponse,
     PersonaResponse,
     ReportResponse,
-    GeneratePersonasResponse
+    GeneratePersonasResponse,
+    PersonaJobResponse,
+    DatasetPatchRequest
 )
 from models_permissions import (
     UserPermissionsResponse, 
@@ -207,29 +209,126 @@ def get_report(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/admin/report-aggregates/verify")
+def verify_report_aggregates(x_user_role: Optional[str] = Header(None)):
+    """Compare stored report aggregates with a full insights scan - Superadmin only"""
+    if x_user_role != 'superadmin':
+        raise HTTPException(status_code=403, detail="Only superadmin can verify report aggregates")
+
+    try:
+        from services.report_aggregates_service import ReportAggregatesService
+        return ReportAggregatesService.verify()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/admin/report-aggregates/rebuild")
+def rebuild_report_aggregates(x_user_role: Optional[str] = Header(None)):
+    """Rebuild report aggregates from a full insights scan - Superadmin only"""
+    if x_user_role != 'superadmin':
+        raise HTTPException(status_code=403, detail="Only superadmin can rebuild report aggregates")
+
+    try:
+        from services.report_aggregates_service import ReportAggregatesService
+        from services.report_cache_service import ReportCacheService
+        aggregates = ReportAggregatesService.rebuild()
+        ReportCacheService.bump_generation()
+        return {"message": "Report aggregates rebuilt", "total_insights": aggregates['total_insights']}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ==================== Metrics Endpoint ====================
+
+@app.get("/api/admin/metrics")
+def get_metrics(x_user_role: Optional[str] = Header(None)):
+    """Get in-process cache/timing metrics for this instance - Admin/SuperAdmin only"""
+    check_admin_access(x_user_role)
+    from services.metrics_service import MetricsService
+    return MetricsService.snapshot()
+
 # ==================== Persona Endpoints ====================
 
 @app.post("/api/personas/generate", response_model=GeneratePersonasResponse)
-def generate_personas(x_user_role: Optional[str] = Header(None)):
-    """Generate personas from insights using K-Means clustering - Admin/SuperAdmin only"""
+def generate_personas(
+    n_clusters: Optional[int] = Query(None, ge=2, le=20),
+    x_user_role: Optional[str] = Header(None),
+    x_user_name: Optional[str] = Header(None)
+):
+    """
+    Generate personas from insights using K-Means clustering - Admin/SuperAdmin only
+    Synchronous compatibility mode; prefer /api/personas/generate-jobs for large datasets
+    Without n_clusters the cluster count is selected automatically
+    """
     check_admin_access(x_user_role)
     try:
-        from services.persona_generation_service import generate_personas_from_insights
+        from services.persona_job_service import PersonaJobService
         
-        # Run complete persona generation workflow
-        result = generate_personas_from_insights(n_clusters=3)
+        # Run the generation job inline, holding the same single-run lock
+        job = PersonaJobService.start_job(n_clusters=n_clusters, requested_by=x_user_name, background=False)
+        result = job.get('result') or {'success': False, 'message': job.get('message', ''), 'personas_created': 0}
+        k_selection = result.get('k_selection')
         
         return GeneratePersonasResponse(
             success=result['success'],
             message=result['message'],
-            personas_count=result['personas_created']
+            personas_count=result['personas_created'],
+            n_clusters=result.get('clusters_created'),
+            k_scores=k_selection['scores'] if k_selection else None
         )
         
     except Exception as e:
+        from services.persona_job_service import PersonaJobConflict
+        if isinstance(e, PersonaJobConflict):
+            raise HTTPException(status_code=409, detail=str(e))
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/personas/generate-jobs", response_model=PersonaJobResponse, status_code=202)
+def start_persona_generation_job(
+    n_clusters: Optional[int] = Query(None, ge=2, le=20),
+    x_user_role: Optional[str] = Header(None),
+    x_user_name: Optional[str] = Header(None)
+):
+    """Start persona generation in the background and return the job to poll - Admin/SuperAdmin only"""
+    check_admin_access(x_user_role)
+    from services.persona_job_service import PersonaJobService, PersonaJobConflict
+    try:
+        return PersonaJobService.start_job(n_clusters=n_clusters, requested_by=x_user_name)
+    except PersonaJobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/personas/generate-jobs/{job_id}", response_model=PersonaJobResponse)
+def get_persona_generation_job(job_id: str, x_user_role: Optional[str] = Header(None)):
+    """Get state and progress of a persona generation job - Admin/SuperAdmin only"""
+    check_admin_access(x_user_role)
+    from services.persona_job_service import PersonaJobService
+    job = PersonaJobService.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Persona job not found")
+    return job
+
+@app.post("/api/personas/generate-jobs/{job_id}/cancel", response_model=PersonaJobResponse)
+def cancel_persona_generation_job(job_id: str, x_user_role: Optional[str] = Header(None)):
+    """Request cancellation of a running persona generation job - Admin/SuperAdmin only"""
+    check_admin_access(x_user_role)
+    from services.persona_job_service import PersonaJobService
+    try:
+        return PersonaJobService.cancel_job(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/api/personas/cluster-health")
+def get_persona_cluster_health(x_user_role: Optional[str] = Header(None)):
+    """Running cluster stats and drift metrics since the last generation - Admin/SuperAdmin only"""
+    check_admin_access(x_user_role)
+    try:
+        from services.cluster_assignment_service import ClusterAssignmentService
+        return ClusterAssignmentService.get_health()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/personas", response_model=List[PersonaResponse])
 def get_all_personas(
     x_user_name: Optional[str] = Header(None),
@@ -810,8 +909,8 @@ def get_persona_threshold_api(x_user_role: Optional[str] = Header(None)):
         raise HTTPException(status_code=403, detail="Only superadmin can access persona settings")
     
     try:
-        from services import clustering_service
-        threshold = clustering_service.get_persona_threshold()
+        from services.settings_snapshot_service import SettingsSnapshotService
+        threshold = SettingsSnapshotService.get_persona_threshold()
         return {"minimum_tcss": threshold}
     except ImportError as e:
         print(f"Import error in persona threshold: {e}")
@@ -838,7 +937,9 @@ def set_persona_threshold_api(
             raise HTTPException(status_code=400, detail="Threshold must be between 0.0 and 6.0")
         
         from services import clustering_service
+        from services.settings_snapshot_service import SettingsSnapshotService
         success = clustering_service.set_persona_threshold(threshold)
+        SettingsSnapshotService.invalidate()
         
         if success:
             return {"message": f"Persona threshold updated to {threshold}", "minimum_tcss": threshold}
@@ -865,6 +966,7 @@ from models_shared_folder import (
     SharedFileCreate,
     SharedFileResponse,
     SharedFileListResponse,
+    SharedFilePageResponse,
     SharedFolderPermissions,
     UpdatePermissionsRequest,
     SharedFolderAnalyticsResponse
@@ -876,6 +978,7 @@ from services.shared_folder_analytics_service import SharedFolderAnalyticsServic
 from services.module_settings_service import ModuleSettingsService
 from services.important_links_service import ImportantLinksService
 from services.module_order_service import ModuleOrderService
+from services.settings_snapshot_service import SettingsSnapshotService
 from services.marketing_data_service import MarketingDataService
 from services.dynamic_data_service import DynamicDataService
 from services.analytics_engine_service import AnalyticsEngineService
@@ -891,8 +994,7 @@ def get_module_settings(x_user_name: Optional[str] = Header(None)):
         raise HTTPException(status_code=401, detail="Authentication required")
     
     try:
-        settings = ModuleSettingsService.get_settings()
-        return settings
+        return SettingsSnapshotService.get_module_settings()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -904,8 +1006,7 @@ def get_module_settings_admin(x_user_role: Optional[str] = Header(None)):
         raise HTTPException(status_code=403, detail="Only superadmin can access module settings")
     
     try:
-        settings = ModuleSettingsService.get_settings()
-        return settings
+        return SettingsSnapshotService.get_module_settings()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -921,6 +1022,7 @@ def update_module_settings(
     
     try:
         updated_settings = ModuleSettingsService.update_settings(updates)
+        SettingsSnapshotService.invalidate()
         return updated_settings
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1172,6 +1274,30 @@ def initialize_default_folders(x_user_role: Optional[str] = Header(None)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/admin/shared-folders/counters/verify")
+def verify_folder_counters(x_user_role: Optional[str] = Header(None)):
+    """Compare stored folder fileCount/totalSize with a full files scan (Superadmin only)"""
+    if x_user_role != 'superadmin':
+        raise HTTPException(status_code=403, detail="Only superadmin can verify folder counters")
+    
+    try:
+        return SharedFolderService.reconcile_counters(apply=False)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/admin/shared-folders/counters/reconcile")
+def reconcile_folder_counters(x_user_role: Optional[str] = Header(None)):
+    """Repair drifted folder fileCount/totalSize from a full files scan (Superadmin only)"""
+    if x_user_role != 'superadmin':
+        raise HTTPException(status_code=403, detail="Only superadmin can reconcile folder counters")
+    
+    try:
+        return SharedFolderService.reconcile_counters(apply=True)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # -------- File Management --------
 
 @app.post("/api/shared-files", response_model=SharedFileResponse)
@@ -1237,6 +1363,68 @@ def get_shared_files(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/shared-files/page", response_model=SharedFilePageResponse)
+def get_shared_files_page(
+    folderID: Optional[str] = None,
+    uploaderID: Optional[str] = None,
+    fileType: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    pageToken: Optional[str] = None,
+    x_user_name: Optional[str] = Header(None),
+    x_user_role: Optional[str] = Header(None)
+):
+    """Get one page of files, newest first; filters combine and next_page_token fetches the next page"""
+    if not x_user_name:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    # Check view permission
+    can_view = SharedFolderPermissionsService.check_permission(x_user_role, 'allowViewAll')
+    if not can_view:
+        raise HTTPException(status_code=403, detail="You don't have permission to view shared files")
+    
+    try:
+        return SharedFilesService.get_files_page(
+            folder_id=folderID,
+            uploader_id=uploaderID,
+            file_type_filter=fileType,
+            limit=limit,
+            page_token=pageToken,
+            requesting_user_id=x_user_name,
+            is_superadmin=(x_user_role == 'superadmin')
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/shared-files/search", response_model=List[SharedFileResponse])
+def search_shared_files(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(50, ge=1, le=200),
+    x_user_name: Optional[str] = Header(None),
+    x_user_role: Optional[str] = Header(None)
+):
+    """Search files by name (substring, best matches first), respecting personal folder privacy"""
+    if not x_user_name:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    # Check view permission
+    can_view = SharedFolderPermissionsService.check_permission(x_user_role, 'allowViewAll')
+    if not can_view:
+        raise HTTPException(status_code=403, detail="You don't have permission to view shared files")
+    
+    try:
+        return SharedFilesService.search_files(
+            q,
+            limit=limit,
+            requesting_user_id=x_user_name,
+            is_superadmin=(x_user_role == 'superadmin')
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/shared-files/{file_id}", response_model=SharedFileResponse)
 def get_shared_file(
     file_id: str,
@@ -1369,6 +1557,31 @@ def get_shared_folder_analytics(x_user_role: Optional[str] = Header(None)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/admin/shared-folder-analytics/verify")
+def verify_shared_folder_analytics(x_user_role: Optional[str] = Header(None)):
+    """Compare the stored shared folder analytics with a full files scan (Superadmin only)"""
+    if x_user_role != 'superadmin':
+        raise HTTPException(status_code=403, detail="Only superadmin can verify analytics")
+    
+    try:
+        return SharedFolderAnalyticsService.verify()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/admin/shared-folder-analytics/rebuild")
+def rebuild_shared_folder_analytics(x_user_role: Optional[str] = Header(None)):
+    """Rebuild shared folder analytics from a full files scan (Superadmin only)"""
+    if x_user_role != 'superadmin':
+        raise HTTPException(status_code=403, detail="Only superadmin can rebuild analytics")
+    
+    try:
+        aggregates = SharedFolderAnalyticsService.rebuild()
+        return {"message": "Shared folder analytics rebuilt", "total_files": aggregates['total_files']}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ==================== Health Check ====================
 
 @app.get("/")
@@ -1388,7 +1601,7 @@ def get_module_order(
         raise HTTPException(status_code=401, detail="Authentication required")
     
     try:
-        order = ModuleOrderService.get_order()
+        order = SettingsSnapshotService.get_module_order()
         return {"order": order}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1406,6 +1619,7 @@ def update_module_order(
     try:
         new_order = order_data.get('order', [])
         result = ModuleOrderService.update_order(new_order)
+        SettingsSnapshotService.invalidate()
         return {"order": result, "message": "Module order updated successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1485,21 +1699,114 @@ def save_dynamic_table_data(
     if not check_diagnostic_permission(x_user_name, role, module, 'save_data'):
         raise HTTPException(status_code=403, detail="You do not have permission to save data for this module")
     
+    from services.chunked_dataset_service import DatasetVersionConflict
+    
     try:
         success = DynamicDataService.save_table_data(x_user_name, module, data)
         if success:
             return {"message": "Data saved successfully"}
         raise HTTPException(status_code=500, detail="Failed to save data")
+    except DatasetVersionConflict as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "current_version": e.current_version})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.patch("/api/dynamic-data/{module}")
+def patch_dynamic_table_data(
+    module: str,
+    patch: DatasetPatchRequest,
+    x_user_name: Optional[str] = Header(None),
+    x_user_role: Optional[str] = Header(None)
+):
+    """Apply row/column edits to the dynamic table - Permission enforced, 409 if the version is stale"""
+    from services.chunked_dataset_service import DatasetVersionConflict, DatasetPatchError
+    
+    if not x_user_name:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    if module not in ['social_media', 'search_marketing']:
+        raise HTTPException(status_code=400, detail="Invalid module")
+    
+    role = x_user_role or 'user'
+    if not check_diagnostic_permission(x_user_name, role, module, 'save_data'):
+        raise HTTPException(status_code=403, detail="You do not have permission to save data for this module")
+    
+    try:
+        result = DynamicDataService.patch_table_data(
+            x_user_name,
+            module,
+            patch.version,
+            [operation.dict(exclude_none=True) for operation in patch.operations],
+            patch.updated_at
+        )
+        return {
+            "message": "Data updated successfully",
+            "version": result['version'],
+            "row_count": result['row_count'],
+            "columns": result['columns'],
+            "chunks_written": result['chunks_written'],
+            "chunks_deleted": result['chunks_deleted']
+        }
+    except DatasetVersionConflict as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "current_version": e.current_version})
+    except DatasetPatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/dynamic-data/{module}/ingest")
+def ingest_dynamic_table_data(
+    module: str,
+    file: UploadFile = File(...),
+    mode: str = Query('append', pattern='^(append|replace)$'),
+    x_user_name: Optional[str] = Header(None),
+    x_user_role: Optional[str] = Header(None)
+):
+    """Upload a CSV/XLSX straight into the dataset (streamed, chunked) - Permission enforced"""
+    from datetime import datetime, timezone
+    from services.dataset_ingest_service import DatasetIngestService, IngestError
+    from services.chunked_dataset_service import DatasetVersionConflict
+    
+    if not x_user_name:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    if module not in ['social_media', 'search_marketing']:
+        raise HTTPException(status_code=400, detail="Invalid module")
+    
+    role = x_user_role or 'user'
+    if not check_diagnostic_permission(x_user_name, role, module, 'save_data'):
+        raise HTTPException(status_code=403, detail="You do not have permission to save data for this module")
+    
+    try:
+        result = DatasetIngestService.ingest(
+            module,
+            file.filename,
+            file.file,
+            x_user_name,
+            append=(mode == 'append'),
+            updated_at=datetime.now(timezone.utc).isoformat()
+        )
+        return {"message": f"Imported {result['rows_ingested']} rows", "mode": mode, **result}
+    except IngestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DatasetVersionConflict as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "current_version": e.current_version})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        file.file.close()
+
+
 @app.get("/api/dynamic-data/{module}")
 def get_dynamic_table_data(
     module: str,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=5000, description="Page size; omit to get every row"),
     x_user_name: Optional[str] = Header(None)
 ):
-    """Get dynamic table data (columns + rows)"""
+    """Get dynamic table data (columns + rows), optionally one page at a time"""
     if not x_user_name:
         raise HTTPException(status_code=401, detail="Authentication required")
     
@@ -1507,6 +1814,8 @@ def get_dynamic_table_data(
         raise HTTPException(status_code=400, detail="Invalid module")
     
     try:
+        if limit is not None:
+            return DynamicDataService.get_table_page(x_user_name, module, offset, limit)
         data = DynamicDataService.get_table_data(x_user_name, module)
         return data
     except Exception as e:
@@ -1564,6 +1873,9 @@ def get_column_mapping(
 @app.get("/api/analytics/{module}/run")
 def run_analytics(
     module: str,
+    sort_posts: bool = Query(True, description="Sort social media post_level_data by engagement rate"),
+    incremental: bool = Query(True, description="Merge appended rows into the stored aggregates when possible"),
+    verify: bool = Query(False, description="Also recompute in full and report sections the merge got different"),
     x_user_name: Optional[str] = Header(None),
     x_user_role: Optional[str] = Header(None)
 ):
@@ -1581,23 +1893,47 @@ def run_analytics(
     
     try:
         from services.analytics_storage_service import AnalyticsStorageService
+        from services.analytics_aggregate_service import AnalyticsAggregateService
+        from services.chunked_dataset_service import ChunkedDatasetService
+        from services.metrics_service import MetricsService
+        from datetime import datetime, timezone
         
-        # Get mapped data
-        mapped_data = DynamicDataService.get_mapped_data(x_user_name, module)
+        # Pin the dataset version and mapping so the hash matches the rows analysed
+        manifest, mappings = DynamicDataService.get_manifest_and_mapping(x_user_name, module)
+        options = {'sort_posts': sort_posts} if module == 'social_media' else {}
+        input_hash = AnalyticsEngineService.input_hash(
+            module, ChunkedDatasetService.dataset_hash(manifest), mappings, options
+        )
         
-        if not mapped_data:
-            return {"error": "No mapped data available. Please upload data and complete column mapping."}
+        # Unchanged input: return the stored result without reading the rows
+        stored = AnalyticsStorageService.get_analytics_record(module)
+        if stored and stored.get('input_hash') == input_hash and stored.get('data'):
+            MetricsService.increment('analytics_cache.hits')
+            return {**stored['data'], 'cache_status': {
+                'hit': True, 'fresh': True, 'input_hash': input_hash, 'generated_at': stored.get('generated_at')
+            }}
+        MetricsService.increment('analytics_cache.misses')
         
-        # Generate analytics
-        if module == 'social_media':
-            analytics = AnalyticsEngineService.social_media_analytics(mapped_data)
-        else:
-            analytics = AnalyticsEngineService.search_marketing_analytics(mapped_data)
+        # Appended chunks only: merge them into the stored aggregates instead of a full run
+        analytics, aggregates, status = AnalyticsAggregateService.run(
+            module, x_user_name, manifest, mappings, options, stored, incremental=incremental, verify=verify
+        )
         
-        # Save analytics results (globally accessible)
-        AnalyticsStorageService.save_analytics(module, analytics, x_user_name)
+        if analytics is None:
+            return {"error": "No mapped data available. Please upload data and complete column mapping."}
         
-        return analytics
+        # Save analytics results (globally accessible); error results are not reused
+        reusable = 'error' not in analytics
+        AnalyticsStorageService.save_analytics(module, analytics, x_user_name, input_hash if reusable else None)
+        if reusable and aggregates is not None:
+            AnalyticsAggregateService.save_state(module, aggregates, manifest, mappings, options, input_hash)
+        if status['incremental']:
+            MetricsService.increment('analytics_cache.incremental')
+        
+        return {**analytics, 'cache_status': {
+            'hit': False, 'fresh': True, 'input_hash': input_hash,
+            'generated_at': datetime.now(timezone.utc).isoformat(), **status
+        }}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1618,13 +1954,26 @@ def get_analytics(
     try:
         from services.analytics_storage_service import AnalyticsStorageService
         
+        from services.chunked_dataset_service import ChunkedDatasetService
+        
         # Get saved analytics (globally shared)
-        analytics = AnalyticsStorageService.get_analytics(module)
+        stored = AnalyticsStorageService.get_analytics_record(module)
         
-        if not analytics:
+        if not stored or not stored.get('data'):
             return {"message": "No analytics generated yet"}
         
-        return analytics
+        # Fresh when the stored result was computed from the current data and mapping
+        # (run options are not known here, so both sort_posts variants count as fresh)
+        dataset_hash = ChunkedDatasetService.dataset_hash(ChunkedDatasetService.get_manifest(module))
+        mappings = DynamicDataService.get_column_mapping(x_user_name, module)
+        candidates = [{'sort_posts': True}, {'sort_posts': False}] if module == 'social_media' else [{}]
+        fresh = stored.get('input_hash') in [
+            AnalyticsEngineService.input_hash(module, dataset_hash, mappings, options) for options in candidates
+        ]
+        
+        return {**stored['data'], 'cache_status': {
+            'hit': True, 'fresh': fresh, 'input_hash': stored.get('input_hash'), 'generated_at': stored.get('generated_at')
+        }}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
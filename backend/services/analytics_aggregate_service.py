@@ -0,0 +1,649 @@
+"""
+Mergeable partial aggregates for social media and search marketing analytics
+A dataset that only grew by appended chunks is analysed by aggregating the new
+rows and merging them into the stored aggregates instead of re-reading every row
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import heapq
+from itertools import repeat
+from operator import itemgetter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from firebase_client import db
+from array_utils import sequential_sum, top_k
+from services.analytics_columnar_service import (
+    ColumnarFallback, ENGAGEMENT_FIELDS, LEVELS, CLASSES, CATEGORIES, CLASSIFICATION_RULES, INTENT_WEIGHTS, INTENT_SUGGESTIONS,
+    safe_num, encode, column_values, take_rows, post_urls, round_list, rank_missing, sentiment_category, int_rate_rows,
+    social_columns, search_columns, pillar_rows, platform_rows, push_fix_drop
+)
+from services.analytics_engine_service import AnalyticsEngineService
+from services.chunked_dataset_service import ChunkedDatasetService
+from services.mapped_projection_service import MappingProjection
+
+AGGREGATES_COLLECTION = 'analytics_aggregates'
+
+CLASSIFICATION_FIELDS = ('classification', 'engagement_level', 'sentiment_category')
+# [level][category] -> class code
+CLASS_RULE_TABLE = np.array(
+    [[CLASSES.index(CLASSIFICATION_RULES[(level, category)]) for category in CATEGORIES] for level in LEVELS]
+)
+
+
+def _merge_groups(first: List[Dict[str, Any]], second: List[Dict[str, Any]], key: str,
+                  fields: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    """Add per-group sums; groups keep first-appearance order"""
+    merged = [dict(group) for group in first]
+    position = {group[key]: i for i, group in enumerate(merged)}
+    for group in second:
+        i = position.get(group[key])
+        if i is None:
+            position[group[key]] = len(merged)
+            merged.append(dict(group))
+        else:
+            for field in fields:
+                merged[i][field] += group[field]
+    return merged
+
+
+def _merge_top(first: List[Dict[str, Any]], second: List[Dict[str, Any]], k: int, score: str):
+    """k highest-scoring candidates, ties in row order (same as top_k over all rows)"""
+    return heapq.nsmallest(k, first + second, key=lambda entry: (-entry[score], entry['index']))
+
+
+def _skipped_warnings(state: Dict[str, Any], noun: str) -> List[Dict[str, Any]]:
+    if not state['skipped']:
+        return []
+    return [{
+        'type': 'warning',
+        'message': f"{state['skipped']} {noun}(s) skipped due to missing critical data",
+        'details': state['skipped_details']
+    }]
+
+
+# ---- Social media ----
+
+def social_partial(mapped_data, row_offset: int = 0, with_rows: bool = False):
+    """
+    Aggregates of mapped social media rows (numbered from row_offset + 1), plus
+    their post_level_data entries in row order, unclassified, when with_rows.
+    Raises ColumnarFallback for inputs the columnar engine can't reproduce exactly.
+    """
+    platforms_all, post_types_all, numbers_all, invalid, details = social_columns(mapped_data, row_offset)
+    valid = np.flatnonzero(~invalid)
+    state = {
+        'rows': len(mapped_data),
+        'skipped': len(mapped_data) - len(valid),
+        'skipped_details': details,
+        'posts': len(valid),
+        'totals': {field: 0.0 for field in ENGAGEMENT_FIELDS},
+        'pillars': [],
+        'platforms': [],
+        'heatmap': [],
+        'top_posts': [],
+    }
+    if not len(valid):
+        return state, []
+
+    index = valid.tolist()
+    if len(index) < len(mapped_data):
+        rows = take_rows(mapped_data, index)
+        platforms = [platforms_all[i] for i in index]
+        post_types = [post_types_all[i] for i in index]
+        numbers = {field: column[valid] for field, column in numbers_all.items()}
+    else:
+        rows, platforms, post_types, numbers = mapped_data, platforms_all, post_types_all, numbers_all
+    sentiments = column_values(rows, 'sentiment', 'Unknown')
+    themes = column_values(rows, 'key_themes', 'Unknown')
+
+    likes, comments, shares, saves, views = (numbers[field] for field in ENGAGEMENT_FIELDS)
+    total_engagement = likes + comments + shares + saves
+    with np.errstate(divide='ignore', invalid='ignore'):
+        engagement_rate = np.where(views > 0, total_engagement / views, total_engagement)
+    state['totals'] = {field: float(sequential_sum(numbers[field])) for field in ENGAGEMENT_FIELDS}
+
+    pillar_codes, pillar_names = encode(post_types)
+    sentiment_codes, sentiment_values = encode(sentiments)
+    is_positive = np.array([str(s).lower() in ['positive', 'pos'] for s in sentiment_values], dtype=np.float64)
+    is_negative = np.array([str(s).lower() in ['negative', 'neg'] for s in sentiment_values], dtype=np.float64)
+    n_pillars = len(pillar_names)
+    state['pillars'] = [{
+        'pillar': name, 'total_posts': count, 'rate_sum': rate_sum, 'view_sum': view_sum,
+        'positive': int(positive), 'negative': int(negative)
+    } for name, count, rate_sum, view_sum, positive, negative in zip(
+        pillar_names,
+        np.bincount(pillar_codes, minlength=n_pillars).tolist(),
+        np.bincount(pillar_codes, weights=engagement_rate, minlength=n_pillars).tolist(),
+        np.bincount(pillar_codes, weights=views, minlength=n_pillars).tolist(),
+        np.bincount(pillar_codes, weights=is_positive[sentiment_codes], minlength=n_pillars).tolist(),
+        np.bincount(pillar_codes, weights=is_negative[sentiment_codes], minlength=n_pillars).tolist()
+    )]
+
+    platform_codes, platform_names = encode(platforms)
+    n_platforms = len(platform_names)
+    state['platforms'] = [{
+        'platform': name, 'posting_frequency': count, 'rate_sum': rate_sum, 'view_sum': view_sum, 'share_sum': share_sum
+    } for name, count, rate_sum, view_sum, share_sum in zip(
+        platform_names,
+        np.bincount(platform_codes, minlength=n_platforms).tolist(),
+        np.bincount(platform_codes, weights=engagement_rate, minlength=n_platforms).tolist(),
+        np.bincount(platform_codes, weights=views, minlength=n_platforms).tolist(),
+        np.bincount(platform_codes, weights=shares, minlength=n_platforms).tolist()
+    )]
+
+    # Theme x sentiment counts, themes and their sentiments in first-appearance order
+    theme_codes, theme_names = encode(themes)
+    n_sentiments = max(len(sentiment_values), 1)
+    pair_keys = theme_codes * n_sentiments + sentiment_codes
+    pairs, first_index, pair_counts = np.unique(pair_keys, return_index=True, return_counts=True)
+    order = np.lexsort((first_index, pairs // n_sentiments))
+    heatmap = {}
+    for key, first, count in zip(pairs[order].tolist(), first_index[order].tolist(), pair_counts[order].tolist()):
+        theme = heatmap.setdefault(key // n_sentiments, {'theme': theme_names[key // n_sentiments], 'sentiments': []})
+        theme['sentiments'].append({'sentiment': sentiments[first], 'count': count})
+    state['heatmap'] = list(heatmap.values())
+
+    int_rates = set(int_rate_rows(rows, views, total_engagement))
+    # Re-parsed from the row like the engine: safe_num keeps an int default for unparseable cells
+    state['top_posts'] = [{
+        'index': row_offset + index[i],
+        'total_engagement': total_engagement[i].item(),
+        'post': {
+            'platform': platforms[i],
+            'post_type': post_types[i],
+            'likes': safe_num(rows[i].get('likes', 0)),
+            'comments': safe_num(rows[i].get('comments', 0)),
+            'shares': safe_num(rows[i].get('shares', 0)),
+            'engagement_rate': 0 if i in int_rates else round(engagement_rate[i].item(), 4)
+        }
+    } for i in top_k(total_engagement, 5).tolist()]
+
+    if not with_rows:
+        return state, []
+    rounded_rates = round_list(engagement_rate, 4)
+    for i in int_rates:
+        rounded_rates[i] = 0
+    columns = {
+        'platform': platforms,
+        'post_url': post_urls(rows),
+        'post_type': post_types,
+        'engagement_rate': rounded_rates,
+        'view_count': views.astype(np.int64).tolist(),
+        'sentiment': sentiments,
+        'likes': likes.astype(np.int64).tolist(),
+        'comments': comments.astype(np.int64).tolist(),
+        'shares': shares.astype(np.int64).tolist(),
+        'saves': saves.astype(np.int64).tolist(),
+        'total_engagement': total_engagement.astype(np.int64).tolist()
+    }
+    keys = list(columns)
+    return state, [dict(zip(keys, post)) for post in zip(*(columns[key] for key in keys))]
+
+
+def merge_social(state: Dict[str, Any], other: Dict[str, Any]) -> Dict[str, Any]:
+    """Aggregates of state's rows followed by other's rows"""
+    heatmap = [{'theme': theme['theme'], 'sentiments': [dict(s) for s in theme['sentiments']]} for theme in state['heatmap']]
+    themes = {theme['theme']: theme for theme in heatmap}
+    for theme in other['heatmap']:
+        merged = themes.get(theme['theme'])
+        if merged is None:
+            merged = themes[theme['theme']] = {'theme': theme['theme'], 'sentiments': []}
+            heatmap.append(merged)
+        merged['sentiments'] = _merge_groups(merged['sentiments'], theme['sentiments'], 'sentiment', ('count',))
+
+    return {
+        'rows': state['rows'] + other['rows'],
+        'skipped': state['skipped'] + other['skipped'],
+        'skipped_details': (state['skipped_details'] + other['skipped_details'])[:10],
+        'posts': state['posts'] + other['posts'],
+        'totals': {field: state['totals'][field] + other['totals'][field] for field in ENGAGEMENT_FIELDS},
+        'pillars': _merge_groups(state['pillars'], other['pillars'], 'pillar',
+                                 ('total_posts', 'rate_sum', 'view_sum', 'positive', 'negative')),
+        'platforms': _merge_groups(state['platforms'], other['platforms'], 'platform',
+                                   ('posting_frequency', 'rate_sum', 'view_sum', 'share_sum')),
+        'heatmap': heatmap,
+        'top_posts': _merge_top(state['top_posts'], other['top_posts'], 5, 'total_engagement')
+    }
+
+
+def merge_posts(posts: List[Dict[str, Any]], new_posts: List[Dict[str, Any]], sort_posts: bool) -> List[Dict[str, Any]]:
+    """post_level_data for appended rows; ties keep row order like the engine's stable sort"""
+    if not sort_posts:
+        return posts + new_posts
+    # posts is already sorted, so this is a linear merge of two runs
+    return sorted(posts + new_posts, key=itemgetter('engagement_rate'), reverse=True)
+
+
+def finalize_social(state: Dict[str, Any], posts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Analytics result from merged aggregates and every valid post's entry.
+    Every post is (re)classified against the exact quartiles of all rates, as in a full run.
+    """
+    if not state['rows']:
+        return {'error': 'No data available for analytics'}
+    data_warnings = _skipped_warnings(state, 'row')
+    if not state['posts']:
+        return {
+            'error': 'No valid data available for analytics',
+            'warnings': data_warnings
+        }
+
+    n = state['posts']
+    pillars, platforms = state['pillars'], state['platforms']
+    content_pillars = pillar_rows(*(
+        [pillar[field] for pillar in pillars]
+        for field in ('pillar', 'total_posts', 'rate_sum', 'view_sum', 'positive', 'negative')
+    ))
+    platform_comparison, avg_engagement_rate = platform_rows(*(
+        [platform[field] for platform in platforms]
+        for field in ('platform', 'posting_frequency', 'rate_sum', 'view_sum', 'share_sum')
+    ))
+    totals = state['totals']
+    push_items, fix_items, drop_items = push_fix_drop(content_pillars, avg_engagement_rate, totals['views'], n)
+
+    rates = list(map(itemgetter('engagement_rate'), posts))
+    classified = n >= 4
+    if classified:
+        rate_array = np.array(rates, dtype=np.float64)
+        # Same descending positions as the engine, selected in O(n)
+        high_position = n - 1 - max(0, int(n * 0.25) - 1)
+        low_position = n - 1 - min(n - 1, int(n * 0.75))
+        selected = np.partition(rate_array, [low_position, high_position])
+        high_threshold = selected[high_position].item()
+        low_threshold = selected[low_position].item()
+        levels = np.where(rate_array >= high_threshold, 0, np.where(rate_array >= low_threshold, 1, 2))
+        # Posts classified by an earlier run keep their (static) sentiment category
+        categories = [
+            category or sentiment_category(post['sentiment'])
+            for post, category in zip(posts, map(dict.get, posts, repeat('sentiment_category')))
+        ]
+        category_codes = np.array([CATEGORIES.index(category) for category in categories], dtype=np.int64)
+        class_codes = CLASS_RULE_TABLE[levels, category_codes]
+        for post, label, level, category in zip(posts, class_codes.tolist(), levels.tolist(), categories):
+            post['classification'] = CLASSES[label]
+            post['engagement_level'] = LEVELS[level]
+            post['sentiment_category'] = category
+        # posts is in row order or stably sorted, so top_k's position ties match the engine
+        members = [np.flatnonzero(class_codes == code) for code in range(len(CLASSES))]
+        top = [[posts[i] for i in rows[top_k(rate_array[rows], 10)].tolist()] for rows in members]
+        classification_summary = {
+            'push_count': len(members[0]),
+            'fix_count': len(members[1]),
+            'drop_count': len(members[2]),
+            'push_posts': top[0],
+            'fix_posts': top[1],
+            'drop_posts': top[2],
+            'thresholds': {
+                'high_engagement': high_threshold,
+                'low_engagement': low_threshold
+            }
+        }
+    else:
+        for post in posts:
+            for field in CLASSIFICATION_FIELDS:
+                post.pop(field, None)
+        classification_summary = {
+            'push_count': 0,
+            'fix_count': 0,
+            'drop_count': 0,
+            'push_posts': [],
+            'fix_posts': [],
+            'drop_posts': [],
+            'message': 'Need at least 4 posts for classification'
+        }
+
+    # Best: first highest rate; worst: last lowest rate (holds for row order and the stable sort)
+    best = rates.index(max(rates))
+    worst = len(rates) - 1 - rates[::-1].index(min(rates))
+
+    return {
+        'warnings': data_warnings if data_warnings else None,
+        'overview': {
+            'total_posts': n,
+            'total_likes': int(totals['likes']),
+            'total_comments': int(totals['comments']),
+            'total_shares': int(totals['shares']),
+            'total_saves': int(totals['saves']),
+            'total_views': int(totals['views']),
+            'avg_engagement_rate': round(avg_engagement_rate, 4)
+        },
+        'content_pillars': [{
+            'pillar': p['pillar'],
+            'total_posts': p['total_posts'],
+            'avg_engagement_rate': p['avg_engagement_rate'],
+            'avg_views': p['avg_views']
+        } for p in content_pillars],
+        'platform_comparison': platform_comparison,
+        'sentiment_heatmap': [
+            {'theme': theme['theme'], 'sentiment': s['sentiment'], 'count': s['count']}
+            for theme in state['heatmap'] for s in theme['sentiments']
+        ],
+        'push_fix_drop': {
+            'push': push_items,
+            'fix': fix_items,
+            'drop': drop_items
+        },
+        'top_posts': [entry['post'] for entry in state['top_posts']],
+        'post_level_data': posts,
+        'best_post': posts[best],
+        'worst_post': posts[worst],
+        'classification_summary': classification_summary
+    }
+
+
+# ---- Search marketing ----
+
+def search_partial(mapped_data, row_offset: int = 0, with_rows: bool = False):
+    """
+    Aggregates of mapped search marketing rows (numbered from row_offset + 1),
+    plus their opportunity_map entries when with_rows.
+    Raises ColumnarFallback for inputs the columnar engine can't reproduce exactly.
+    """
+    keywords_all, volume_all, difficulty_all, invalid, details = search_columns(mapped_data, row_offset)
+    valid = np.flatnonzero(~invalid)
+    state = {
+        'rows': len(mapped_data),
+        'skipped': len(mapped_data) - len(valid),
+        'skipped_details': details,
+        'keywords': len(valid),
+        'total_volume': 0,
+        'total_difficulty': 0,
+        'easy': 0,
+        'hard': 0,
+        'intents': [],
+        'competitor_ranking': [],
+        'content_gaps': [],
+        'top_keywords': []
+    }
+    if not len(valid):
+        return state, []
+
+    index = valid.tolist()
+    if len(index) < len(mapped_data):
+        rows = take_rows(mapped_data, index)
+        keywords = [keywords_all[i] for i in index]
+        volume, difficulty = volume_all[valid], difficulty_all[valid]
+    else:
+        rows, keywords, volume, difficulty = mapped_data, keywords_all, volume_all, difficulty_all
+    n = len(index)
+
+    volume_int = volume.astype(np.int64)
+    difficulty_int = difficulty.astype(np.int64)
+    if max(int(np.abs(volume_int).max()), int(np.abs(difficulty_int).max())) * n >= 2 ** 63:
+        raise ColumnarFallback("Totals out of int64 range")
+
+    intents = [str(intent).lower() for intent in column_values(rows, 'intent', 'awareness')]
+    intent_codes, intent_names = encode(intents)
+    intent_weights = [INTENT_WEIGHTS.get(intent, 1) for intent in intent_names]
+    opportunity_scores = round_list((volume / difficulty) * np.array(intent_weights, dtype=np.float64)[intent_codes], 2)
+    scores = np.array(opportunity_scores, dtype=np.float64)
+    volume_list = volume_int.tolist()
+    difficulty_list = difficulty_int.tolist()
+
+    state['total_volume'] = int(volume_int.sum())
+    state['total_difficulty'] = int(difficulty_int.sum())
+    state['easy'] = int((difficulty_int <= 30).sum())
+    state['hard'] = int((difficulty_int > 60).sum())
+    for j, intent in enumerate(intent_names):
+        mask = intent_codes == j
+        state['intents'].append({
+            'intent': intent,
+            'count': int(mask.sum()),
+            'total_volume': int(volume_int[mask].sum()),
+            'total_difficulty': int(difficulty_int[mask].sum())
+        })
+
+    brand_ranks = column_values(rows, 'brand_ranking')
+    competitor_ranks = column_values(rows, 'competitor_ranking')
+    for i, (brand_rank, competitor_rank) in enumerate(zip(brand_ranks, competitor_ranks)):
+        if brand_rank and competitor_rank:
+            try:
+                brand_r = int(brand_rank)
+                comp_r = int(competitor_rank)
+            except (ValueError, TypeError):
+                continue
+            state['competitor_ranking'].append({
+                'keyword': keywords[i],
+                'brand_rank': brand_r,
+                'competitor_rank': comp_r,
+                'gap': comp_r - brand_r,
+                'volume': volume_list[i]
+            })
+            if len(state['competitor_ranking']) == 20:
+                break
+
+    gap_mask = np.fromiter(
+        (rank_missing(brand_rank) and not rank_missing(rank)
+         for brand_rank, rank in zip(brand_ranks, competitor_ranks)),
+        dtype=bool, count=n
+    )
+    gap_rows = np.flatnonzero(gap_mask)
+    state['content_gaps'] = [{
+        'index': row_offset + index[i],
+        'opportunity_score': opportunity_scores[i],
+        'gap': {
+            'keyword': keywords[i],
+            'competitor_rank': competitor_ranks[i],
+            'volume': volume_list[i],
+            'difficulty': difficulty_list[i],
+            'opportunity_score': opportunity_scores[i]
+        }
+    } for i in gap_rows[top_k(scores[gap_rows], 20)].tolist()]
+
+    for i in top_k(scores, 10).tolist():
+        template = INTENT_SUGGESTIONS.get(intents[i], "Create comprehensive guide on '{keyword}'")
+        state['top_keywords'].append({
+            'index': row_offset + index[i],
+            'opportunity_score': opportunity_scores[i],
+            'keyword': {
+                'keyword': keywords[i],
+                'opportunity_score': opportunity_scores[i],
+                'volume': volume_list[i],
+                'difficulty': difficulty_list[i],
+                'intent': intents[i].capitalize(),
+                'content_suggestion': template.format(keyword=keywords[i])
+            }
+        })
+
+    if not with_rows:
+        return state, []
+    sizes = [weight * 100 for weight in intent_weights]
+    return state, [{
+        'keyword': keyword,
+        'x': x,
+        'y': y,
+        'size': sizes[code],
+        'color': color
+    } for keyword, x, y, code, color in zip(
+        keywords, difficulty_list, volume_list, intent_codes.tolist(), column_values(rows, 'competition_level', 'Unknown')
+    )]
+
+
+def merge_search(state: Dict[str, Any], other: Dict[str, Any]) -> Dict[str, Any]:
+    """Aggregates of state's rows followed by other's rows"""
+    return {
+        'rows': state['rows'] + other['rows'],
+        'skipped': state['skipped'] + other['skipped'],
+        'skipped_details': (state['skipped_details'] + other['skipped_details'])[:10],
+        'keywords': state['keywords'] + other['keywords'],
+        'total_volume': state['total_volume'] + other['total_volume'],
+        'total_difficulty': state['total_difficulty'] + other['total_difficulty'],
+        'easy': state['easy'] + other['easy'],
+        'hard': state['hard'] + other['hard'],
+        'intents': _merge_groups(state['intents'], other['intents'], 'intent', ('count', 'total_volume', 'total_difficulty')),
+        'competitor_ranking': (state['competitor_ranking'] + other['competitor_ranking'])[:20],
+        'content_gaps': _merge_top(state['content_gaps'], other['content_gaps'], 20, 'opportunity_score'),
+        'top_keywords': _merge_top(state['top_keywords'], other['top_keywords'], 10, 'opportunity_score')
+    }
+
+
+def finalize_search(state: Dict[str, Any], opportunity_map: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Analytics result from merged aggregates and every valid keyword's map entry"""
+    if not state['rows']:
+        return {'error': 'No data available for analytics'}
+    data_warnings = _skipped_warnings(state, 'keyword')
+    if not state['keywords']:
+        return {
+            'error': 'No valid data available for analytics',
+            'warnings': data_warnings
+        }
+
+    n = state['keywords']
+    return {
+        'warnings': data_warnings if data_warnings else None,
+        'overview': {
+            'total_keywords': n,
+            'total_search_volume': state['total_volume'],
+            'avg_keyword_difficulty': round(state['total_difficulty'] / n, 2)
+        },
+        'opportunity_map': opportunity_map,
+        'intent_funnel': [{
+            'intent': intent['intent'].capitalize(),
+            'count': intent['count'],
+            'avg_volume': round(intent['total_volume'] / intent['count'], 2),
+            'avg_difficulty': round(intent['total_difficulty'] / intent['count'], 2),
+            'total_volume': intent['total_volume']
+        } for intent in state['intents']],
+        'competitor_ranking': state['competitor_ranking'],
+        'content_gaps': [entry['gap'] for entry in state['content_gaps']],
+        'top_keywords': [entry['keyword'] for entry in state['top_keywords']],
+        'difficulty_distribution': {
+            'Easy (0-30)': state['easy'],
+            'Medium (31-60)': n - state['easy'] - state['hard'],
+            'Hard (61-100)': state['hard']
+        }
+    }
+
+
+def compare_results(actual: Dict[str, Any], expected: Dict[str, Any]) -> List[str]:
+    """Top-level sections whose values differ"""
+    return [key for key in expected if repr(actual.get(key)) != repr(expected[key])]
+
+
+class AnalyticsAggregateService:
+    """
+    Stored partial aggregates per module (analytics_aggregates/{module}).
+
+    - the aggregates cover the first covered_chunks chunks of the dataset and
+      the analytics result saved with input_hash
+    - when the dataset has the same first chunks plus appended ones (and the
+      mapping and options are unchanged), only the appended chunks are read
+    - anything else (edits, deletes, a new mapping) falls back to a full run
+    """
+
+    @staticmethod
+    def partial(module: str, mapped_data, row_offset: int = 0, with_rows: bool = False):
+        if module == 'social_media':
+            return social_partial(mapped_data, row_offset, with_rows)
+        return search_partial(mapped_data, row_offset, with_rows)
+
+    @staticmethod
+    def merge(module: str, state: Dict[str, Any], other: Dict[str, Any]) -> Dict[str, Any]:
+        return merge_social(state, other) if module == 'social_media' else merge_search(state, other)
+
+    @staticmethod
+    def state_key(module: str, manifest: Dict[str, Any], covered_chunks: int, mappings: Dict[str, str],
+                  options: Dict[str, Any]) -> str:
+        """Identity of the aggregated input: the covered chunks, mapping, engine version and options"""
+        prefix = [chunk['hash'] for chunk in manifest.get('chunks', [])[:covered_chunks]]
+        return AnalyticsEngineService.input_hash(
+            module, ChunkedDatasetService.content_hash([], prefix), mappings, options
+        )
+
+    @staticmethod
+    def get_state(module: str) -> Optional[Dict[str, Any]]:
+        doc = db.document(f'{AGGREGATES_COLLECTION}/{module}').get()
+        return doc.to_dict() if doc.exists else None
+
+    @staticmethod
+    def save_state(module: str, state: Dict[str, Any], manifest: Dict[str, Any], mappings: Dict[str, str],
+                   options: Dict[str, Any], input_hash: str) -> None:
+        """Store aggregates of the whole dataset next to the result saved with input_hash"""
+        if not ChunkedDatasetService.is_chunked(manifest):
+            return
+        try:
+            covered_chunks = len(manifest.get('chunks', []))
+            db.document(f'{AGGREGATES_COLLECTION}/{module}').set({
+                'module': module,
+                'state': state,
+                'covered_chunks': covered_chunks,
+                'state_key': AnalyticsAggregateService.state_key(module, manifest, covered_chunks, mappings, options),
+                'input_hash': input_hash,
+                'updated_at': datetime.now(timezone.utc).isoformat()
+            })
+        except Exception as e:
+            # Only costs the next append a full run
+            print(f"Error saving {module} analytics aggregates: {e}")
+
+    @staticmethod
+    def run_incremental(module: str, manifest: Optional[Dict[str, Any]], mappings: Dict[str, str],
+                        options: Dict[str, Any], stored_record: Optional[Dict[str, Any]]):
+        """
+        (state, result) for a dataset that only grew by appended chunks since the
+        stored result, reading just those chunks; None when that doesn't apply.
+        """
+        if not ChunkedDatasetService.is_chunked(manifest) or not stored_record or not mappings:
+            return None
+        saved = AnalyticsAggregateService.get_state(module)
+        if not saved or not stored_record.get('input_hash') or saved.get('input_hash') != stored_record['input_hash']:
+            return None
+        covered = saved.get('covered_chunks', 0)
+        if not 0 < covered < len(manifest.get('chunks', [])):
+            return None
+        if saved.get('state_key') != AnalyticsAggregateService.state_key(module, manifest, covered, mappings, options):
+            return None
+
+        state = saved['state']
+        previous = stored_record.get('data') or {}
+        table = MappingProjection(mappings).project(ChunkedDatasetService.iter_chunks(module, manifest, start_chunk=covered))
+        appended, new_rows = AnalyticsAggregateService.partial(module, table, state['rows'], with_rows=True)
+        state = AnalyticsAggregateService.merge(module, state, appended)
+        if module == 'social_media':
+            posts = merge_posts(previous.get('post_level_data') or [], new_rows, options.get('sort_posts', True))
+            return state, finalize_social(state, posts)
+        return state, finalize_search(state, (previous.get('opportunity_map') or []) + new_rows)
+
+    @staticmethod
+    def run(module: str, username: str, manifest: Optional[Dict[str, Any]], mappings: Dict[str, str],
+            options: Dict[str, Any], stored_record: Optional[Dict[str, Any]], incremental: bool = True,
+            verify: bool = False):
+        """
+        Analytics for the current dataset: merged from appended chunks when possible,
+        otherwise a full run. verify=True also runs in full and reports the sections
+        where the merged result differs (the full result is returned).
+        Returns (analytics, aggregates or None, status).
+        """
+        from services.dynamic_data_service import DynamicDataService
+
+        merged = None
+        if incremental or verify:
+            try:
+                merged = AnalyticsAggregateService.run_incremental(module, manifest, mappings, options, stored_record)
+            except Exception as e:
+                print(f"Incremental {module} analytics failed, running in full: {e}")
+        if merged and not verify:
+            state, analytics = merged
+            return analytics, state, {'incremental': True}
+
+        mapped_data = DynamicDataService.get_mapped_table(username, module, manifest, mappings)
+        if not mapped_data:
+            return None, None, {'incremental': False}
+        if module == 'social_media':
+            analytics = AnalyticsEngineService.social_media_analytics(mapped_data, sort_posts=options.get('sort_posts', True))
+        else:
+            analytics = AnalyticsEngineService.search_marketing_analytics(mapped_data)
+
+        status = {'incremental': False}
+        if merged:
+            state = merged[0]
+            status['verification'] = {'differences': compare_results(merged[1], analytics)}
+        else:
+            try:
+                state = AnalyticsAggregateService.partial(module, mapped_data)[0]
+            except Exception as e:
+                print(f"Error aggregating {module} analytics, next append runs in full: {e}")
+                state = None
+        return analytics, state, status
@@ -0,0 +1,680 @@
+"""
+Columnar execution path for social media and search marketing analytics
+Parses mapped rows once into typed NumPy columns and computes the same results as
+AnalyticsEngineService's row-by-row implementation with grouped array operations
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from typing import Any, Dict, List
+from array_utils import Vocabulary, sequential_sum, top_k
+from services.mapped_projection_service import MappedTable
+
+ENGAGEMENT_FIELDS = ('likes', 'comments', 'shares', 'saves', 'views')
+
+# Largest magnitude whose float -> int64 cast matches int()
+MAX_EXACT_INT = 2.0 ** 62
+
+
+class ColumnarFallback(Exception):
+    """Input the columnar path can't reproduce exactly; use the row engine"""
+
+
+def safe_num(value, default=0):
+    """Same coercion the row engine uses for numeric cells"""
+    try:
+        return float(value) if value not in [None, '', 'null'] else default
+    except (ValueError, TypeError):
+        return default
+
+
+def is_default(value) -> bool:
+    """True where safe_num returns its (int) default instead of a float"""
+    if value in [None, '', 'null']:
+        return True
+    try:
+        float(value)
+    except (ValueError, TypeError):
+        return True
+    return False
+
+
+def int_rate_rows(rows, views: np.ndarray, total_engagement: np.ndarray) -> List[int]:
+    """
+    Posts whose row-loop engagement rate is int 0: with views <= 0 the rate is
+    total_engagement itself, an int when every engagement cell fell back to
+    safe_num's default.
+    """
+    return [
+        i for i in np.flatnonzero((views <= 0) & (total_engagement == 0)).tolist()
+        if all(is_default(rows[i].get(field, 0)) for field in ENGAGEMENT_FIELDS[:4])
+    ]
+
+
+def parse_numbers(values: List[Any]) -> np.ndarray:
+    """
+    safe_num over a column. Clean columns take the C-level float() map;
+    anything float() rejects (None, '', 'null', junk) falls back per cell.
+    """
+    try:
+        parsed = np.array(list(map(float, values)), dtype=np.float64)
+    except (ValueError, TypeError):
+        parsed = np.array([safe_num(value) for value in values], dtype=np.float64)
+    if len(parsed) and (not np.isfinite(parsed).all() or np.abs(parsed).max() >= MAX_EXACT_INT):
+        # nan/inf/huge values make the row engine's sort/int() behaviour order-dependent
+        raise ColumnarFallback("Non-finite or out-of-range numeric values")
+    return parsed
+
+
+def encode(values: List[Any]):
+    """Codes in first-appearance order plus the distinct values"""
+    vocabulary = Vocabulary()
+    codes = np.array([vocabulary[value] for value in values], dtype=np.int64)
+    return codes, vocabulary.names
+
+
+def round_list(values: np.ndarray, digits: int) -> List[float]:
+    """Python's round() per element (np.round can differ in the last digit)"""
+    return [round(value, digits) for value in values.tolist()]
+
+
+def column_values(rows, field: str, default: Any = None) -> List[Any]:
+    """[row.get(field, default) for row in rows]; a MappedTable hands over its column"""
+    if isinstance(rows, MappedTable):
+        return rows.column(field, default)
+    return [row.get(field, default) for row in rows]
+
+
+def take_rows(rows, index: List[int]):
+    if isinstance(rows, MappedTable):
+        return rows.take(index)
+    return [rows[i] for i in index]
+
+
+def _first_url(values) -> Any:
+    """First non-blank URL/link value, else the last candidate's value"""
+    url = ''
+    for url in values:
+        if url and url.strip():
+            break
+    return url
+
+
+def post_urls(rows: List[Dict[str, Any]]) -> List[Any]:
+    """URL column, resolving URL-like keys once per distinct key layout"""
+    if isinstance(rows, MappedTable):
+        # One layout for the whole table ('id' is never URL-like)
+        url_keys = [key for key in rows.fields if 'url' in str(key).lower() or 'link' in str(key).lower()]
+        if not url_keys:
+            return [''] * len(rows)
+        return [_first_url(values) for values in zip(*(rows.column(key, '') for key in url_keys))]
+    layouts = {}
+    urls = []
+    for row in rows:
+        layout = tuple(row)
+        url_keys = layouts.get(layout)
+        if url_keys is None:
+            url_keys = layouts[layout] = [
+                key for key in layout
+                if 'url' in str(key).lower() or 'link' in str(key).lower()
+            ]
+        urls.append(_first_url((row.get(key, '') for key in url_keys)))
+    return urls
+
+
+def sentiment_category(sentiment: Any) -> str:
+    if isinstance(sentiment, (int, float)):
+        score = float(sentiment)
+        return 'positive' if score > 0.20 else ('negative' if score < -0.20 else 'neutral')
+    sentiment_str = str(sentiment).lower()
+    if 'pos' in sentiment_str:
+        return 'positive'
+    if 'neg' in sentiment_str:
+        return 'negative'
+    return 'neutral'
+
+
+# (engagement level, sentiment category) -> classification
+CLASSIFICATION_RULES = {
+    ('high', 'positive'): 'PUSH', ('high', 'neutral'): 'PUSH', ('high', 'negative'): 'FIX',
+    ('medium', 'positive'): 'PUSH', ('medium', 'neutral'): 'FIX', ('medium', 'negative'): 'FIX',
+    ('low', 'positive'): 'FIX', ('low', 'neutral'): 'DROP', ('low', 'negative'): 'DROP'
+}
+LEVELS = ('high', 'medium', 'low')
+CLASSES = ('PUSH', 'FIX', 'DROP')
+CATEGORIES = ('positive', 'neutral', 'negative')
+
+
+def pillar_rows(names: List[Any], counts: List[int], rate_sums: List[float], view_sums: List[float],
+                positive: List[float], negative: List[float]) -> List[Dict[str, Any]]:
+    """Content pillars from per-post-type sums, best average engagement first"""
+    content_pillars = []
+    for j, pillar_name in enumerate(names):
+        count = counts[j]
+        content_pillars.append({
+            'pillar': pillar_name,
+            'total_posts': count,
+            'avg_engagement_rate': round(rate_sums[j] / count, 4),
+            'avg_views': round(view_sums[j] / count, 2),
+            'positive_ratio': int(positive[j]) / max(count, 1),
+            'negative_ratio': int(negative[j]) / max(count, 1)
+        })
+    content_pillars.sort(key=lambda x: x['avg_engagement_rate'], reverse=True)
+    return content_pillars
+
+
+def platform_rows(names: List[Any], counts: List[int], rate_sums: List[float], view_sums: List[float],
+                  share_sums: List[float]):
+    """Platform comparison from per-platform sums, plus the average the thresholds use"""
+    platform_comparison = []
+    avg_engagement_rate = 0
+    for j, platform_name in enumerate(names):
+        count = counts[j]
+        # The row engine reuses this name, so the last platform's average is
+        # what the overview and the PUSH/FIX/DROP thresholds see
+        avg_engagement_rate = rate_sums[j] / count
+        platform_comparison.append({
+            'platform': platform_name,
+            'posting_frequency': count,
+            'avg_engagement_rate': round(avg_engagement_rate, 4),
+            'avg_views': round(view_sums[j] / count, 2),
+            'avg_shares': round(share_sums[j] / count, 2)
+        })
+    return platform_comparison, avg_engagement_rate
+
+
+def push_fix_drop(content_pillars: List[Dict[str, Any]], avg_engagement_rate: float, total_views: float, n: int):
+    """Pillar-level PUSH / FIX / DROP recommendations"""
+    push_items, fix_items, drop_items = [], [], []
+    high_engagement_threshold = avg_engagement_rate * 0.92
+    low_engagement_threshold = avg_engagement_rate * 0.85
+    for pillar in content_pillars:
+        pillar_engagement = pillar['avg_engagement_rate']
+        pillar_name = pillar['pillar']
+        positive_ratio = pillar['positive_ratio']
+        negative_ratio = pillar['negative_ratio']
+
+        if pillar_engagement >= high_engagement_threshold and positive_ratio >= 0.5:
+            push_items.append({
+                'type': pillar_name,
+                'engagement_rate': round(pillar_engagement, 4),
+                'reason': f'Strong engagement ({round(pillar_engagement * 100, 2)}%) with {int(positive_ratio * 100)}% positive sentiment',
+                'action': f'Increase {pillar_name} content frequency by 25-50%'
+            })
+        elif pillar_engagement >= avg_engagement_rate * 0.85 and negative_ratio >= 0.25:
+            fix_items.append({
+                'type': pillar_name,
+                'engagement_rate': round(pillar_engagement, 4),
+                'reason': f'Decent engagement ({round(pillar_engagement * 100, 2)}%) but {int(negative_ratio * 100)}% negative sentiment detected',
+                'action': f'Audit {pillar_name} messaging to address concerns and improve sentiment'
+            })
+        elif pillar_engagement <= low_engagement_threshold and pillar['avg_views'] < (total_views / n * 0.75):
+            drop_items.append({
+                'type': pillar_name,
+                'engagement_rate': round(pillar_engagement, 4),
+                'reason': f'Below average engagement ({round(pillar_engagement * 100, 2)}%) with limited reach ({int(pillar["avg_views"])} avg views)',
+                'action': f'Consider pausing {pillar_name} content or testing new approaches'
+            })
+    return push_items, fix_items, drop_items
+
+
+def social_columns(mapped_data: List[Dict[str, Any]], row_offset: int = 0):
+    """
+    Platform, post type and engagement columns for every row, the mask of rows
+    the engine skips and details of the first 10 (numbered from row_offset + 1)
+    """
+    n_rows = len(mapped_data)
+    platforms_all = column_values(mapped_data, 'platform', '')
+    post_types_all = column_values(mapped_data, 'post_type', '')
+    numbers_all = {
+        field: parse_numbers(column_values(mapped_data, field, 0))
+        for field in ENGAGEMENT_FIELDS
+    }
+
+    missing_platform = np.fromiter((not p or p == 'null' for p in platforms_all), dtype=bool, count=n_rows)
+    missing_post_type = np.fromiter((not t or t == 'null' for t in post_types_all), dtype=bool, count=n_rows)
+    no_engagement = np.ones(n_rows, dtype=bool)
+    for field in ENGAGEMENT_FIELDS:
+        no_engagement &= numbers_all[field] == 0
+    invalid = missing_platform | missing_post_type | no_engagement
+
+    details = []
+    for i in np.flatnonzero(invalid)[:10].tolist():
+        issues = []
+        if missing_platform[i]:
+            issues.append('Missing Platform')
+        if missing_post_type[i]:
+            issues.append('Missing Post Type')
+        if no_engagement[i]:
+            issues.append('No engagement data')
+        details.append({
+            'row': row_offset + i + 1,
+            'platform': platforms_all[i] or 'N/A',
+            'post_type': post_types_all[i] or 'N/A',
+            'issues': ', '.join(issues)
+        })
+    return platforms_all, post_types_all, numbers_all, invalid, details
+
+
+def social_media_analytics(mapped_data: List[Dict[str, Any]], sort_posts: bool = True) -> Dict[str, Any]:
+    """
+    Columnar social media analytics; output is identical to
+    AnalyticsEngineService._social_media_analytics_rows.
+    sort_posts=False leaves post_level_data in row order.
+    Raises ColumnarFallback for inputs it can't reproduce exactly.
+    """
+    if not mapped_data:
+        return {'error': 'No data available for analytics'}
+
+    # ---- Parse once: typed columns for every row ----
+    platforms_all, post_types_all, numbers_all, invalid, details = social_columns(mapped_data)
+
+    data_warnings = []
+    skipped = np.flatnonzero(invalid)
+    if len(skipped):
+        data_warnings.append({
+            'type': 'warning',
+            'message': f'{len(skipped)} row(s) skipped due to missing critical data',
+            'details': details
+        })
+
+    valid = np.flatnonzero(~invalid)
+    if not len(valid):
+        return {
+            'error': 'No valid data available for analytics',
+            'warnings': data_warnings
+        }
+
+    if len(skipped):
+        index = valid.tolist()
+        rows = take_rows(mapped_data, index)
+        platforms = [platforms_all[i] for i in index]
+        post_types = [post_types_all[i] for i in index]
+        numbers = {field: column[valid] for field, column in numbers_all.items()}
+    else:
+        rows, platforms, post_types, numbers = mapped_data, platforms_all, post_types_all, numbers_all
+    sentiments = column_values(rows, 'sentiment', 'Unknown')
+    themes = column_values(rows, 'key_themes', 'Unknown')
+
+    likes, comments, shares, saves, views = (numbers[field] for field in ENGAGEMENT_FIELDS)
+    n = len(rows)
+
+    # ---- Engagement rate (same float operations as the row loop) ----
+    total_engagement = likes + comments + shares + saves
+    with np.errstate(divide='ignore', invalid='ignore'):
+        engagement_rate = np.where(views > 0, total_engagement / views, total_engagement)
+
+    total_views = sequential_sum(views)
+
+    # ---- Content pillars: group by post type ----
+    pillar_codes, pillar_names = encode(post_types)
+    sentiment_codes, sentiment_values = encode(sentiments)
+    is_positive = np.array([str(s).lower() in ['positive', 'pos'] for s in sentiment_values], dtype=np.float64)
+    is_negative = np.array([str(s).lower() in ['negative', 'neg'] for s in sentiment_values], dtype=np.float64)
+
+    n_pillars = len(pillar_names)
+    pillar_counts = np.bincount(pillar_codes, minlength=n_pillars).tolist()
+    pillar_rate_sums = np.bincount(pillar_codes, weights=engagement_rate, minlength=n_pillars).tolist()
+    pillar_view_sums = np.bincount(pillar_codes, weights=views, minlength=n_pillars).tolist()
+    pillar_positive = np.bincount(pillar_codes, weights=is_positive[sentiment_codes], minlength=n_pillars).tolist()
+    pillar_negative = np.bincount(pillar_codes, weights=is_negative[sentiment_codes], minlength=n_pillars).tolist()
+
+    content_pillars = pillar_rows(
+        pillar_names, pillar_counts, pillar_rate_sums, pillar_view_sums, pillar_positive, pillar_negative
+    )
+
+    # ---- Platform comparison: group by platform ----
+    platform_codes, platform_names = encode(platforms)
+    n_platforms = len(platform_names)
+    platform_counts = np.bincount(platform_codes, minlength=n_platforms).tolist()
+    platform_rate_sums = np.bincount(platform_codes, weights=engagement_rate, minlength=n_platforms).tolist()
+    platform_view_sums = np.bincount(platform_codes, weights=views, minlength=n_platforms).tolist()
+    platform_share_sums = np.bincount(platform_codes, weights=shares, minlength=n_platforms).tolist()
+
+    platform_comparison, avg_engagement_rate = platform_rows(
+        platform_names, platform_counts, platform_rate_sums, platform_view_sums, platform_share_sums
+    )
+
+    # ---- Sentiment heatmap: themes x sentiment, first-appearance order ----
+    theme_codes, theme_names = encode(themes)
+    n_sentiments = max(len(sentiment_values), 1)
+    pair_keys = theme_codes * n_sentiments + sentiment_codes
+    pairs, first_index, pair_counts = np.unique(pair_keys, return_index=True, return_counts=True)
+    order = np.lexsort((first_index, pairs // n_sentiments))
+    # Sentiment as first seen within its theme (1 and True share a dict key)
+    sentiment_data = [
+        {'theme': theme_names[key // n_sentiments], 'sentiment': sentiments[first], 'count': count}
+        for key, first, count in zip(pairs[order].tolist(), first_index[order].tolist(), pair_counts[order].tolist())
+    ]
+
+    # ---- Pillar-level PUSH / FIX / DROP ----
+    push_items, fix_items, drop_items = push_fix_drop(content_pillars, avg_engagement_rate, total_views, n)
+
+    rounded_rates = round_list(engagement_rate, 4)
+    for i in int_rate_rows(rows, views, total_engagement):
+        rounded_rates[i] = 0
+
+    # ---- Top posts by total engagement ----
+    # Re-parsed from the row: safe_num keeps an int default for unparseable cells
+    top_posts = [{
+        'platform': platforms[i],
+        'post_type': post_types[i],
+        'likes': safe_num(rows[i].get('likes', 0)),
+        'comments': safe_num(rows[i].get('comments', 0)),
+        'shares': safe_num(rows[i].get('shares', 0)),
+        'engagement_rate': rounded_rates[i]
+    } for i in top_k(total_engagement, 5).tolist()]
+
+    # ---- Post-level data, ranked by rounded engagement rate (stable) ----
+    rates = np.array(rounded_rates, dtype=np.float64)
+    # First / last post of the stable descending order
+    best = int(np.argmax(rates))
+    worst = n - 1 - int(np.argmin(rates[::-1]))
+
+    columns = {
+        'platform': platforms,
+        'post_url': post_urls(rows),
+        'post_type': post_types,
+        'engagement_rate': rounded_rates,
+        'view_count': views.astype(np.int64).tolist(),
+        'sentiment': sentiments,
+        'likes': likes.astype(np.int64).tolist(),
+        'comments': comments.astype(np.int64).tolist(),
+        'shares': shares.astype(np.int64).tolist(),
+        'saves': saves.astype(np.int64).tolist(),
+        'total_engagement': total_engagement.astype(np.int64).tolist()
+    }
+
+    classified = n >= 4
+    if classified:
+        # Descending positions n*0.25 and n*0.75, selected in O(n)
+        high_position = n - 1 - max(0, int(n * 0.25) - 1)
+        low_position = n - 1 - min(n - 1, int(n * 0.75))
+        selected = np.partition(rates, [low_position, high_position])
+        high_threshold = selected[high_position].item()
+        low_threshold = selected[low_position].item()
+        levels = np.where(rates >= high_threshold, 0, np.where(rates >= low_threshold, 1, 2))
+        categories_by_value = np.array(
+            [CATEGORIES.index(sentiment_category(s)) for s in sentiment_values], dtype=np.int64
+        )
+        categories = categories_by_value[sentiment_codes]
+        rule_table = np.array(
+            [[CLASSES.index(CLASSIFICATION_RULES[(level, category)]) for category in CATEGORIES] for level in LEVELS]
+        )
+        class_codes = rule_table[levels, categories]
+        columns['classification'] = [CLASSES[c] for c in class_codes.tolist()]
+        columns['engagement_level'] = [LEVELS[l] for l in levels.tolist()]
+        columns['sentiment_category'] = [CATEGORIES[c] for c in categories.tolist()]
+
+    keys = list(columns)
+    values = [columns[key] for key in keys]
+    posts = [dict(zip(keys, post)) for post in zip(*values)]
+    if sort_posts:
+        post_level_data = [posts[i] for i in np.argsort(-rates, kind='stable').tolist()]
+    else:
+        post_level_data = posts
+
+    if classified:
+        by_class = {}
+        for code, label in enumerate(CLASSES):
+            members = np.flatnonzero(class_codes == code)
+            by_class[label] = (len(members), [posts[i] for i in members[top_k(rates[members], 10)].tolist()])
+        classification_summary = {
+            'push_count': by_class['PUSH'][0],
+            'fix_count': by_class['FIX'][0],
+            'drop_count': by_class['DROP'][0],
+            'push_posts': by_class['PUSH'][1],
+            'fix_posts': by_class['FIX'][1],
+            'drop_posts': by_class['DROP'][1],
+            'thresholds': {
+                'high_engagement': high_threshold,
+                'low_engagement': low_threshold
+            }
+        }
+    else:
+        classification_summary = {
+            'push_count': 0,
+            'fix_count': 0,
+            'drop_count': 0,
+            'push_posts': [],
+            'fix_posts': [],
+            'drop_posts': [],
+            'message': 'Need at least 4 posts for classification'
+        }
+
+    return {
+        'warnings': data_warnings if data_warnings else None,
+        'overview': {
+            'total_posts': n,
+            'total_likes': int(sequential_sum(likes)),
+            'total_comments': int(sequential_sum(comments)),
+            'total_shares': int(sequential_sum(shares)),
+            'total_saves': int(sequential_sum(saves)),
+            'total_views': int(total_views),
+            'avg_engagement_rate': round(avg_engagement_rate, 4)
+        },
+        'content_pillars': [{
+            'pillar': p['pillar'],
+            'total_posts': p['total_posts'],
+            'avg_engagement_rate': p['avg_engagement_rate'],
+            'avg_views': p['avg_views']
+        } for p in content_pillars],
+        'platform_comparison': platform_comparison,
+        'sentiment_heatmap': sentiment_data,
+        'push_fix_drop': {
+            'push': push_items,
+            'fix': fix_items,
+            'drop': drop_items
+        },
+        'top_posts': top_posts,
+        'post_level_data': post_level_data,
+        'best_post': posts[best],
+        'worst_post': posts[worst],
+        'classification_summary': classification_summary
+    }
+
+
+INTENT_WEIGHTS = {
+    'awareness': 1,
+    'consideration': 1.5,
+    'purchase': 2
+}
+
+INTENT_SUGGESTIONS = {
+    'awareness': "Create educational content: 'What is {keyword}?'",
+    'consideration': "Create comparison: '{keyword} - Complete Guide'",
+    'purchase': "Optimize product page for '{keyword}'"
+}
+
+
+def rank_missing(value: Any) -> bool:
+    return not value or value in ['', 'null', None]
+
+
+def search_columns(mapped_data: List[Dict[str, Any]], row_offset: int = 0):
+    """
+    Keyword, volume and difficulty columns for every row, the mask of rows the
+    engine skips and details of the first 10 (numbered from row_offset + 1)
+    """
+    n_rows = len(mapped_data)
+    keywords_all = column_values(mapped_data, 'keyword', '')
+    volume_all = parse_numbers(column_values(mapped_data, 'search_volume', 0))
+    difficulty_all = parse_numbers(column_values(mapped_data, 'keyword_difficulty', 0))
+
+    missing_keyword = np.fromiter((not k or k == 'null' for k in keywords_all), dtype=bool, count=n_rows)
+    no_volume = volume_all <= 0
+    no_difficulty = difficulty_all <= 0
+    invalid = missing_keyword | no_volume | no_difficulty
+
+    details = []
+    for i in np.flatnonzero(invalid)[:10].tolist():
+        issues = []
+        if missing_keyword[i]:
+            issues.append('Missing Keyword')
+        if no_volume[i]:
+            issues.append('Missing/Zero Search Volume')
+        if no_difficulty[i]:
+            issues.append('Missing Keyword Difficulty')
+        details.append({
+            'row': row_offset + i + 1,
+            'keyword': keywords_all[i] or 'N/A',
+            'issues': ', '.join(issues)
+        })
+    return keywords_all, volume_all, difficulty_all, invalid, details
+
+
+def search_marketing_analytics(mapped_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Columnar search marketing analytics; output is identical to
+    AnalyticsEngineService._search_marketing_analytics_rows.
+    Raises ColumnarFallback for inputs it can't reproduce exactly.
+    """
+    if not mapped_data:
+        return {'error': 'No data available for analytics'}
+
+    # ---- Parse once ----
+    keywords_all, volume_all, difficulty_all, invalid, details = search_columns(mapped_data)
+
+    data_warnings = []
+    skipped = np.flatnonzero(invalid)
+    if len(skipped):
+        data_warnings.append({
+            'type': 'warning',
+            'message': f'{len(skipped)} keyword(s) skipped due to missing critical data',
+            'details': details
+        })
+
+    valid = np.flatnonzero(~invalid)
+    if not len(valid):
+        return {
+            'error': 'No valid data available for analytics',
+            'warnings': data_warnings
+        }
+
+    if len(skipped):
+        index = valid.tolist()
+        rows = take_rows(mapped_data, index)
+        keywords = [keywords_all[i] for i in index]
+        volume, difficulty = volume_all[valid], difficulty_all[valid]
+    else:
+        rows, keywords, volume, difficulty = mapped_data, keywords_all, volume_all, difficulty_all
+    n = len(rows)
+
+    volume_int = volume.astype(np.int64)
+    difficulty_int = difficulty.astype(np.int64)
+    if max(int(np.abs(volume_int).max()), int(np.abs(difficulty_int).max())) * n >= 2 ** 63:
+        # int64 totals could overflow where Python ints don't
+        raise ColumnarFallback("Totals out of int64 range")
+
+    # ---- Opportunity score: (volume / difficulty) x intent weight ----
+    intents = [str(intent).lower() for intent in column_values(rows, 'intent', 'awareness')]
+    intent_codes, intent_names = encode(intents)
+    intent_weights = [INTENT_WEIGHTS.get(intent, 1) for intent in intent_names]
+    weight_table = np.array(intent_weights, dtype=np.float64)
+    # difficulty > 0 for every valid row, so the no-difficulty branch never applies
+    opportunity_scores = round_list((volume / difficulty) * weight_table[intent_codes], 2)
+    scores = np.array(opportunity_scores, dtype=np.float64)
+
+    volume_list = volume_int.tolist()
+    difficulty_list = difficulty_int.tolist()
+
+    # ---- Opportunity map ----
+    sizes = [weight * 100 for weight in intent_weights]
+    opportunity_map = [{
+        'keyword': keyword,
+        'x': x,
+        'y': y,
+        'size': sizes[code],
+        'color': color
+    } for keyword, x, y, code, color in zip(
+        keywords, difficulty_list, volume_list, intent_codes.tolist(), column_values(rows, 'competition_level', 'Unknown')
+    )]
+
+    # ---- Intent funnel: masked aggregation per intent ----
+    intent_data = []
+    for j, intent in enumerate(intent_names):
+        mask = intent_codes == j
+        count = int(mask.sum())
+        total_volume = int(volume_int[mask].sum())
+        total_difficulty = int(difficulty_int[mask].sum())
+        intent_data.append({
+            'intent': intent.capitalize(),
+            'count': count,
+            'avg_volume': round(total_volume / count, 2),
+            'avg_difficulty': round(total_difficulty / count, 2),
+            'total_volume': total_volume
+        })
+
+    # ---- Competitor gaps: only the first 20 in row order are reported ----
+    brand_ranks = column_values(rows, 'brand_ranking')
+    competitor_ranks = column_values(rows, 'competitor_ranking')
+    competitor_gaps = []
+    for i, (brand_rank, competitor_rank) in enumerate(zip(brand_ranks, competitor_ranks)):
+        if brand_rank and competitor_rank:
+            try:
+                brand_r = int(brand_rank)
+                comp_r = int(competitor_rank)
+            except (ValueError, TypeError):
+                continue
+            competitor_gaps.append({
+                'keyword': keywords[i],
+                'brand_rank': brand_r,
+                'competitor_rank': comp_r,
+                'gap': comp_r - brand_r,
+                'volume': volume_list[i]
+            })
+            if len(competitor_gaps) == 20:
+                break
+
+    # ---- Content gaps: no brand rank but a competitor rank, top 20 by score ----
+    gap_mask = np.fromiter(
+        (rank_missing(brand_rank) and not rank_missing(rank)
+         for brand_rank, rank in zip(brand_ranks, competitor_ranks)),
+        dtype=bool, count=n
+    )
+    gap_rows = np.flatnonzero(gap_mask)
+    content_gaps = [{
+        'keyword': keywords[i],
+        'competitor_rank': competitor_ranks[i],
+        'volume': volume_list[i],
+        'difficulty': difficulty_list[i],
+        'opportunity_score': opportunity_scores[i]
+    } for i in gap_rows[top_k(scores[gap_rows], 20)].tolist()]
+
+    # ---- Top 10 keywords by opportunity score ----
+    top_keywords = []
+    for i in top_k(scores, 10).tolist():
+        intent = intents[i]
+        template = INTENT_SUGGESTIONS.get(intent, "Create comprehensive guide on '{keyword}'")
+        top_keywords.append({
+            'keyword': keywords[i],
+            'opportunity_score': opportunity_scores[i],
+            'volume': volume_list[i],
+            'difficulty': difficulty_list[i],
+            'intent': intent.capitalize(),
+            'content_suggestion': template.format(keyword=keywords[i])
+        })
+
+    easy = int((difficulty_int <= 30).sum())
+    hard = int((difficulty_int > 60).sum())
+
+    return {
+        'warnings': data_warnings if data_warnings else None,
+        'overview': {
+            'total_keywords': n,
+            'total_search_volume': int(volume_int.sum()),
+            'avg_keyword_difficulty': round(int(difficulty_int.sum()) / n, 2)
+        },
+        'opportunity_map': opportunity_map,
+        'intent_funnel': intent_data,
+        'competitor_ranking': competitor_gaps,
+        'content_gaps': content_gaps,
+        'top_keywords': top_keywords,
+        'difficulty_distribution': {
+            'Easy (0-30)': easy,
+            'Medium (31-60)': n - easy - hard,
+            'Hard (61-100)': hard
+        }
+    }
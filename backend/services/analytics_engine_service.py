@@ -7,19 +7,60 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from typing import List, Dict, Any
+import hashlib
+import heapq
+import json
+import numpy as np
 from collections import defaultdict, Counter
+from services.analytics_columnar_service import (
+    ColumnarFallback,
+    social_media_analytics as social_media_analytics_columnar,
+    search_marketing_analytics as search_marketing_analytics_columnar
+)
+
+
+# Bump whenever analytics output changes for the same input; invalidates memoized results
+ANALYTICS_ENGINE_VERSION = 2
 
 
 class AnalyticsEngineService:
     """Generate analytics from mapped data with exact formulas"""
     
     @staticmethod
-    def social_media_analytics(mapped_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def input_hash(module: str, dataset_hash: str, mappings: Dict[str, str], options: Dict[str, Any] = None) -> str:
+        """Memoization key: dataset content, column mapping, engine version and run options"""
+        key = {
+            'module': module,
+            'dataset': dataset_hash,
+            'mappings': mappings,
+            'engine_version': ANALYTICS_ENGINE_VERSION,
+            'options': options or {}
+        }
+        return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def social_media_analytics(mapped_data: List[Dict[str, Any]], engine: str = 'auto', sort_posts: bool = True) -> Dict[str, Any]:
         """
         Generate social media analytics from mapped data
         Expected fields: platform, post_type, likes, comments, shares, saves, views, 
                         posting_date, sentiment, key_themes
+
+        engine: 'auto' / 'columnar' use the vectorized path (falling back to the
+        row loop for inputs it can't reproduce exactly), 'rows' forces the row loop
+        sort_posts: sort post_level_data by engagement rate; when False posts stay
+        in row order (best/worst, thresholds and the per-class top 10 are unchanged)
         """
+        if engine != 'rows':
+            try:
+                return social_media_analytics_columnar(mapped_data, sort_posts=sort_posts)
+            except Exception as e:
+                if not isinstance(e, ColumnarFallback):
+                    print(f"Columnar social media analytics failed, using row engine: {str(e)}")
+        return AnalyticsEngineService._social_media_analytics_rows(mapped_data, sort_posts=sort_posts)
+
+    @staticmethod
+    def _social_media_analytics_rows(mapped_data: List[Dict[str, Any]], sort_posts: bool = True) -> Dict[str, Any]:
+        """Row-by-row social media analytics (reference implementation)"""
         try:
             if not mapped_data:
                 return {'error': 'No data available for analytics'}
@@ -244,11 +285,8 @@ class AnalyticsEngineService:
                     })
             
             # TOP PERFORMING POSTS
-            top_posts = sorted(
-                posts_with_engagement,
-                key=lambda x: x['total_engagement'],
-                reverse=True
-            )[:5]  # Top 5
+            # nlargest is sorted(..., reverse=True)[:5] without sorting every post
+            top_posts = heapq.nlargest(5, posts_with_engagement, key=lambda x: x['total_engagement'])
             
             # POST-LEVEL DATA (All posts for detailed analysis)
             post_level_data = []
@@ -277,25 +315,27 @@ class AnalyticsEngineService:
                 })
             
             # Sort by engagement rate for better display
-            post_level_data.sort(key=lambda x: x['engagement_rate'], reverse=True)
+            by_engagement = lambda x: x['engagement_rate']
+            if sort_posts:
+                post_level_data.sort(key=by_engagement, reverse=True)
             
-            # Find best and worst performing posts
-            best_post = post_level_data[0] if post_level_data else None
-            worst_post = post_level_data[-1] if post_level_data else None
+            # Find best and worst performing posts (first / last of the descending order)
+            best_post = heapq.nlargest(1, post_level_data, key=by_engagement)[0] if post_level_data else None
+            worst_post = heapq.nsmallest(1, reversed(post_level_data), key=by_engagement)[0] if post_level_data else None
             
             # PUSH/FIX/DROP CLASSIFICATION
             # Calculate engagement percentiles
             if len(post_level_data) >= 4:  # Need at least 4 posts for meaningful percentiles
-                sorted_by_engagement = sorted(post_level_data, key=lambda x: x['engagement_rate'], reverse=True)
-                n = len(sorted_by_engagement)
+                rates = np.array([post['engagement_rate'] for post in post_level_data])
+                n = len(rates)
                 
-                # Top 25% threshold
-                high_threshold_idx = max(0, int(n * 0.25) - 1)
-                high_engagement_threshold = sorted_by_engagement[high_threshold_idx]['engagement_rate']
+                # Top 25% threshold: position in descending order, selected in O(n)
+                high_threshold_idx = n - 1 - max(0, int(n * 0.25) - 1)
+                high_engagement_threshold = np.partition(rates, high_threshold_idx)[high_threshold_idx].item()
                 
                 # Bottom 25% threshold (75th percentile position)
-                low_threshold_idx = min(n - 1, int(n * 0.75))
-                low_engagement_threshold = sorted_by_engagement[low_threshold_idx]['engagement_rate']
+                low_threshold_idx = n - 1 - min(n - 1, int(n * 0.75))
+                low_engagement_threshold = np.partition(rates, low_threshold_idx)[low_threshold_idx].item()
                 
                 # Classify each post
                 push_posts = []
@@ -370,9 +410,9 @@ class AnalyticsEngineService:
                     'push_count': len(push_posts),
                     'fix_count': len(fix_posts),
                     'drop_count': len(drop_posts),
-                    'push_posts': push_posts[:10],  # Top 10 for display
-                    'fix_posts': fix_posts[:10],
-                    'drop_posts': drop_posts[:10],
+                    'push_posts': heapq.nlargest(10, push_posts, key=by_engagement),  # Top 10 for display
+                    'fix_posts': heapq.nlargest(10, fix_posts, key=by_engagement),
+                    'drop_posts': heapq.nlargest(10, drop_posts, key=by_engagement),
                     'thresholds': {
                         'high_engagement': high_engagement_threshold,
                         'low_engagement': low_engagement_threshold
@@ -434,12 +474,25 @@ class AnalyticsEngineService:
             return {'error': str(e)}
     
     @staticmethod
-    def search_marketing_analytics(mapped_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def search_marketing_analytics(mapped_data: List[Dict[str, Any]], engine: str = 'auto') -> Dict[str, Any]:
         """
         Generate search marketing analytics from mapped data
         Expected fields: keyword, search_volume, keyword_difficulty, competition_level,
                         intent, brand_ranking, competitor_ranking
+
+        engine: same choices as social_media_analytics
         """
+        if engine != 'rows':
+            try:
+                return search_marketing_analytics_columnar(mapped_data)
+            except Exception as e:
+                if not isinstance(e, ColumnarFallback):
+                    print(f"Columnar search marketing analytics failed, using row engine: {str(e)}")
+        return AnalyticsEngineService._search_marketing_analytics_rows(mapped_data)
+
+    @staticmethod
+    def _search_marketing_analytics_rows(mapped_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Row-by-row search marketing analytics (reference implementation)"""
         try:
             if not mapped_data:
                 return {'error': 'No data available for analytics'}
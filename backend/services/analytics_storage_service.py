@@ -7,19 +7,21 @@ from datetime import datetime, timezone
 class AnalyticsStorageService:
     
     @staticmethod
-    def save_analytics(module: str, analytics_data: dict, generated_by: str):
+    def save_analytics(module: str, analytics_data: dict, generated_by: str, input_hash: str = None):
         """
         Save analytics results to Firestore (globally shared)
         Args:
             module: 'social_media' or 'search_marketing'
             analytics_data: The analytics results
             generated_by: Username who generated the analytics
+            input_hash: AnalyticsEngineService.input_hash of the inputs (None = not reusable)
         """
         try:
             doc_ref = db.document(f'analytics_results/{module}')
             doc_ref.set({
                 'module': module,
                 'data': analytics_data,
+                'input_hash': input_hash,
                 'generated_by': generated_by,
                 'generated_at': datetime.now(timezone.utc).isoformat(),
                 'updated_at': datetime.now(timezone.utc).isoformat()
@@ -50,6 +52,20 @@ class AnalyticsStorageService:
             print(f"Error loading analytics for {module}: {e}")
             return None
     
+    @staticmethod
+    def get_analytics_record(module: str):
+        """
+        Stored analytics document with its metadata (input_hash, generated_by, generated_at)
+        Returns:
+            Document dict or None
+        """
+        try:
+            doc = db.document(f'analytics_results/{module}').get()
+            return doc.to_dict() if doc.exists else None
+        except Exception as e:
+            print(f"Error loading analytics for {module}: {e}")
+            return None
+    
     @staticmethod
     def save_insights(module: str, insights_data: dict, generated_by: str):
         """
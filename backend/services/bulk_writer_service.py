@@ -0,0 +1,151 @@
+"""
+Bulk Firestore writer
+Splits writes into batches under Firestore's 500-operation limit and commits them concurrently
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from google.api_core import exceptions as google_exceptions
+from firebase_client import db
+from config import settings
+
+# Errors worth retrying: contention, throttling and transient backend failures
+RETRYABLE_ERRORS = (
+    google_exceptions.Aborted,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+)
+
+
+class BulkWriter:
+    """
+    Buffers set/update/delete operations and commits them in batches.
+
+    - at most max_in_flight batches are committing at any time
+    - retryable errors are retried with exponential backoff and jitter
+    - flush()/close() wait for everything and re-raise the first failure
+
+    Usage:
+        with BulkWriter() as writer:
+            for ref in refs:
+                writer.delete(ref)
+    """
+
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        max_retries: int = 5,
+        base_delay: float = 0.2
+    ):
+        self.batch_size = min(batch_size or settings.FIRESTORE_BATCH_SIZE, 500)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_in_flight = max_in_flight or settings.FIRESTORE_WRITE_CONCURRENCY
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix='bulk-writer')
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._pending: List[Tuple[str, Any, Any, Dict[str, Any]]] = []
+        self._futures = []
+        self._lock = threading.Lock()
+        self.stats = {'operations': 0, 'batches': 0, 'retries': 0, 'skipped': 0}
+
+    def set(self, ref, data: Dict[str, Any], merge: bool = False) -> None:
+        self._add(('set', ref, data, {'merge': merge}))
+
+    def update(self, ref, data: Dict[str, Any]) -> None:
+        self._add(('update', ref, data, {}))
+
+    def delete(self, ref) -> None:
+        self._add(('delete', ref, None, {}))
+
+    def skip(self, count: int = 1) -> None:
+        """Record operations the caller decided not to write (e.g. unchanged docs)"""
+        self.stats['skipped'] += count
+
+    def _add(self, operation) -> None:
+        self._pending.append(operation)
+        self.stats['operations'] += 1
+        if len(self._pending) >= self.batch_size:
+            self._submit()
+
+    def _submit(self) -> None:
+        if not self._pending:
+            return
+        operations, self._pending = self._pending, []
+        self._slots.acquire()  # Blocks the producer while max_in_flight batches are committing
+        self._futures.append(self._executor.submit(self._commit_with_retry, operations))
+
+    def _commit_with_retry(self, operations) -> None:
+        try:
+            for attempt in range(self.max_retries + 1):
+                # A failed batch can't be re-committed, so rebuild it on every attempt
+                batch = db.batch()
+                for op, ref, data, options in operations:
+                    if op == 'set':
+                        batch.set(ref, data, merge=options['merge'])
+                    elif op == 'update':
+                        batch.update(ref, data)
+                    else:
+                        batch.delete(ref)
+                try:
+                    batch.commit()
+                    with self._lock:
+                        self.stats['batches'] += 1
+                    return
+                except RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self.base_delay * (2 ** attempt) * (0.5 + random.random())
+                    print(f"Batch of {len(operations)} writes failed ({type(e).__name__}), retrying in {delay:.2f}s")
+                    with self._lock:
+                        self.stats['retries'] += 1
+                    time.sleep(delay)
+        finally:
+            self._slots.release()
+
+    def flush(self) -> Dict[str, int]:
+        """Commit buffered operations and wait for all batches"""
+        self._submit()
+        futures, self._futures = self._futures, []
+        errors = [future.exception() for future in futures]
+        errors = [error for error in errors if error is not None]
+        if errors:
+            raise errors[0]
+        return dict(self.stats)
+
+    def close(self) -> Dict[str, int]:
+        try:
+            return self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> 'BulkWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            # Don't mask the original error; still wait for in-flight batches
+            self._executor.shutdown(wait=True)
+
+
+def delete_collection(collection_ref, writer: Optional[BulkWriter] = None) -> int:
+    """Delete every document in a collection through a BulkWriter"""
+    owns_writer = writer is None
+    writer = writer or BulkWriter()
+    count = 0
+    for doc in collection_ref.stream():
+        writer.delete(doc.reference)
+        count += 1
+    if owns_writer:
+        writer.close()
+    return count
@@ -0,0 +1,541 @@
+"""
+Chunked storage for the shared marketing datasets
+A manifest document plus size-capped row chunks, so datasets aren't bound by the 1 MiB document limit
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hashlib
+import json
+import uuid
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from firebase_client import db
+from firebase_admin import firestore
+from config import settings
+from services.bulk_writer_service import BulkWriter
+
+CHUNKED_FORMAT = 'chunked'
+
+# Chunk document name plus its version and field names, on top of the rows
+CHUNK_OVERHEAD_BYTES = 1024
+
+
+class DatasetVersionConflict(Exception):
+    """The dataset changed since the version the caller edited"""
+
+    def __init__(self, current_version: int):
+        super().__init__(f"Dataset was modified (current version {current_version})")
+        self.current_version = current_version
+
+
+class DatasetPatchError(ValueError):
+    """A patch operation can't be applied"""
+
+
+class ChunkedDatasetService:
+    """
+    {module}_dynamic_data/shared is the manifest:
+        format, version, columns, row_count, chunk_rows,
+        chunks: [{id, row_count, hash}], content_hash, last_updated_by, updated_at
+    {module}_dynamic_data/shared/chunks/{chunk_id} holds one slice of rows:
+        version, row_ids, rows
+
+    - chunks are immutable: a save or patch writes new chunks, then switches
+      the manifest in a transaction, so readers only ever see complete versions
+    - chunks the new manifest no longer references are deleted after the switch
+    - the manifest's chunk order is the row order
+    - manifests without format are the old single-document layout (columns
+      and rows inline) and are read as-is until the next save or patch
+    """
+
+    @staticmethod
+    def _manifest_ref(module: str):
+        return db.collection(f'{module}_dynamic_data').document('shared')
+
+    @staticmethod
+    def _chunks_ref(module: str):
+        return ChunkedDatasetService._manifest_ref(module).collection('chunks')
+
+    @staticmethod
+    def chunk_hash(rows: List[Dict[str, Any]]) -> str:
+        digest = hashlib.sha256()
+        for row in rows:
+            digest.update(json.dumps(row, sort_keys=True, default=str).encode('utf-8'))
+            digest.update(b'\n')
+        return digest.hexdigest()
+
+    @staticmethod
+    def content_hash(columns: List[str], chunk_hashes: List[str]) -> str:
+        """Dataset hash from the columns and chunk hashes, so a patch only rehashes the chunks it touched"""
+        digest = hashlib.sha256()
+        digest.update(json.dumps(columns, sort_keys=True, default=str).encode('utf-8'))
+        for chunk_hash in chunk_hashes:
+            digest.update(chunk_hash.encode('ascii'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def dataset_hash(manifest: Optional[Dict[str, Any]]) -> str:
+        """Content hash of whatever is stored (old-layout documents are hashed inline)"""
+        if ChunkedDatasetService.is_chunked(manifest):
+            return manifest['content_hash']
+        manifest = manifest or {}
+        return ChunkedDatasetService.content_hash(
+            manifest.get('columns', []), [ChunkedDatasetService.chunk_hash(manifest.get('rows', []))]
+        )
+
+    @staticmethod
+    def is_chunked(manifest: Optional[Dict[str, Any]]) -> bool:
+        return bool(manifest) and manifest.get('format') == CHUNKED_FORMAT
+
+    @staticmethod
+    def get_manifest(module: str) -> Optional[Dict[str, Any]]:
+        """Manifest (or old-layout document) for a module; None if nothing was saved"""
+        doc = ChunkedDatasetService._manifest_ref(module).get()
+        return doc.to_dict() if doc.exists else None
+
+    @staticmethod
+    def _value_size(value: Any) -> int:
+        """Stored size of a field value by Firestore's document size rules"""
+        if value is None or isinstance(value, bool):
+            return 1
+        if isinstance(value, (int, float)):
+            return 8
+        if isinstance(value, str):
+            return len(value.encode('utf-8')) + 1
+        if isinstance(value, dict):
+            return sum(len(str(key).encode('utf-8')) + 1 + ChunkedDatasetService._value_size(item)
+                       for key, item in value.items())
+        if isinstance(value, (list, tuple)):
+            return sum(ChunkedDatasetService._value_size(item) for item in value)
+        return len(str(value).encode('utf-8')) + 1
+
+    @staticmethod
+    def _row_size(row: Dict[str, Any]) -> int:
+        """Bytes a row adds to a chunk: the row itself plus its entry in row_ids"""
+        return ChunkedDatasetService._value_size(row) + ChunkedDatasetService._value_size(row.get('id'))
+
+    @staticmethod
+    def _rows_size(rows: List[Dict[str, Any]]) -> int:
+        return CHUNK_OVERHEAD_BYTES + sum(ChunkedDatasetService._row_size(row) for row in rows)
+
+    @staticmethod
+    def _chunked(rows: Iterable[Dict[str, Any]], chunk_rows: int, chunk_bytes: int) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Group rows into lists of at most chunk_rows rows and an estimated chunk_bytes
+        stored bytes, without materializing the iterable (a single oversized row
+        still gets a chunk of its own)
+        """
+        chunk = []
+        size = CHUNK_OVERHEAD_BYTES
+        for row in rows:
+            row_size = ChunkedDatasetService._row_size(row)
+            if chunk and size + row_size > chunk_bytes:
+                yield chunk
+                chunk = []
+                size = CHUNK_OVERHEAD_BYTES
+            chunk.append(row)
+            size += row_size
+            if len(chunk) == chunk_rows:
+                yield chunk
+                chunk = []
+                size = CHUNK_OVERHEAD_BYTES
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _write_chunks(module: str, version: int, chunks: Iterable[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Write new chunk docs as the chunks are produced; returns their manifest entries.
+        If producing or writing fails, the chunks written so far are deleted.
+        """
+        chunks_ref = ChunkedDatasetService._chunks_ref(module)
+        # Unique per write, so concurrent writers never overwrite each other's chunks
+        token = uuid.uuid4().hex[:8]
+        entries = []
+        try:
+            with BulkWriter(batch_size=settings.DATASET_CHUNKS_PER_BATCH) as writer:
+                for index, rows in enumerate(chunks):
+                    chunk_id = f"v{version}_{index:05d}_{token}"
+                    writer.set(chunks_ref.document(chunk_id), {
+                        'version': version,
+                        'row_ids': [row.get('id') for row in rows],
+                        'rows': rows
+                    })
+                    entries.append({'id': chunk_id, 'row_count': len(rows), 'hash': ChunkedDatasetService.chunk_hash(rows)})
+        except Exception:
+            ChunkedDatasetService._delete_chunks(module, [entry['id'] for entry in entries])
+            raise
+        return entries
+
+    @staticmethod
+    def _commit(module: str, manifest: Dict[str, Any], new_chunk_ids: List[str],
+                expected_version: Optional[int]) -> Dict[str, Any]:
+        """
+        Switch the manifest (checking expected_version when given), then drop
+        chunks the replaced manifest referenced and the new one doesn't.
+        """
+        manifest_ref = ChunkedDatasetService._manifest_ref(module)
+        replaced = {}
+
+        @firestore.transactional
+        def switch(transaction):
+            snapshot = manifest_ref.get(transaction=transaction)
+            current = snapshot.to_dict() if snapshot.exists else None
+            current_version = (current or {}).get('version', 0)
+            if expected_version is not None and current_version != expected_version:
+                raise DatasetVersionConflict(current_version)
+            manifest['version'] = current_version + 1
+            # set() without merge also drops the inline rows of an old-layout document
+            transaction.set(manifest_ref, manifest)
+            replaced['manifest'] = current
+
+        try:
+            switch(db.transaction())
+        except Exception:
+            ChunkedDatasetService._delete_chunks(module, new_chunk_ids)
+            raise
+
+        previous = replaced['manifest']
+        if ChunkedDatasetService.is_chunked(previous):
+            kept = {chunk['id'] for chunk in manifest['chunks']}
+            ChunkedDatasetService._delete_chunks(
+                module, [chunk['id'] for chunk in previous.get('chunks', []) if chunk['id'] not in kept]
+            )
+        return manifest
+
+    @staticmethod
+    def _build_manifest(columns: List[str], chunks: List[Dict[str, Any]], username: str,
+                        updated_at: Optional[str]) -> Dict[str, Any]:
+        return {
+            'format': CHUNKED_FORMAT,
+            'version': None,  # set when the manifest is switched
+            'columns': columns,
+            'row_count': sum(chunk['row_count'] for chunk in chunks),
+            'chunk_rows': max(1, settings.DATASET_CHUNK_ROWS),
+            'chunks': chunks,
+            'content_hash': ChunkedDatasetService.content_hash(columns, [chunk['hash'] for chunk in chunks]),
+            'last_updated_by': username,
+            'updated_at': updated_at
+        }
+
+    @staticmethod
+    def write(module: str, columns: List[str], rows: List[Dict[str, Any]], username: str,
+              updated_at: Optional[str] = None, expected_version: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Replace the module's dataset; returns the new manifest.
+        Raises DatasetVersionConflict if expected_version is given and stale.
+        """
+        return ChunkedDatasetService.write_stream(module, columns, rows, username, updated_at,
+                                                  expected_version=expected_version)
+
+    @staticmethod
+    def write_stream(module: str, columns: List[str], rows: Iterable[Dict[str, Any]], username: str,
+                     updated_at: Optional[str] = None, append: bool = False,
+                     expected_version: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Write rows from an iterable chunk by chunk (memory stays bounded by the
+        writer's in-flight batches), replacing the dataset or appending to it.
+        Appending keeps the existing chunks and checks the version they were read at.
+        """
+        previous = ChunkedDatasetService.get_manifest(module)
+        version = (previous or {}).get('version', 0) + 1
+        chunks = ChunkedDatasetService._write_chunks(
+            module, version, ChunkedDatasetService._chunked(rows, max(1, settings.DATASET_CHUNK_ROWS), settings.DATASET_CHUNK_BYTES)
+        )
+        new_chunk_ids = [chunk['id'] for chunk in chunks]
+
+        if append and previous:
+            if not ChunkedDatasetService.is_chunked(previous):
+                # Old layout: its inline rows become the first chunks
+                try:
+                    existing = ChunkedDatasetService._write_chunks(
+                        module, version, ChunkedDatasetService._chunked(previous.get('rows', []), max(1, settings.DATASET_CHUNK_ROWS), settings.DATASET_CHUNK_BYTES)
+                    )
+                except Exception:
+                    ChunkedDatasetService._delete_chunks(module, new_chunk_ids)
+                    raise
+                new_chunk_ids += [chunk['id'] for chunk in existing]
+            else:
+                existing = previous.get('chunks', [])
+            chunks = existing + chunks
+            if expected_version is None:
+                expected_version = previous.get('version', 0)
+
+        manifest = ChunkedDatasetService._build_manifest(columns, chunks, username, updated_at)
+        return ChunkedDatasetService._commit(module, manifest, new_chunk_ids, expected_version)
+
+    @staticmethod
+    def _delete_chunks(module: str, chunk_ids: List[str]) -> None:
+        if not chunk_ids:
+            return
+        try:
+            chunks_ref = ChunkedDatasetService._chunks_ref(module)
+            with BulkWriter() as writer:
+                for chunk_id in chunk_ids:
+                    writer.delete(chunks_ref.document(chunk_id))
+        except Exception as e:
+            # Orphaned chunks are never referenced by a manifest; only storage is wasted
+            print(f"Error deleting old {module} chunks: {e}")
+
+    @staticmethod
+    def _find_chunks(module: str, row_ids: List[Any], chunk_ids: set) -> Dict[str, List[Dict[str, Any]]]:
+        """Rows of the current chunks that contain any of row_ids, keyed by chunk id"""
+        chunks_ref = ChunkedDatasetService._chunks_ref(module)
+        found = {}
+        for start in range(0, len(row_ids), 30):  # array_contains_any takes up to 30 values
+            query = chunks_ref.where('row_ids', 'array_contains_any', row_ids[start:start + 30])
+            for doc in query.stream():
+                # Chunks of other versions can match until they are cleaned up
+                if doc.id in chunk_ids:
+                    found[doc.id] = doc.to_dict().get('rows', [])
+        return found
+
+    @staticmethod
+    def _load_chunk(module: str, chunk_id: str) -> List[Dict[str, Any]]:
+        doc = ChunkedDatasetService._chunks_ref(module).document(chunk_id).get()
+        if not doc.exists:
+            raise RuntimeError(f"{module} dataset chunk {chunk_id} is missing")
+        return doc.to_dict().get('rows', [])
+
+    @staticmethod
+    def patch(module: str, base_version: int, operations: List[Dict[str, Any]], username: str,
+              updated_at: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Apply row and column operations in order, rewriting only the chunks they touch.
+
+        Operations:
+            {'op': 'insert', 'row': {...}}                  appended; 'id' generated if missing
+            {'op': 'update', 'id': ..., 'values': {...}}
+            {'op': 'delete', 'id': ...}
+            {'op': 'add_column', 'column': name}
+            {'op': 'rename_column', 'column': name, 'new_name': name}
+            {'op': 'remove_column', 'column': name}
+
+        Raises DatasetVersionConflict if base_version is stale, DatasetPatchError
+        for invalid operations. Returns the new manifest plus write counts.
+        """
+        manifest = ChunkedDatasetService.get_manifest(module)
+        current_version = (manifest or {}).get('version', 0)
+        if current_version != base_version:
+            raise DatasetVersionConflict(current_version)
+        chunk_rows = max(1, settings.DATASET_CHUNK_ROWS)
+        chunk_bytes = settings.DATASET_CHUNK_BYTES
+        columns = list((manifest or {}).get('columns', []))
+
+        # Working copy of the chunk list; rows[i] is loaded only for chunks we touch
+        if ChunkedDatasetService.is_chunked(manifest):
+            entries = [dict(chunk) for chunk in manifest.get('chunks', [])]
+            rows = [None] * len(entries)
+        else:
+            # Old layout (or nothing saved yet): every chunk is new
+            entries_rows = list(ChunkedDatasetService._chunked((manifest or {}).get('rows', []), chunk_rows, chunk_bytes))
+            entries = [{'id': None} for _ in entries_rows]
+            rows = entries_rows
+        dirty = set(range(len(entries))) if not ChunkedDatasetService.is_chunked(manifest) else set()
+
+        def load(position: int) -> List[Dict[str, Any]]:
+            if rows[position] is None:
+                rows[position] = list(ChunkedDatasetService._load_chunk(module, entries[position]['id']))
+            return rows[position]
+
+        def load_all() -> None:
+            for position in range(len(entries)):
+                load(position)
+                dirty.add(position)
+
+        # Locate every row id the operations mention with array_contains queries
+        row_ids = []
+        for operation in operations:
+            row_id = operation.get('id') if operation.get('op') in ('update', 'delete') else (operation.get('row') or {}).get('id')
+            if row_id is not None:
+                row_ids.append(row_id)
+        locations = {}
+        if row_ids and ChunkedDatasetService.is_chunked(manifest):
+            positions = {entry['id']: position for position, entry in enumerate(entries)}
+            for chunk_id, chunk in ChunkedDatasetService._find_chunks(module, list(dict.fromkeys(row_ids)), set(positions)).items():
+                rows[positions[chunk_id]] = list(chunk)
+        for position, chunk in enumerate(rows):
+            for row in chunk or []:
+                locations.setdefault(row.get('id'), position)
+
+        def find(row_id: Any):
+            if row_id is None:
+                raise DatasetPatchError("Row operation needs an id")
+            position = locations.get(row_id)
+            if position is not None:
+                chunk = load(position)
+                for index, row in enumerate(chunk):
+                    if row.get('id') == row_id:
+                        return position, index
+            raise DatasetPatchError(f"Row {row_id} not found")
+
+        for operation in operations:
+            op = operation.get('op')
+            if op == 'insert':
+                row = dict(operation.get('row') or {})
+                row.setdefault('id', f"row-{uuid.uuid4().hex}")
+                if row['id'] in locations:
+                    raise DatasetPatchError(f"Row {row['id']} already exists")
+                if not entries or (rows[-1] is None and entries[-1]['row_count'] >= chunk_rows) or \
+                        (rows[-1] is not None and len(rows[-1]) >= chunk_rows):
+                    entries.append({'id': None})
+                    rows.append([])
+                position = len(entries) - 1
+                load(position).append(row)
+                locations[row['id']] = position
+                dirty.add(position)
+            elif op == 'update':
+                values = operation.get('values') or {}
+                if 'id' in values and values['id'] != operation.get('id'):
+                    raise DatasetPatchError("Row id can't be changed")
+                position, index = find(operation.get('id'))
+                rows[position][index] = {**rows[position][index], **values}
+                dirty.add(position)
+            elif op == 'delete':
+                position, index = find(operation.get('id'))
+                del rows[position][index]
+                locations.pop(operation.get('id'), None)
+                dirty.add(position)
+            elif op == 'add_column':
+                column = operation.get('column')
+                if not column:
+                    raise DatasetPatchError("add_column needs a column name")
+                if column not in columns:
+                    columns.append(column)
+            elif op == 'rename_column':
+                column, new_name = operation.get('column'), operation.get('new_name')
+                if column not in columns or not new_name or new_name in columns:
+                    raise DatasetPatchError(f"Can't rename column {column} to {new_name}")
+                columns[columns.index(column)] = new_name
+                load_all()
+                for chunk in rows:
+                    chunk[:] = [{(new_name if key == column else key): value for key, value in row.items()} for row in chunk]
+            elif op == 'remove_column':
+                column = operation.get('column')
+                if column not in columns:
+                    raise DatasetPatchError(f"Column {column} not found")
+                columns.remove(column)
+                load_all()
+                for chunk in rows:
+                    chunk[:] = [{key: value for key, value in row.items() if key != column} for row in chunk]
+            else:
+                raise DatasetPatchError(f"Unknown operation: {op}")
+
+        # Entries from before per-chunk hashes can't be combined without their hash
+        for position, entry in enumerate(entries):
+            if position not in dirty and 'hash' not in entry:
+                entry['hash'] = ChunkedDatasetService.chunk_hash(load(position))
+
+        # Fold small dirty chunks into the dirty chunk before them, so deletes don't fragment the dataset
+        previous = None
+        for position in range(len(entries)):
+            if position not in dirty:
+                previous = None
+                continue
+            if previous is not None and len(rows[previous]) + len(rows[position]) <= chunk_rows and \
+                    ChunkedDatasetService._rows_size(rows[previous] + rows[position]) <= chunk_bytes:
+                rows[previous].extend(rows[position])
+                rows[position] = []
+            elif rows[position]:
+                previous = position
+
+        # New chunks for dirty positions, split again if inserts or wider values outgrew
+        # the limits; unchanged entries kept, empty chunks dropped
+        pieces = {
+            position: list(ChunkedDatasetService._chunked(rows[position], chunk_rows, chunk_bytes))
+            for position in sorted(dirty) if rows[position]
+        }
+        written = ChunkedDatasetService._write_chunks(
+            module, current_version + 1, [piece for position in sorted(pieces) for piece in pieces[position]]
+        )
+        written_entries = iter(written)
+        chunks = []
+        for position, entry in enumerate(entries):
+            if position in dirty:
+                chunks.extend(next(written_entries) for _ in pieces.get(position, []))
+            else:
+                chunks.append(entry)
+
+        new_manifest = ChunkedDatasetService._build_manifest(columns, chunks, username, updated_at)
+        new_manifest = ChunkedDatasetService._commit(module, new_manifest, [entry['id'] for entry in written], base_version)
+        previous_ids = {chunk['id'] for chunk in (manifest or {}).get('chunks', [])} if ChunkedDatasetService.is_chunked(manifest) else set()
+        return {
+            **new_manifest,
+            'chunks_written': len(written),
+            'chunks_deleted': len(previous_ids - {chunk['id'] for chunk in chunks})
+        }
+
+    @staticmethod
+    def iter_chunks(module: str, manifest: Optional[Dict[str, Any]] = None, start_chunk: int = 0,
+                    end_chunk: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield each chunk's rows in order, fetching DATASET_READ_BATCH chunks per round trip.
+        Old-layout documents yield their inline rows as a single chunk.
+        """
+        manifest = manifest if manifest is not None else ChunkedDatasetService.get_manifest(module)
+        if not manifest:
+            return
+        if not ChunkedDatasetService.is_chunked(manifest):
+            if start_chunk == 0:
+                yield manifest.get('rows', [])
+            return
+
+        chunk_ids = [chunk['id'] for chunk in manifest.get('chunks', [])][start_chunk:end_chunk]
+        chunks_ref = ChunkedDatasetService._chunks_ref(module)
+        read_batch = max(1, settings.DATASET_READ_BATCH)
+        for start in range(0, len(chunk_ids), read_batch):
+            ids = chunk_ids[start:start + read_batch]
+            # get_all doesn't preserve request order
+            docs = {doc.id: doc for doc in db.get_all([chunks_ref.document(chunk_id) for chunk_id in ids])}
+            for chunk_id in ids:
+                doc = docs.get(chunk_id)
+                if doc is None or not doc.exists:
+                    raise RuntimeError(f"{module} dataset chunk {chunk_id} is missing")
+                yield doc.to_dict().get('rows', [])
+
+    @staticmethod
+    def iter_rows(module: str, manifest: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        for rows in ChunkedDatasetService.iter_chunks(module, manifest):
+            yield from rows
+
+    @staticmethod
+    def read_page(module: str, offset: int = 0, limit: int = 500,
+                  manifest: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Rows [offset, offset + limit), reading only the chunks that overlap them"""
+        manifest = manifest if manifest is not None else ChunkedDatasetService.get_manifest(module)
+        if not manifest:
+            return {'columns': [], 'rows': [], 'row_count': 0, 'offset': offset, 'limit': limit,
+                    'next_offset': None, 'version': 0, 'last_updated_by': None, 'updated_at': None}
+
+        if ChunkedDatasetService.is_chunked(manifest):
+            row_count = manifest.get('row_count', 0)
+            # First row position of every chunk
+            starts = [0] + list(accumulate(chunk['row_count'] for chunk in manifest.get('chunks', [])))[:-1]
+            first_chunk = max(0, bisect_right(starts, offset) - 1)
+            last_chunk = bisect_left(starts, offset + limit)
+            page = []
+            if offset < row_count:
+                for rows in ChunkedDatasetService.iter_chunks(module, manifest, first_chunk, last_chunk):
+                    page.extend(rows)
+                skip = offset - starts[first_chunk]
+                page = page[skip:skip + limit]
+        else:
+            rows = manifest.get('rows', [])
+            row_count = len(rows)
+            page = rows[offset:offset + limit]
+
+        next_offset = offset + limit
+        return {
+            'columns': manifest.get('columns', []),
+            'rows': page,
+            'row_count': row_count,
+            'offset': offset,
+            'limit': limit,
+            'next_offset': next_offset if next_offset < row_count else None,
+            'version': manifest.get('version', 0),
+            'last_updated_by': manifest.get('last_updated_by'),
+            'updated_at': manifest.get('updated_at')
+        }
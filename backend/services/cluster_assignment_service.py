@@ -0,0 +1,215 @@
+"""
+Incremental persona cluster assignment
+Assigns new insights to the nearest stored cluster center and keeps running cluster stats
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from firebase_client import db
+from firebase_admin import firestore
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+from config import settings
+from counter_utils import add_nested, to_increments
+import services.clustering_service as clustering
+
+
+class ClusterAssignmentService:
+    """
+    Keeps the last clustering run (vocabulary, centers) plus per-cluster running
+    sums in one document, so a new insight can be placed without re-clustering.
+
+    Stored shape of clusters.<cluster_id>:
+        count, distance_sum, intent_sum, influence_sum,
+        motivations: {name: {sum, count}}, pains: {name: {sum, count}}
+    Sums are normalized strengths ((raw / 20) × platform multiplier), i.e. the
+    values compute_cluster_summary averages.
+    """
+
+    STATE_DOC_PATH = "clustering/state"
+
+    @staticmethod
+    def _key(value: Any) -> str:
+        key = str(value) if value is not None else ''
+        return key if key else 'Unknown'
+
+    @staticmethod
+    def compute_deltas(data: Dict[str, Any], distance: float, sign: int = 1) -> Dict[str, Any]:
+        """Contribution of one insight to its cluster's running stats"""
+        multiplier = clustering.get_platform_multiplier(data.get('platform', 'Other'))
+        deltas = {
+            'count': sign,
+            'distance_sum': sign * distance,
+            'intent_sum': sign * clustering.normalize_strength(data.get('purchase_intent', 0), multiplier),
+            'influence_sum': sign * clustering.normalize_strength(data.get('influencer_effect', 0), multiplier),
+            'motivations': {},
+            'pains': {}
+        }
+        for field in ('motivations', 'pains'):
+            for item in data.get(field, []):
+                stats = deltas[field].setdefault(ClusterAssignmentService._key(item.get('name')), {'sum': 0.0, 'count': 0})
+                stats['sum'] += sign * clustering.normalize_strength(item.get('strength', 0), multiplier)
+                stats['count'] += sign
+        return {k: v for k, v in deltas.items() if v != {}}
+
+    @staticmethod
+    def _distance(vector: List[float], center: List[float]) -> float:
+        return float(np.linalg.norm(np.asarray(vector) - np.asarray(center)))
+
+    @staticmethod
+    def build_state(insights: List[Dict[str, Any]], clustering_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Full-run state: centers, vocabulary and per-cluster sums for every insight"""
+        centers = clustering_result['centers']
+        clusters = {cluster_id: {} for cluster_id in centers}
+        for insight in insights:
+            assignment = clustering_result['assignments'][insight['id']]
+            cluster_id = assignment['cluster_id']
+            distance = ClusterAssignmentService._distance(assignment['vector'], centers[cluster_id])
+            add_nested(clusters[cluster_id], ClusterAssignmentService.compute_deltas(insight, distance))
+
+        counts = [stats.get('count', 0) for stats in clusters.values()]
+        total = sum(counts)
+        distance_total = sum(stats.get('distance_sum', 0.0) for stats in clusters.values())
+        return {
+            'vocabulary': clustering_result['vocabulary'],
+            'centers': centers,
+            'clusters': clusters,
+            'baseline': {
+                'insight_count': total,
+                'mean_distance': distance_total / total if total else 0.0,
+                'size_imbalance': ClusterAssignmentService._imbalance(counts)
+            },
+            'incremental_count': 0,
+            'generated_at': datetime.now(timezone.utc).isoformat()
+        }
+
+    @staticmethod
+    def save_state(state: Dict[str, Any]) -> None:
+        db.document(ClusterAssignmentService.STATE_DOC_PATH).set(state)
+
+    @staticmethod
+    def get_state() -> Optional[Dict[str, Any]]:
+        doc = db.document(ClusterAssignmentService.STATE_DOC_PATH).get()
+        return doc.to_dict() if doc.exists else None
+
+    @staticmethod
+    def assign(data: Dict[str, Any], state: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Nearest stored center for one insight.
+        Returns None when personas have never been generated.
+        """
+        state = state or ClusterAssignmentService.get_state()
+        if not state or not state.get('centers'):
+            return None
+
+        vector = clustering.create_vector(data, state['vocabulary'])
+        cluster_ids = list(state['centers'])
+        centers = np.asarray([state['centers'][cluster_id] for cluster_id in cluster_ids])
+        distances = np.linalg.norm(centers - np.asarray(vector), axis=1)
+        nearest = int(np.argmin(distances))
+        return {
+            'cluster_id': cluster_ids[nearest],
+            'vector': vector,
+            'distance': float(distances[nearest])
+        }
+
+    @staticmethod
+    def apply(writer, data: Dict[str, Any], cluster_id: str, distance: float, sign: int = 1) -> None:
+        """Stage the running-stat update on a WriteBatch or Transaction"""
+        deltas = ClusterAssignmentService.compute_deltas(data, distance, sign)
+        update = {
+            'clusters': {cluster_id: to_increments(deltas)},
+            'updated_at': firestore.SERVER_TIMESTAMP
+        }
+        if sign > 0:
+            # Insights placed without re-clustering since the last full run
+            update['incremental_count'] = firestore.Increment(1)
+        writer.set(db.document(ClusterAssignmentService.STATE_DOC_PATH), update, merge=True)
+
+    @staticmethod
+    def remove(writer, data: Dict[str, Any], state: Optional[Dict[str, Any]] = None) -> None:
+        """Stage the reverse update for a deleted insight that belongs to a stored cluster"""
+        cluster_id = data.get('cluster_id')
+        state = state or ClusterAssignmentService.get_state()
+        if not state or cluster_id not in (state.get('centers') or {}):
+            return
+        vector = data.get('vector') or clustering.create_vector(data, state['vocabulary'])
+        distance = ClusterAssignmentService._distance(vector, state['centers'][cluster_id])
+        ClusterAssignmentService.apply(writer, data, cluster_id, distance, sign=-1)
+
+    @staticmethod
+    def _imbalance(counts: List[int]) -> float:
+        """Largest cluster relative to the mean cluster size (1.0 = perfectly even)"""
+        counts = [count for count in counts if count > 0]
+        return max(counts) / (sum(counts) / len(counts)) if counts else 0.0
+
+    @staticmethod
+    def cluster_stats(stats: Dict[str, Any], cluster_id: str) -> Dict[str, Any]:
+        """Running summary, WTS and TCSS for one cluster (no insight scan)"""
+        count = stats.get('count', 0)
+        if count <= 0:
+            return {'cluster_id': cluster_id, 'insight_count': 0, 'tcss': 0.0, 'mean_distance': 0.0}
+
+        motivations = {name: s for name, s in (stats.get('motivations') or {}).items() if s.get('count', 0) > 0}
+        pains = {name: s for name, s in (stats.get('pains') or {}).items() if s.get('count', 0) > 0}
+        summary = {
+            'cluster_id': cluster_id,
+            'avg_motivations': {name: s['sum'] / s['count'] for name, s in motivations.items()},
+            'avg_pains': {name: s['sum'] / s['count'] for name, s in pains.items()},
+            'avg_purchase_intent': stats.get('intent_sum', 0.0) / count,
+            'avg_influencer_effect': stats.get('influence_sum', 0.0) / count,
+            'insight_count': count
+        }
+        wts = clustering.classify_wts(
+            summary,
+            {name: s['count'] for name, s in motivations.items()},
+            {name: s['count'] for name, s in pains.items()},
+            count
+        )
+        return {
+            'cluster_id': cluster_id,
+            'insight_count': count,
+            'mean_distance': stats.get('distance_sum', 0.0) / count,
+            'summary': summary,
+            'wts': wts,
+            'tcss': wts['tcss']
+        }
+
+    @staticmethod
+    def get_health() -> Dict[str, Any]:
+        """Per-cluster running stats plus drift metrics and a needs_recluster flag"""
+        state = ClusterAssignmentService.get_state()
+        if not state:
+            return {'generated': False, 'needs_recluster': True, 'reasons': ['Personas have not been generated yet']}
+
+        clusters = state.get('clusters') or {}
+        cluster_stats = [ClusterAssignmentService.cluster_stats(clusters.get(cid, {}), cid) for cid in state['centers']]
+        counts = [stats['insight_count'] for stats in cluster_stats]
+        total = sum(counts)
+        mean_distance = sum(stats['mean_distance'] * stats['insight_count'] for stats in cluster_stats) / total if total else 0.0
+        size_imbalance = ClusterAssignmentService._imbalance(counts)
+        baseline = state.get('baseline') or {}
+        incremental_share = state.get('incremental_count', 0) / total if total else 0.0
+
+        reasons = []
+        if baseline.get('mean_distance') and mean_distance > baseline['mean_distance'] * settings.CLUSTER_DRIFT_DISTANCE_RATIO:
+            reasons.append(f"Mean distance to center grew from {baseline['mean_distance']:.3f} to {mean_distance:.3f}")
+        if baseline.get('size_imbalance') and size_imbalance > baseline['size_imbalance'] * settings.CLUSTER_DRIFT_IMBALANCE_RATIO:
+            reasons.append(f"Cluster size imbalance grew from {baseline['size_imbalance']:.2f} to {size_imbalance:.2f}")
+        if incremental_share > settings.CLUSTER_DRIFT_MAX_INCREMENTAL_SHARE:
+            reasons.append(f"{incremental_share:.0%} of insights were assigned incrementally")
+
+        return {
+            'generated': True,
+            'generated_at': state.get('generated_at'),
+            'insight_count': total,
+            'incremental_count': state.get('incremental_count', 0),
+            'mean_distance': mean_distance,
+            'size_imbalance': size_imbalance,
+            'baseline': baseline,
+            'clusters': cluster_stats,
+            'needs_recluster': bool(reasons),
+            'reasons': reasons
+        }
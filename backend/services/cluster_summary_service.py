@@ -0,0 +1,256 @@
+"""
+Grouped cluster summaries for persona generation
+Computes compute_cluster_summary / compute_wts_classification / paint_persona_profile
+for every cluster at once from columnar arrays and the label vector, or cluster by
+cluster when k is too small for the columnar encoding to pay off
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from typing import Dict, Any, Iterable, List
+from array_utils import Vocabulary
+from config import settings
+import services.clustering_service as clustering
+
+# Profile field -> how many top items paint_persona_profile keeps
+TOP_ITEMS = {'behaviours': 2, 'channels': 2, 'products': 3, 'quote': 2}
+
+# Insight field -> key in demographic_profile
+DEMOGRAPHIC_FIELDS = {'age_group': 'age_group', 'gender': 'gender', 'skin_type': 'skin_type', 'skin_tone': 'tone'}
+
+
+class ClusterColumns:
+    """
+    Everything the three per-cluster functions read, as entry arrays
+    (row, code[, value]) in the order a row-by-row loop would visit them.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.intent: np.ndarray = None
+        self.influence: np.ndarray = None
+        self.strengths: Dict[str, Dict[str, Any]] = {}
+        self.items: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def from_insights(insights: Iterable[Dict[str, Any]]) -> 'ClusterColumns':
+        """Single pass over the insight dicts"""
+        strength_vocab = {'motivations': Vocabulary(), 'pains': Vocabulary()}
+        strength_entries = {field: ([], [], []) for field in strength_vocab}
+        item_vocab = {field: Vocabulary() for field in list(TOP_ITEMS) + list(DEMOGRAPHIC_FIELDS)}
+        item_entries = {field: ([], []) for field in item_vocab}
+        strength_specs = [(field, vocab) + strength_entries[field] for field, vocab in strength_vocab.items()]
+        list_specs = [(field, item_vocab[field]) + item_entries[field] for field in ('behaviours', 'channels', 'products')]
+        demographic_specs = [(field, item_vocab[field], item_entries[field][1]) for field in DEMOGRAPHIC_FIELDS]
+        quote_vocab = item_vocab['quote']
+        quote_rows, quote_codes = item_entries['quote']
+        multiplier_for = clustering.get_platform_multiplier
+        multipliers, intents, influences = [], [], []
+
+        i = -1
+        for i, insight in enumerate(insights):
+            get = insight.get
+            multipliers.append(multiplier_for(get('platform', 'Other')))
+            intents.append(get('purchase_intent', 0))
+            influences.append(get('influencer_effect', 0))
+
+            for field, vocab, rows, codes, values in strength_specs:
+                items = get(field, [])
+                if items:
+                    rows.extend([i] * len(items))
+                    codes.extend([vocab[item.get('name')] for item in items])
+                    values.extend([item.get('strength', 0) for item in items])
+
+            for field, vocab, rows, codes in list_specs:
+                values = get(field, [])
+                if values:
+                    rows.extend([i] * len(values))
+                    codes.extend([vocab[value] for value in values])
+
+            quote = get('quote', '').strip()
+            if quote:
+                quote_rows.append(i)
+                quote_codes.append(quote_vocab[quote])
+
+            for field, vocab, codes in demographic_specs:
+                codes.append(vocab[get(field, '')])
+
+        # One demographic value per insight
+        for field in DEMOGRAPHIC_FIELDS:
+            item_entries[field][0].extend(range(i + 1))
+
+        columns = ClusterColumns()
+        columns.n = i + 1
+        multipliers = np.asarray(multipliers, dtype=np.float64)
+        # Same float operations as normalize_strength: (raw / 20.0) * multiplier
+        columns.intent = (np.asarray(intents, dtype=np.float64) / 20.0) * multipliers
+        columns.influence = (np.asarray(influences, dtype=np.float64) / 20.0) * multipliers
+        for field, vocab in strength_vocab.items():
+            rows, codes, values = strength_entries[field]
+            rows = np.asarray(rows, dtype=np.int64)
+            columns.strengths[field] = {
+                'names': vocab.names,
+                'rows': rows,
+                'codes': np.asarray(codes, dtype=np.int64),
+                'values': (np.asarray(values, dtype=np.float64) / 20.0) * multipliers[rows]
+            }
+        for field, vocab in item_vocab.items():
+            rows, codes = item_entries[field]
+            columns.items[field] = {
+                'names': vocab.names,
+                'rows': np.asarray(rows, dtype=np.int64),
+                'codes': np.asarray(codes, dtype=np.int64)
+            }
+        return columns
+
+
+def _groups(labels: np.ndarray, column: Dict[str, Any], n_clusters: int):
+    """
+    Per (cluster, name) groups ordered by cluster, then by first appearance
+    within the cluster.
+
+    Returns:
+        (name codes, counts, bounds, entry keys) where groups of cluster c
+        are [bounds[c], bounds[c + 1]) and key = cluster * n_names + code
+    """
+    n_names = max(len(column['names']), 1)
+    keys = labels[column['rows']] * n_names + column['codes']
+    unique, first_index, counts = np.unique(keys, return_index=True, return_counts=True)
+    order = np.lexsort((first_index, unique // n_names))
+    unique, counts = unique[order], counts[order]
+    bounds = np.searchsorted(unique // n_names, np.arange(n_clusters + 1))
+    return unique % n_names, counts, bounds, keys
+
+
+def _top(names: List[Any], codes: np.ndarray, counts: np.ndarray, n: int) -> List[Any]:
+    """Counter.most_common(n): count descending, ties in first-appearance order"""
+    order = np.argsort(-counts, kind='stable')[:n]
+    return [names[code] for code in codes[order].tolist()]
+
+
+def summarize_clusters(columns: ClusterColumns, labels: np.ndarray, n_clusters: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Summary, WTS classification and persona profile for every cluster.
+
+    Results are identical to running compute_cluster_summary,
+    compute_wts_classification and paint_persona_profile on each cluster's
+    insights (kept in their original order).
+
+    Args:
+        columns: ClusterColumns.from_insights(insights)
+        labels: Cluster index per insight (same order as the insights)
+        n_clusters: Number of clusters
+
+    Returns:
+        {cluster_id: {'insight_count', 'summary', 'wts', 'profile'}} for non-empty clusters
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    sizes = np.bincount(labels, minlength=n_clusters)
+
+    # Per-insight values grouped by cluster; a stable sort keeps insight order
+    row_order = np.argsort(labels, kind='stable')
+    row_bounds = np.searchsorted(labels[row_order], np.arange(n_clusters + 1))
+    intent_sorted = columns.intent[row_order]
+    influence_sorted = columns.influence[row_order]
+
+    strength_groups = {}
+    for field, column in columns.strengths.items():
+        codes, counts, bounds, keys = _groups(labels, column, n_clusters)
+        # Values of each (cluster, name) group contiguous and in visiting order
+        value_order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[value_order]
+        sorted_values = column['values'][value_order]
+        strength_groups[field] = (column['names'], codes, counts, bounds, sorted_keys, sorted_values, max(len(column['names']), 1))
+
+    item_groups = {}
+    for field, column in columns.items.items():
+        codes, counts, bounds, _ = _groups(labels, column, n_clusters)
+        item_groups[field] = (column['names'], codes, counts, bounds)
+
+    results = {}
+    for c in range(n_clusters):
+        if sizes[c] == 0:
+            continue
+        cluster_id = f"cluster_{c}"
+        start, end = row_bounds[c], row_bounds[c + 1]
+
+        averages = {}
+        frequencies = {}
+        for field, (names, codes, counts, bounds, sorted_keys, sorted_values, n_names) in strength_groups.items():
+            averages[field] = {}
+            frequencies[field] = {}
+            for g in range(bounds[c], bounds[c + 1]):
+                code = codes[g]
+                key = c * n_names + code
+                lo, hi = np.searchsorted(sorted_keys, [key, key + 1])
+                name = names[code]
+                averages[field][name] = np.mean(sorted_values[lo:hi])
+                frequencies[field][name] = int(counts[g])
+
+        summary = {
+            'cluster_id': cluster_id,
+            'avg_motivations': averages['motivations'],
+            'avg_pains': averages['pains'],
+            'avg_purchase_intent': float(np.mean(intent_sorted[start:end])),
+            'avg_influencer_effect': float(np.mean(influence_sorted[start:end])),
+            'insight_count': int(sizes[c])
+        }
+        wts = clustering.classify_wts(summary, frequencies['motivations'], frequencies['pains'], int(sizes[c]))
+
+        top = {}
+        for field, (names, codes, counts, bounds) in item_groups.items():
+            lo, hi = bounds[c], bounds[c + 1]
+            top[field] = _top(names, codes[lo:hi], counts[lo:hi], TOP_ITEMS.get(field, 1))
+
+        profile = {
+            'top_behaviours': top['behaviours'],
+            'top_channels': top['channels'],
+            'top_products': top['products'],
+            'representative_quotes': top['quote'],
+            'demographic_profile': {
+                key: top[field][0] if top[field] else 'Unknown'
+                for field, key in DEMOGRAPHIC_FIELDS.items()
+            }
+        }
+
+        results[cluster_id] = {
+            'insight_count': int(sizes[c]),
+            'summary': summary,
+            'wts': wts,
+            'profile': profile
+        }
+    return results
+
+
+def summarize_per_cluster(insights: List[Dict[str, Any]], labels, n_clusters: int) -> Dict[str, Dict[str, Any]]:
+    """summarize_clusters' result from the per-cluster functions, after one pass bucketing insights by label"""
+    members = [[] for _ in range(n_clusters)]
+    for insight, label in zip(insights, np.asarray(labels, dtype=np.int64).tolist()):
+        members[label].append(insight)
+
+    results = {}
+    for c, cluster_insights in enumerate(members):
+        if not cluster_insights:
+            continue
+        cluster_id = f"cluster_{c}"
+        summary = clustering.compute_cluster_summary(cluster_insights, cluster_id)
+        results[cluster_id] = {
+            'insight_count': len(cluster_insights),
+            'summary': summary,
+            'wts': clustering.compute_wts_classification(summary, cluster_insights),
+            'profile': clustering.paint_persona_profile(cluster_insights)
+        }
+    return results
+
+
+def summarize(insights: List[Dict[str, Any]], labels, n_clusters: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Cluster summaries by whichever path is faster for n_clusters: encoding
+    ClusterColumns costs about as much as the per-cluster functions' own walk,
+    so the grouped pass only wins from CLUSTER_SUMMARY_GROUPED_MIN_K clusters.
+    """
+    if n_clusters < settings.CLUSTER_SUMMARY_GROUPED_MIN_K:
+        return summarize_per_cluster(insights, labels, n_clusters)
+    return summarize_clusters(ClusterColumns.from_insights(insights), labels, n_clusters)
@@ -2,11 +2,19 @@
 Clustering Service for Persona Generation
 Implements vector creation with platform multipliers and K-Means clustering
 """
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 import numpy as np
-from sklearn.cluster import KMeans
-from typing import List, Dict, Any, Tuple
+from joblib import Parallel, delayed
+from scipy import sparse
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import pairwise_distances, silhouette_score
+from typing import List, Dict, Any, Optional
 from collections import Counter, defaultdict
 from datetime import datetime, timezone
+from config import settings
 
 # Platform Multipliers (System A)
 PLATFORM_MULTIPLIERS = {
@@ -45,141 +53,291 @@ def normalize_strength(raw_strength: int, platform_multiplier: float) -> float:
     return (raw_strength / 20.0) * platform_multiplier
 
 
-def create_vector(insight: Dict[str, Any]) -> List[float]:
+MOTIVATION_PREFIX = "motivation:"
+PAIN_PREFIX = "pain:"
+INTENT_FEATURE = "purchase_intent"
+INFLUENCE_FEATURE = "influencer_effect"
+
+
+def build_feature_vocabulary(insights: List[Dict[str, Any]]) -> List[str]:
     """
-    Create multi-dimensional vector from insight data.
+    Build the global feature space once per run.
     
-    Vector structure:
-    [M1_norm, M2_norm, ..., Mn_norm, P1_norm, P2_norm, ..., Pn_norm, Intent_norm, Influence_norm]
+    Columns: [motivation:<name>..., pain:<name>..., purchase_intent, influencer_effect]
+    Names are sorted so a column means the same trait for every insight.
     
     Args:
-        insight: Insight document with motivations, pains, purchase_intent, influencer_effect, platform
+        insights: List of insight documents
     
     Returns:
-        Multi-dimensional vector
+        Ordered list of feature names (column i of the matrix = vocabulary[i])
     """
-    platform = insight.get('platform', 'Other')
-    multiplier = get_platform_multiplier(platform)
+    motivations = set()
+    pains = set()
+    for insight in insights:
+        motivations.update(str(m.get('name')) for m in insight.get('motivations') or [])
+        pains.update(str(p.get('name')) for p in insight.get('pains') or [])
+    
+    return (
+        [MOTIVATION_PREFIX + name for name in sorted(motivations)] +
+        [PAIN_PREFIX + name for name in sorted(pains)] +
+        [INTENT_FEATURE, INFLUENCE_FEATURE]
+    )
+
+
+def encode_insights(insights: List[Dict[str, Any]], vocabulary: List[str]) -> sparse.csr_matrix:
+    """
+    Encode insights straight into a CSR matrix over a fixed vocabulary.
     
-    vector = []
+    Each value is (raw_strength / 20) * platform_multiplier; the multiplier is
+    applied as a row scaling. Names missing from the vocabulary are ignored.
     
-    # Add normalized motivations
-    motivations = insight.get('motivations', [])
-    for motivation in motivations:
-        strength = motivation.get('strength', 0)
-        normalized = normalize_strength(strength, multiplier)
-        vector.append(normalized)
+    Args:
+        insights: List of insight documents
+        vocabulary: Feature names from build_feature_vocabulary
     
-    # Add normalized pains
-    pains = insight.get('pains', [])
-    for pain in pains:
-        strength = pain.get('strength', 0)
-        normalized = normalize_strength(strength, multiplier)
-        vector.append(normalized)
+    Returns:
+        Sparse matrix of shape (len(insights), len(vocabulary))
+    """
+    index = {name: col for col, name in enumerate(vocabulary)}
+    intent_col = index[INTENT_FEATURE]
+    influence_col = index[INFLUENCE_FEATURE]
+    
+    rows, cols, values = [], [], []
+    for i, insight in enumerate(insights):
+        for field, prefix in (('motivations', MOTIVATION_PREFIX), ('pains', PAIN_PREFIX)):
+            for item in insight.get(field) or []:
+                col = index.get(prefix + str(item.get('name')))
+                if col is not None:
+                    rows.append(i)
+                    cols.append(col)
+                    values.append(item.get('strength', 0) or 0)
+        
+        rows.extend((i, i))
+        cols.extend((intent_col, influence_col))
+        values.extend((insight.get('purchase_intent', 0) or 0, insight.get('influencer_effect', 0) or 0))
     
-    # Add normalized purchase intent
-    intent = insight.get('purchase_intent', 0)
-    vector.append(normalize_strength(intent, multiplier))
+    matrix = sparse.csr_matrix(
+        (np.asarray(values, dtype=np.float64) / 20.0, (rows, cols)),
+        shape=(len(insights), len(vocabulary))
+    )
     
-    # Add normalized influencer effect
-    influence = insight.get('influencer_effect', 0)
-    vector.append(normalize_strength(influence, multiplier))
+    multipliers = np.array([
+        get_platform_multiplier(insight.get('platform', 'Other')) for insight in insights
+    ], dtype=np.float64)
     
-    return vector
+    return sparse.diags(multipliers).dot(matrix).tocsr()
 
 
-def pad_vectors(vectors: List[List[float]]) -> Tuple[np.ndarray, int]:
+def create_vector(insight: Dict[str, Any], vocabulary: List[str]) -> List[float]:
     """
-    Pad vectors to same length (required for clustering)
+    Create the name-aligned dense vector for a single insight.
     
     Args:
-        vectors: List of vectors with potentially different lengths
+        insight: Insight document
+        vocabulary: Feature names from build_feature_vocabulary
     
     Returns:
-        Tuple of (padded numpy array, max_length)
+        Vector with one value per vocabulary column
     """
-    if not vectors:
-        return np.array([]), 0
+    return encode_insights([insight], vocabulary).toarray()[0].tolist()
+
+
+def _fit_restart(vectors, n_clusters: int, seed: int, engine: str):
+    """Single seeded K-Means fit (one restart)"""
+    if engine == 'minibatch':
+        model = MiniBatchKMeans(n_clusters=n_clusters, random_state=seed, n_init=1, batch_size=2048)
+    else:
+        model = KMeans(n_clusters=n_clusters, random_state=seed, n_init=1)
+    model.fit(vectors)
+    return model
+
+
+def fit_kmeans(
+    vectors,
+    n_clusters: int,
+    engine: str = 'auto',
+    random_state: Optional[int] = None,
+    n_restarts: int = 5,
+    n_jobs: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Run seeded K-Means restarts in parallel and keep the lowest inertia.
     
-    max_length = max(len(v) for v in vectors)
+    Args:
+        vectors: Encoded insight matrix (dense or CSR)
+        n_clusters: Number of clusters
+        engine: 'kmeans', 'minibatch', or 'auto' (MiniBatchKMeans at or above
+                CLUSTERING_MINIBATCH_THRESHOLD insights)
+        random_state: Base seed; the same seed always gives the same result
+        n_restarts: Number of independent restarts
+        n_jobs: Parallel workers (defaults to CLUSTERING_N_JOBS)
     
-    padded = []
-    for vector in vectors:
-        if len(vector) < max_length:
-            # Pad with zeros
-            padded_vector = vector + [0.0] * (max_length - len(vector))
-        else:
-            padded_vector = vector
-        padded.append(padded_vector)
+    Returns:
+        labels, centers, inertia, engine used and the winning seed
+    """
+    if engine == 'auto':
+        engine = 'minibatch' if vectors.shape[0] >= settings.CLUSTERING_MINIBATCH_THRESHOLD else 'kmeans'
+    if engine not in ('kmeans', 'minibatch'):
+        raise ValueError(f"Unknown clustering engine: {engine}")
+    
+    if random_state is None:
+        random_state = settings.CLUSTERING_RANDOM_STATE
+    seeds = np.random.SeedSequence(random_state).generate_state(n_restarts).tolist()
+    
+    # Threads: the Lloyd iterations release the GIL, and the matrix is shared without copies
+    models = Parallel(n_jobs=n_jobs or settings.CLUSTERING_N_JOBS, prefer='threads')(
+        delayed(_fit_restart)(vectors, n_clusters, seed, engine) for seed in seeds
+    )
     
-    return np.array(padded), max_length
+    # min() keeps the first restart on ties, so the choice is deterministic
+    best_index = min(range(len(models)), key=lambda i: models[i].inertia_)
+    best = models[best_index]
+    
+    return {
+        'labels': best.labels_,
+        'centers': best.cluster_centers_,
+        'inertia': float(best.inertia_),
+        'engine': engine,
+        'seed': seeds[best_index]
+    }
+
+
+def _next_center(vectors, model) -> np.ndarray:
+    """Seed for k+1: the point farthest from its current center"""
+    distances = model.transform(vectors).min(axis=1)
+    row = vectors[int(np.argmax(distances))]
+    return row.toarray().ravel() if sparse.issparse(row) else np.asarray(row).ravel()
+
+
+def select_cluster_count(
+    vectors,
+    k_min: Optional[int] = None,
+    k_max: Optional[int] = None,
+    random_state: Optional[int] = None,
+    sample_size: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Score a range of k on the encoded matrix and pick the best one.
+    
+    Each k is warm-started from the previous centers plus the worst-fit point,
+    so the sweep costs about one fit. Calinski-Harabasz comes from the fitted
+    inertia and a single total-dispersion computation; silhouette runs on one
+    fixed subsample whose pairwise distances are computed once and reused.
+    
+    Returns:
+        {'k': chosen k, 'scores': [{'k', 'inertia', 'calinski_harabasz', 'silhouette'}, ...]}
+    """
+    n = vectors.shape[0]
+    k_min = max(2, k_min or settings.CLUSTERING_K_MIN)
+    k_max = min(k_max or settings.CLUSTERING_K_MAX, n - 1)
+    if k_max < k_min:
+        raise ValueError(f"Need at least {k_min + 1} insights to choose a cluster count")
+    if random_state is None:
+        random_state = settings.CLUSTERING_RANDOM_STATE
+    sample_size = sample_size or settings.CLUSTERING_SILHOUETTE_SAMPLE
+    
+    rng = np.random.default_rng(random_state)
+    sample = np.sort(rng.choice(n, size=min(n, sample_size), replace=False))
+    sample_distances = pairwise_distances(vectors[sample])
+    
+    mean = np.asarray(vectors.mean(axis=0)).ravel()
+    if sparse.issparse(vectors):
+        total_dispersion = float(vectors.multiply(vectors).sum()) - n * float(mean @ mean)
+    else:
+        total_dispersion = float(((vectors - mean) ** 2).sum())
+    
+    scores = []
+    model = KMeans(n_clusters=k_min, random_state=random_state, n_init=1).fit(vectors)
+    for k in range(k_min, k_max + 1):
+        if k > k_min:
+            init = np.vstack([model.cluster_centers_, _next_center(vectors, model)])
+            model = KMeans(n_clusters=k, init=init, n_init=1).fit(vectors)
+        
+        within = float(model.inertia_)
+        between = max(total_dispersion - within, 0.0)
+        calinski_harabasz = (between / (k - 1)) / (within / (n - k)) if within > 0 and n > k else 0.0
+        
+        sample_labels = model.labels_[sample]
+        n_labels = len(np.unique(sample_labels))
+        silhouette = (
+            float(silhouette_score(sample_distances, sample_labels, metric='precomputed'))
+            if 2 <= n_labels <= len(sample) - 1 else None
+        )
+        
+        scores.append({
+            'k': k,
+            'inertia': round(within, 4),
+            'calinski_harabasz': round(calinski_harabasz, 4),
+            'silhouette': round(silhouette, 4) if silhouette is not None else None
+        })
+    
+    # Highest silhouette wins; Calinski-Harabasz breaks ties, then the smaller k
+    best = max(
+        scores,
+        key=lambda s: (s['silhouette'] if s['silhouette'] is not None else -1.0, s['calinski_harabasz'], -s['k'])
+    )
+    return {'k': best['k'], 'scores': scores}
 
 
-def perform_clustering(insights: List[Dict[str, Any]], n_clusters: int = 3) -> Dict[str, Any]:
+def perform_clustering(
+    insights: List[Dict[str, Any]],
+    n_clusters: Optional[int] = 3,
+    engine: str = 'auto',
+    random_state: Optional[int] = None
+) -> Dict[str, Any]:
     """
-    Perform K-Means clustering with cosine similarity
+    Perform K-Means clustering on the name-aligned feature matrix
     
     Args:
         insights: List of insight documents
-        n_clusters: Number of clusters (default 3)
+        n_clusters: Number of clusters (default 3); None selects k automatically
+        engine: 'kmeans', 'minibatch' or 'auto' (see fit_kmeans)
+        random_state: Base seed for reproducible restarts
     
     Returns:
         Dictionary containing cluster assignments and centers
     """
-    if len(insights) < n_clusters:
+    if n_clusters is not None and len(insights) < n_clusters:
         raise ValueError(f"Need at least {n_clusters} insights to create {n_clusters} clusters")
     
-    # Create vectors for all insights
-    vectors = []
-    valid_insights = []
+    # Build the feature space once, then encode every insight against it
+    vocabulary = build_feature_vocabulary(insights)
+    vectors_array = encode_insights(insights, vocabulary)
     
-    for insight in insights:
-        try:
-            vector = create_vector(insight)
-            if vector:  # Only include if vector was created successfully
-                vectors.append(vector)
-                valid_insights.append(insight)
-        except Exception as e:
-            print(f"Error creating vector for insight {insight.get('id')}: {e}")
-            continue
-    
-    if len(vectors) < n_clusters:
-        raise ValueError(f"Only {len(vectors)} valid vectors created, need at least {n_clusters}")
-    
-    # Pad vectors to same length
-    vectors_array, max_length = pad_vectors(vectors)
-    
-    # Perform K-Means clustering with multiple restarts
-    best_kmeans = None
-    best_inertia = float('inf')
-    
-    for _ in range(5):  # 5 restarts
-        kmeans = KMeans(n_clusters=n_clusters, random_state=None, n_init=1)
-        kmeans.fit(vectors_array)
-        
-        if kmeans.inertia_ < best_inertia:
-            best_inertia = kmeans.inertia_
-            best_kmeans = kmeans
+    k_selection = None
+    if n_clusters is None:
+        k_selection = select_cluster_count(vectors_array, random_state=random_state)
+        n_clusters = k_selection['k']
+        print(f"Selected k={n_clusters} from {[s['k'] for s in k_selection['scores']]}")
+    
+    fit = fit_kmeans(vectors_array, n_clusters, engine=engine, random_state=random_state)
     
     # Assign cluster IDs to insights
+    dense_vectors = vectors_array.toarray().tolist()
     cluster_assignments = {}
-    for i, insight in enumerate(valid_insights):
-        cluster_id = int(best_kmeans.labels_[i])
+    for i, insight in enumerate(insights):
+        cluster_id = int(fit['labels'][i])
         cluster_assignments[insight['id']] = {
             'cluster_id': f"cluster_{cluster_id}",
-            'vector': vectors[i]
+            'vector': dense_vectors[i]
         }
     
     # Compute cluster centers
     cluster_centers = {}
     for i in range(n_clusters):
-        cluster_centers[f"cluster_{i}"] = best_kmeans.cluster_centers_[i].tolist()
+        cluster_centers[f"cluster_{i}"] = fit['centers'][i].tolist()
     
     return {
         'assignments': cluster_assignments,
+        'labels': fit['labels'],
         'centers': cluster_centers,
         'n_clusters': n_clusters,
-        'inertia': best_inertia
+        'inertia': fit['inertia'],
+        'engine': fit['engine'],
+        'seed': fit['seed'],
+        'k_selection': k_selection,
+        'vocabulary': vocabulary
     }
 
 
@@ -343,8 +501,6 @@ def compute_wts_classification(cluster_summary: Dict[str, Any], insights: List[D
     Returns:
         WTS classifications and categories
     """
-    total_insights = len(insights)
-    
     # Calculate frequencies
     motivation_freq = defaultdict(int)
     pain_freq = defaultdict(int)
@@ -355,10 +511,23 @@ def compute_wts_classification(cluster_summary: Dict[str, Any], insights: List[D
         for pain in insight.get('pains', []):
             pain_freq[pain.get('name')] += 1
     
+    return classify_wts(cluster_summary, motivation_freq, pain_freq, len(insights))
+
+
+def classify_wts(
+    cluster_summary: Dict[str, Any],
+    motivation_freq: Dict[str, int],
+    pain_freq: Dict[str, int],
+    total_insights: int
+) -> Dict[str, Any]:
+    """
+    WTS classification and TCSS from averaged scores plus name frequencies
+    (shared by the full run and the incremental cluster stats)
+    """
     # Calculate WTS for motivations
     motivation_wts = {}
     for name, avg_score in cluster_summary.get('avg_motivations', {}).items():
-        frequency_pct = motivation_freq[name] / total_insights
+        frequency_pct = motivation_freq.get(name, 0) / total_insights
         wts = frequency_pct * avg_score
         
         # Classify
@@ -372,14 +541,14 @@ def compute_wts_classification(cluster_summary: Dict[str, Any], insights: List[D
         motivation_wts[name] = {
             'wts': float(wts),
             'category': category,
-            'frequency': motivation_freq[name],
+            'frequency': motivation_freq.get(name, 0),
             'avg_score': float(avg_score)
         }
     
     # Calculate WTS for pains
     pain_wts = {}
     for name, avg_score in cluster_summary.get('avg_pains', {}).items():
-        frequency_pct = pain_freq[name] / total_insights
+        frequency_pct = pain_freq.get(name, 0) / total_insights
         wts = frequency_pct * avg_score
         
         # Classify
@@ -393,7 +562,7 @@ def compute_wts_classification(cluster_summary: Dict[str, Any], insights: List[D
         pain_wts[name] = {
             'wts': float(wts),
             'category': category,
-            'frequency': pain_freq[name],
+            'frequency': pain_freq.get(name, 0),
             'avg_score': float(avg_score)
         }
     
@@ -0,0 +1,270 @@
+"""
+Streaming CSV/XLSX ingest for the diagnostics datasets
+Parses an uploaded file row by row, infers column types on a sample and writes chunks as it goes
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import csv
+import io
+import re
+import uuid
+from datetime import date, datetime
+from itertools import chain, islice
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+from services.chunked_dataset_service import ChunkedDatasetService
+
+# Rows inspected for type inference (kept in memory while sampling)
+SAMPLE_ROWS = 1000
+
+# System fields per module with the header spellings they are matched against
+MODULE_FIELDS = {
+    'social_media': {
+        'platform': ['platform', 'channel', 'network'],
+        'post_type': ['post_type', 'content_type', 'format', 'type'],
+        'likes': ['likes', 'like_count', 'reactions'],
+        'comments': ['comments', 'comment_count'],
+        'shares': ['shares', 'share_count', 'reposts'],
+        'saves': ['saves', 'save_count', 'bookmarks'],
+        'views': ['views', 'view_count', 'impressions', 'reach'],
+        'posting_date': ['posting_date', 'post_date', 'date', 'published', 'published_at'],
+        'sentiment': ['sentiment', 'sentiment_score'],
+        'key_themes': ['key_themes', 'themes', 'theme', 'topic', 'topics']
+    },
+    'search_marketing': {
+        'keyword': ['keyword', 'keywords', 'query', 'search_term'],
+        'search_volume': ['search_volume', 'volume', 'monthly_searches', 'avg_monthly_searches'],
+        'keyword_difficulty': ['keyword_difficulty', 'difficulty', 'kd'],
+        'competition_level': ['competition_level', 'competition'],
+        'intent': ['intent', 'search_intent'],
+        'brand_ranking': ['brand_ranking', 'brand_rank', 'our_ranking', 'mufe_rank', 'mufe_ranking'],
+        'competitor_ranking': ['competitor_ranking', 'competitor_rank']
+    }
+}
+
+NUMERIC_FIELDS = {
+    'likes', 'comments', 'shares', 'saves', 'views',
+    'search_volume', 'keyword_difficulty', 'brand_ranking', 'competitor_ranking'
+}
+
+INTEGER_PATTERN = re.compile(r'^[+-]?(\d+|\d{1,3}(,\d{3})+)$')
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+
+class IngestError(ValueError):
+    """The upload can't be parsed"""
+
+
+class DatasetIngestService:
+    """
+    Upload -> typed rows -> chunked dataset, one pass.
+
+    Only the type-inference sample and the chunks in flight are held in
+    memory; the upload itself is read from FastAPI's spooled temp file.
+    """
+
+    @staticmethod
+    def _normalize(name: Any) -> str:
+        return re.sub(r'[^a-z0-9]+', '_', str(name).lower()).strip('_')
+
+    @staticmethod
+    def _csv_rows(stream: BinaryIO) -> Iterator[List[Any]]:
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        try:
+            yield from csv.reader(text)
+        except UnicodeDecodeError:
+            raise IngestError("CSV files must be UTF-8 encoded")
+        finally:
+            text.detach()  # leave the upload open for its owner
+
+    @staticmethod
+    def _xlsx_rows(stream: BinaryIO) -> Iterator[List[Any]]:
+        try:
+            import openpyxl
+        except ImportError:
+            raise IngestError("XLSX ingest requires the openpyxl package; upload a CSV instead")
+        # read_only streams rows from the sheet XML instead of loading the workbook
+        try:
+            workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+        except Exception as e:
+            raise IngestError(f"Could not read the spreadsheet: {e}")
+        try:
+            for values in workbook.worksheets[0].iter_rows(values_only=True):
+                yield ['' if value is None else value for value in values]
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def _cell_type(value: Any) -> str:
+        if isinstance(value, bool):
+            return 'string'
+        if isinstance(value, int):
+            return 'integer'
+        if isinstance(value, float):
+            return 'integer' if value.is_integer() else 'number'
+        if isinstance(value, (datetime, date)):
+            return 'date'
+        text = str(value).strip()
+        if INTEGER_PATTERN.match(text):
+            return 'integer'
+        try:
+            float(text)
+            return 'number'
+        except ValueError:
+            pass
+        if DATE_PATTERN.match(text):
+            try:
+                datetime.fromisoformat(text)
+                return 'date'
+            except ValueError:
+                pass
+        return 'string'
+
+    @staticmethod
+    def infer_types(columns: List[str], sample: List[List[Any]]) -> Dict[str, str]:
+        """Narrowest type every non-empty sample value fits: integer < number, else date or string ('empty' if none)"""
+        types = {}
+        for index, column in enumerate(columns):
+            seen = {
+                DatasetIngestService._cell_type(row[index])
+                for row in sample
+                if index < len(row) and str(row[index]).strip() != ''
+            }
+            if not seen:
+                types[column] = 'empty'
+            elif seen <= {'integer'}:
+                types[column] = 'integer'
+            elif seen <= {'integer', 'number'}:
+                types[column] = 'number'
+            elif seen == {'date'}:
+                types[column] = 'date'
+            else:
+                types[column] = 'string'
+        return types
+
+    @staticmethod
+    def _convert(value: Any, column_type: str) -> Any:
+        """Cell value for storage; anything that doesn't fit the column type is kept as text"""
+        if isinstance(value, datetime) and value.time() == datetime.min.time():
+            return value.date().isoformat()  # Excel stores plain dates as midnight datetimes
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, str):
+            value = value.strip()
+        # Booleans are text to _cell_type; float(True) would store them as 1
+        if value == '' or isinstance(value, bool) or column_type in ('string', 'date', 'empty'):
+            return value if isinstance(value, str) else str(value)
+        try:
+            if column_type == 'integer':
+                if isinstance(value, str):
+                    return int(value.replace(',', ''))
+                # Only whole numbers become ints; 3.7 in an integer column stays 3.7
+                number = float(value)
+                return int(number) if number.is_integer() else number
+            return float(value)
+        except (ValueError, TypeError):
+            return str(value)
+
+    @staticmethod
+    def suggest_mapping(module: str, columns: List[str], column_types: Dict[str, str]) -> Dict[str, str]:
+        """
+        System field -> uploaded column, by normalized header name then synonyms.
+        Numeric fields only take numeric (or blank) columns; each column is used once.
+        """
+        normalized = {}
+        for column in columns:
+            normalized.setdefault(DatasetIngestService._normalize(column), column)
+
+        mapping = {}
+        used = set()
+        for field, spellings in MODULE_FIELDS.get(module, {}).items():
+            for spelling in spellings:
+                column = normalized.get(spelling)
+                if column is None or column in used:
+                    continue
+                if field in NUMERIC_FIELDS and column_types.get(column) not in ('integer', 'number', 'empty'):
+                    continue
+                mapping[field] = column
+                used.add(column)
+                break
+        return mapping
+
+    @staticmethod
+    def _read_header(rows: Iterator[List[Any]]) -> List[str]:
+        for header in rows:
+            columns = [str(name).strip() for name in header]
+            if any(columns):
+                break
+        else:
+            raise IngestError("The file has no header row")
+        # Unnamed or repeated headers get positional names so no values are dropped
+        seen = set()
+        for index, name in enumerate(columns):
+            if not name or name in seen:
+                columns[index] = f"{name or 'Column'} {index + 1}"
+            seen.add(columns[index])
+        return columns
+
+    @staticmethod
+    def ingest(module: str, filename: str, stream: BinaryIO, username: str, append: bool = True,
+               updated_at: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Parse an uploaded CSV/XLSX and write it to the module's dataset.
+
+        Header matching against existing columns is case-insensitive (like the
+        frontend importer); every row gets every dataset column and a new id.
+        append=False replaces the dataset instead of appending to it.
+        """
+        extension = os.path.splitext(filename or '')[1].lower()
+        if extension == '.csv':
+            rows = DatasetIngestService._csv_rows(stream)
+        elif extension in ('.xlsx', '.xlsm'):
+            rows = DatasetIngestService._xlsx_rows(stream)
+        else:
+            raise IngestError("Upload a .csv or .xlsx file")
+
+        uploaded_columns = DatasetIngestService._read_header(rows)
+        sample = list(islice(rows, SAMPLE_ROWS))
+        column_types = DatasetIngestService.infer_types(uploaded_columns, sample)
+
+        manifest = ChunkedDatasetService.get_manifest(module) if append else None
+        existing_columns = list((manifest or {}).get('columns', []))
+        existing_by_name = {column.lower(): column for column in existing_columns}
+        # Uploaded column -> dataset column
+        targets = [existing_by_name.get(column.lower(), column) for column in uploaded_columns]
+        new_columns = [column for column in targets if column not in existing_columns]
+        columns = existing_columns + new_columns
+        fill = {column: '' for column in columns}
+
+        prefix = f"row-{uuid.uuid4().hex[:8]}"
+        counts = {'rows': 0, 'blank': 0}
+
+        def typed_rows() -> Iterator[Dict[str, Any]]:
+            convert = DatasetIngestService._convert
+            for values in chain(sample, rows):
+                if not any(str(value).strip() for value in values):
+                    counts['blank'] += 1
+                    continue
+                row = {'id': f"{prefix}-{counts['rows']}", **fill}
+                for column, target, value in zip(uploaded_columns, targets, values):
+                    row[target] = convert(value, column_types[column])
+                counts['rows'] += 1
+                yield row
+
+        result = ChunkedDatasetService.write_stream(
+            module, columns, typed_rows(), username, updated_at, append=append,
+            expected_version=(manifest or {}).get('version', 0) if append else None
+        )
+        suggested = DatasetIngestService.suggest_mapping(module, uploaded_columns, column_types)
+        target_of = dict(zip(uploaded_columns, targets))
+        return {
+            'rows_ingested': counts['rows'],
+            'blank_rows_skipped': counts['blank'],
+            'row_count': result['row_count'],
+            'columns': columns,
+            'new_columns': new_columns,
+            'column_types': {target: column_types[column] for column, target in zip(uploaded_columns, targets)},
+            'suggested_mapping': {field: target_of[column] for field, column in suggested.items()},
+            'version': result['version']
+        }
@@ -6,7 +6,10 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from firebase_client import db
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from services.chunked_dataset_service import ChunkedDatasetService, DatasetVersionConflict
+from services.mapped_projection_service import MappingProjection, MappedTable
+from concurrent.futures import ThreadPoolExecutor
 import uuid
 
 
@@ -19,34 +22,73 @@ class DynamicDataService:
         Save complete table data (columns + rows) - SHARED across all users
         module: 'social_media' or 'search_marketing'
         Each module has ONE shared dataset that all users see
+        Rows are stored in chunks under a manifest (see ChunkedDatasetService)
+        If data carries a version, raises DatasetVersionConflict when it is stale
         """
         try:
-            # Use 'shared' document so all users see the same data
-            doc_ref = db.collection(f'{module}_dynamic_data').document('shared')
-            doc_ref.set({
-                'last_updated_by': username,
-                'columns': data.get('columns', []),
-                'rows': data.get('rows', []),
-                'updated_at': data.get('updated_at', None)
-            })
+            ChunkedDatasetService.write(
+                module,
+                data.get('columns', []),
+                data.get('rows', []),
+                username,
+                data.get('updated_at', None),
+                expected_version=data.get('version', None)
+            )
             return True
+        except DatasetVersionConflict:
+            raise
         except Exception as e:
             print(f"Error saving {module} data: {e}")
             return False
     
     @staticmethod
     def get_table_data(username: str, module: str) -> Dict[str, Any]:
-        """Get complete table data - SHARED across all users"""
+        """Get complete table data - SHARED across all users (all chunks assembled)"""
         try:
-            # Get the shared document so all users see the same latest data
-            doc = db.collection(f'{module}_dynamic_data').document('shared').get()
-            if doc.exists:
-                return doc.to_dict()
-            return {'columns': [], 'rows': [], 'last_updated_by': None}
+            manifest = ChunkedDatasetService.get_manifest(module)
+            if not manifest:
+                return {'columns': [], 'rows': [], 'last_updated_by': None}
+            if not ChunkedDatasetService.is_chunked(manifest):
+                return manifest
+            return {
+                'columns': manifest.get('columns', []),
+                'rows': list(ChunkedDatasetService.iter_rows(module, manifest)),
+                'last_updated_by': manifest.get('last_updated_by'),
+                'updated_at': manifest.get('updated_at'),
+                'row_count': manifest.get('row_count', 0),
+                'version': manifest.get('version', 0)
+            }
         except Exception as e:
             print(f"Error retrieving {module} data: {e}")
             return {'columns': [], 'rows': [], 'last_updated_by': None}
     
+    @staticmethod
+    def patch_table_data(username: str, module: str, version: int, operations: List[Dict[str, Any]],
+                         updated_at: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Apply row/column operations against dataset version `version`.
+        Only the chunks holding affected rows are rewritten (column renames and
+        removals touch every row). Column mappings follow renamed/removed columns.
+        Raises DatasetVersionConflict / DatasetPatchError.
+        """
+        result = ChunkedDatasetService.patch(module, version, operations, username, updated_at)
+        
+        column_ops = [op for op in operations if op.get('op') in ('rename_column', 'remove_column')]
+        if column_ops:
+            mappings = DynamicDataService.get_column_mapping(username, module)
+            updated = dict(mappings)
+            for operation in column_ops:
+                for field, column in list(updated.items()):
+                    if column != operation['column']:
+                        continue
+                    if operation['op'] == 'rename_column':
+                        updated[field] = operation['new_name']
+                    else:
+                        del updated[field]
+            if updated != mappings:
+                DynamicDataService.save_column_mapping(username, module, updated)
+        return result
+    
     @staticmethod
     def save_column_mapping(username: str, module: str, mappings: Dict[str, str]) -> bool:
         """
@@ -79,37 +121,81 @@ class DynamicDataService:
             return {}
     
     @staticmethod
-    def get_mapped_data(username: str, module: str) -> List[Dict[str, Any]]:
+    def get_table_page(username: str, module: str, offset: int = 0, limit: int = 500) -> Dict[str, Any]:
+        """Get one page of table data; only the chunks covering the page are read"""
+        try:
+            return ChunkedDatasetService.read_page(module, offset, limit)
+        except Exception as e:
+            print(f"Error retrieving {module} data page: {e}")
+            return {'columns': [], 'rows': [], 'row_count': 0, 'offset': offset, 'limit': limit, 'next_offset': None}
+    
+    @staticmethod
+    def _map_row(row: Dict[str, Any], mappings: Dict[str, str]) -> Dict[str, Any]:
+        """Transform row column names to system names"""
+        mapped_row = {}
+        for system_field, user_column in mappings.items():
+            if user_column in row:
+                mapped_row[system_field] = row[user_column]
+            else:
+                mapped_row[system_field] = None
+        # Keep row ID if exists
+        if 'id' in row:
+            mapped_row['id'] = row['id']
+        return mapped_row
+    
+    @staticmethod
+    def iter_mapped_data(username: str, module: str, manifest: Optional[Dict[str, Any]] = None,
+                         mappings: Optional[Dict[str, str]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Stream mapped rows chunk by chunk (raises on read errors)
+        manifest / mappings pin the inputs a caller already read (e.g. to hash them)
+        """
+        if mappings is None:
+            mappings = DynamicDataService.get_column_mapping(username, module)
+        if not mappings:
+            return
+        for rows in ChunkedDatasetService.iter_chunks(module, manifest):
+            for row in rows:
+                yield DynamicDataService._map_row(row, mappings)
+    
+    @staticmethod
+    def get_mapped_data(username: str, module: str, manifest: Optional[Dict[str, Any]] = None,
+                        mappings: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
         """
         Get data with mapped column names applied
         Returns rows with system field names instead of user column names
         """
         try:
-            # Get raw data
-            table_data = DynamicDataService.get_table_data(username, module)
-            rows = table_data.get('rows', [])
-            
-            # Get mappings
-            mappings = DynamicDataService.get_column_mapping(username, module)
-            
-            if not mappings or not rows:
-                return []
-            
-            # Apply mapping: transform row column names to system names
-            mapped_rows = []
-            for row in rows:
-                mapped_row = {}
-                for system_field, user_column in mappings.items():
-                    if user_column in row:
-                        mapped_row[system_field] = row[user_column]
-                    else:
-                        mapped_row[system_field] = None
-                # Keep row ID if exists
-                if 'id' in row:
-                    mapped_row['id'] = row['id']
-                mapped_rows.append(mapped_row)
-            
-            return mapped_rows
+            return list(DynamicDataService.iter_mapped_data(username, module, manifest, mappings))
         except Exception as e:
             print(f"Error getting mapped {module} data: {e}")
             return []
+    
+    @staticmethod
+    def get_manifest_and_mapping(username: str, module: str) -> Tuple[Optional[Dict[str, Any]], Dict[str, str]]:
+        """Read the dataset manifest and the column mapping concurrently (one round trip of latency)"""
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix='mapped-data') as executor:
+            manifest = executor.submit(ChunkedDatasetService.get_manifest, module)
+            mappings = executor.submit(DynamicDataService.get_column_mapping, username, module)
+            return manifest.result(), mappings.result()
+    
+    @staticmethod
+    def get_mapped_table(username: str, module: str, manifest: Optional[Dict[str, Any]] = None,
+                         mappings: Optional[Dict[str, str]] = None) -> MappedTable:
+        """
+        Mapped data as columns: the mapping is compiled once and rows are
+        projected chunk by chunk without building a dict per row.
+        Rows of the result behave like get_mapped_data rows.
+        """
+        if manifest is None and mappings is None:
+            manifest, mappings = DynamicDataService.get_manifest_and_mapping(username, module)
+        elif mappings is None:
+            mappings = DynamicDataService.get_column_mapping(username, module)
+        projection = MappingProjection(mappings or {})
+        try:
+            if not mappings:
+                return projection.project([])
+            return projection.project(ChunkedDatasetService.iter_chunks(module, manifest))
+        except Exception as e:
+            print(f"Error getting mapped {module} data: {e}")
+            return projection.project([])
@@ -0,0 +1,241 @@
+"""
+In-memory filename search index for the Shared Folder module
+Normalized names plus trigram postings, rebuilt from Firestore on first use
+and kept current by file create/delete and a catch-up query for other instances
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import heapq
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from firebase_client import db
+from config import settings
+from services.metrics_service import MetricsService
+
+# Ranks, best first
+RANK_EXACT = 0
+RANK_PREFIX = 1
+RANK_WORD_PREFIX = 2
+RANK_SUBSTRING = 3
+
+# Uploads stamped by another instance's clock may trail ours by this much
+SYNC_SKEW_SECONDS = 60
+
+
+def normalize(text: Any) -> str:
+    """Case- and accent-insensitive form used for both names and queries"""
+    decomposed = unicodedata.normalize('NFKD', str(text or ''))
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def rank(name: str, term: str) -> int:
+    """How well a normalized name matches a normalized term it contains"""
+    position = name.find(term)
+    if position == 0:
+        return RANK_EXACT if len(name) == len(term) else RANK_PREFIX
+    while position > 0:
+        if not name[position - 1].isalnum():
+            return RANK_WORD_PREFIX
+        position = name.find(term, position + 1)
+    return RANK_SUBSTRING
+
+
+class FileSearchIndex:
+    """
+    Substring/prefix index over file names.
+
+    - each file gets a slot; postings map a trigram to the slots whose name
+      contains it, so a query only verifies the slots of its rarest trigram
+    - terms shorter than 3 characters scan the names (still one pass over
+      plain strings, no Firestore reads)
+    - deletes tombstone the slot; postings are compacted by the next rebuild
+    - only ids and names are held; result documents are read fresh, so moves
+      and deletes made elsewhere can't leak or resurrect files
+    """
+
+    def __init__(self):
+        self.ids: List[Optional[str]] = []
+        self.names: List[Optional[str]] = []
+        self.slot_of: Dict[str, int] = {}
+        self.postings: Dict[str, List[int]] = {}
+        self.watermark = ''  # newest uploadedAt seen
+
+    def __len__(self) -> int:
+        return len(self.slot_of)
+
+    def add(self, file_id: str, file_name: str, uploaded_at: Optional[str] = None) -> None:
+        if file_id in self.slot_of:
+            self.remove(file_id)
+        slot = len(self.ids)
+        name = normalize(file_name)
+        self.ids.append(file_id)
+        self.names.append(name)
+        self.slot_of[file_id] = slot
+        for gram in trigrams(name):
+            self.postings.setdefault(gram, []).append(slot)
+        if uploaded_at and uploaded_at > self.watermark:
+            self.watermark = uploaded_at
+
+    def remove(self, file_id: str) -> None:
+        slot = self.slot_of.pop(file_id, None)
+        if slot is not None:
+            self.ids[slot] = None
+            self.names[slot] = None
+
+    def candidates(self, term: str) -> List[int]:
+        """Live slots whose name contains the normalized term"""
+        names = self.names
+        if len(term) < 3:
+            slots = range(len(names))
+        else:
+            postings = [self.postings.get(gram) for gram in trigrams(term)]
+            if not all(postings):
+                return []
+            slots = min(postings, key=len)
+        return [slot for slot in slots if names[slot] is not None and term in names[slot]]
+
+    def ranked(self, term: str, count: Optional[int] = None) -> List[str]:
+        """
+        File ids matching term, best first: exact name, name prefix, word prefix,
+        then any substring; ties go to shorter names, then newer uploads
+        (slots are assigned in upload order)
+        """
+        term = normalize(term).strip()
+        if not term:
+            return []
+        names = self.names
+
+        def key(slot: int) -> Tuple[int, int, int]:
+            return rank(names[slot], term), len(names[slot]), -slot
+
+        slots = self.candidates(term)
+        if count is not None and count < len(slots):
+            slots = heapq.nsmallest(count, slots, key=key)
+        else:
+            slots = sorted(slots, key=key)
+        return [self.ids[slot] for slot in slots]
+
+
+class FileSearchIndexService:
+    """
+    Process-wide FileSearchIndex.
+
+    - built with one projected scan of sharedFiles on first use
+    - create/delete on this instance update it immediately
+    - files uploaded on other instances are picked up by a query on
+      uploadedAt newer than the index watermark (less a clock-skew margin),
+      at most every FILE_SEARCH_SYNC_SECONDS
+    - rebuilt once tombstones outnumber live entries
+    """
+
+    _lock = threading.Lock()
+    _index: Optional[FileSearchIndex] = None
+    _synced_at = 0.0
+
+    @staticmethod
+    def _scan(query) -> List[Tuple[str, Dict[str, Any]]]:
+        return [(doc.id, doc.to_dict()) for doc in query.select(['fileName', 'uploadedAt']).stream()]
+
+    @staticmethod
+    def rebuild() -> FileSearchIndex:
+        """Build a fresh index from Firestore and swap it in"""
+        with MetricsService.timer('file_search.rebuild'):
+            index = FileSearchIndex()
+            docs = FileSearchIndexService._scan(db.collection('sharedFiles'))
+            docs.sort(key=lambda item: item[1].get('uploadedAt') or '')
+            for file_id, data in docs:
+                index.add(file_id, data.get('fileName'), data.get('uploadedAt'))
+        with FileSearchIndexService._lock:
+            FileSearchIndexService._index = index
+            FileSearchIndexService._synced_at = time.monotonic()
+        return index
+
+    @staticmethod
+    def get_index() -> FileSearchIndex:
+        """The index, built on first use and caught up with other instances' uploads"""
+        index = FileSearchIndexService._index
+        if index is None or len(index.ids) > 2 * max(len(index), 1000):
+            return FileSearchIndexService.rebuild()
+        if FileSearchIndexService._synced_at + settings.FILE_SEARCH_SYNC_SECONDS > time.monotonic():
+            return index
+
+        FileSearchIndexService._synced_at = time.monotonic()
+        try:
+            query = db.collection('sharedFiles')
+            if index.watermark:
+                since = datetime.fromisoformat(index.watermark) - timedelta(seconds=SYNC_SKEW_SECONDS)
+                query = query.where('uploadedAt', '>=', since.isoformat())
+            new_docs = FileSearchIndexService._scan(query)
+            with FileSearchIndexService._lock:
+                for file_id, data in new_docs:
+                    if file_id not in index.slot_of:
+                        index.add(file_id, data.get('fileName'), data.get('uploadedAt'))
+        except Exception as e:
+            # A stale index still answers; the next sync retries
+            print(f"Error syncing file search index: {e}")
+        return index
+
+    @staticmethod
+    def add(file_data: Dict[str, Any]) -> None:
+        """Index a file created on this instance"""
+        with FileSearchIndexService._lock:
+            if FileSearchIndexService._index is not None:
+                FileSearchIndexService._index.add(file_data['id'], file_data.get('fileName'), file_data.get('uploadedAt'))
+
+    @staticmethod
+    def remove(file_id: str) -> None:
+        """Drop a deleted file"""
+        with FileSearchIndexService._lock:
+            if FileSearchIndexService._index is not None:
+                FileSearchIndexService._index.remove(file_id)
+
+    @staticmethod
+    def search(term: str, limit: int, is_visible) -> List[Dict[str, Any]]:
+        """
+        Up to `limit` visible files matching term, best match first.
+        Matches are read from Firestore in ranked batches; files deleted
+        elsewhere are dropped from the index, and is_visible(file_data) is
+        applied to the fresh documents.
+        """
+        with MetricsService.timer('file_search.query'):
+            index = FileSearchIndexService.get_index()
+            with FileSearchIndexService._lock:
+                ranked = index.ranked(term, count=limit * 2)
+            complete = len(ranked) < limit * 2
+            seen = set()
+            results: List[Dict[str, Any]] = []
+            while len(results) < limit:
+                if not ranked:
+                    if complete:
+                        break
+                    # The best matches were mostly hidden or gone; rank all of them
+                    with FileSearchIndexService._lock:
+                        ranked = [file_id for file_id in index.ranked(term) if file_id not in seen]
+                    complete = True
+                    continue
+                file_ids, ranked = ranked[:limit * 2], ranked[limit * 2:]
+                seen.update(file_ids)
+
+                refs = [db.collection('sharedFiles').document(file_id) for file_id in file_ids]
+                snapshots = {snapshot.id: snapshot for snapshot in db.get_all(refs)}
+                for file_id in file_ids:
+                    snapshot = snapshots.get(file_id)
+                    if snapshot is None or not snapshot.exists:
+                        FileSearchIndexService.remove(file_id)
+                        continue
+                    file_data = snapshot.to_dict()
+                    file_data['id'] = file_id
+                    if is_visible(file_data):
+                        results.append(file_data)
+                        if len(results) == limit:
+                            break
+            return results
@@ -0,0 +1,201 @@
+"""
+In-process directory of shared folders (id -> folder, personal owners, max order)
+Loaded with one scan of `folders` and kept coherent by the folder CRUD methods
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+from firebase_client import db
+from config import settings
+from services.metrics_service import MetricsService
+
+
+class FolderDirectoryService:
+    """
+    Cached view of the folders collection.
+
+    - a directory is never mutated after it is built; put()/remove() swap in a
+      new one, so readers can hold one without locking
+    - writes on this instance are applied immediately; writes on other
+      instances show up after FOLDER_CACHE_TTL_SECONDS, or at once when the
+      Firestore snapshot listener is running (FOLDER_CACHE_LISTENER)
+    - a folder is only ever personal or shared from its creation, so ids seen
+      here are classified correctly; unknown ids force one reload (see get_personal_owners)
+    """
+
+    _lock = threading.Lock()
+    _directory: Optional[Dict[str, Any]] = None  # {'folders', 'personal_owners', 'max_order', 'missing'}
+    _expires_at = 0.0
+    _watch = None
+    _listener_attempted = False
+
+    @staticmethod
+    def _build(folders: Dict[str, Dict[str, Any]], missing: frozenset = frozenset()) -> Dict[str, Any]:
+        return {
+            'folders': folders,
+            'personal_owners': {
+                folder_id: folder.get('ownerUserID')
+                for folder_id, folder in folders.items()
+                if folder.get('isPersonal', False)
+            },
+            'max_order': max([folder.get('order') or 0 for folder in folders.values()], default=0),
+            # Ids files point at that were confirmed missing by a reload
+            'missing': frozenset(folder_id for folder_id in missing if folder_id not in folders)
+        }
+
+    @staticmethod
+    def _from_docs(docs: Iterable[Any]) -> Dict[str, Any]:
+        folders = {}
+        for doc in docs:
+            folder_data = doc.to_dict()
+            folder_data['id'] = doc.id
+            folders[doc.id] = folder_data
+        return FolderDirectoryService._build(folders)
+
+    @staticmethod
+    def _install(directory: Dict[str, Any]) -> Dict[str, Any]:
+        FolderDirectoryService._directory = directory
+        FolderDirectoryService._expires_at = time.monotonic() + settings.FOLDER_CACHE_TTL_SECONDS
+        return directory
+
+    @staticmethod
+    def is_live() -> bool:
+        """True while the snapshot listener is keeping the directory current"""
+        watch = FolderDirectoryService._watch
+        # A listener that closed on an error stops counting as live
+        return watch is not None and getattr(watch, 'is_active', True)
+
+    @staticmethod
+    def get_directory() -> Dict[str, Any]:
+        """Current directory; reloaded after the TTL unless the listener keeps it live"""
+        if settings.FOLDER_CACHE_LISTENER and not FolderDirectoryService._listener_attempted:
+            FolderDirectoryService.start_listener()
+
+        with FolderDirectoryService._lock:
+            directory = FolderDirectoryService._directory
+            if directory is not None and (FolderDirectoryService.is_live() or FolderDirectoryService._expires_at > time.monotonic()):
+                MetricsService.increment('folder_cache.hits')
+                return directory
+
+            MetricsService.increment('folder_cache.misses')
+            try:
+                return FolderDirectoryService._install(
+                    FolderDirectoryService._from_docs(db.collection('folders').stream())
+                )
+            except Exception as e:
+                if directory is None:
+                    raise
+                # Keep serving the last good directory if Firestore is unavailable
+                print(f"Error reloading folder directory, serving stale folders: {e}")
+                return directory
+
+    @staticmethod
+    def refresh(docs: Optional[Iterable[Any]] = None) -> Dict[str, Any]:
+        """Reload now, or rebuild from folder docs a caller already streamed"""
+        if docs is None:
+            FolderDirectoryService.invalidate()
+            return FolderDirectoryService.get_directory()
+        directory = FolderDirectoryService._from_docs(docs)
+        with FolderDirectoryService._lock:
+            return FolderDirectoryService._install(directory)
+
+    @staticmethod
+    def invalidate() -> None:
+        with FolderDirectoryService._lock:
+            FolderDirectoryService._directory = None
+            FolderDirectoryService._expires_at = 0.0
+
+    @staticmethod
+    def put(folder_data: Dict[str, Any]) -> None:
+        """Record a folder created or updated on this instance"""
+        with FolderDirectoryService._lock:
+            directory = FolderDirectoryService._directory
+            if directory is None:
+                return
+            folders = dict(directory['folders'])
+            folders[folder_data['id']] = {**folders.get(folder_data['id'], {}), **folder_data}
+            FolderDirectoryService._directory = FolderDirectoryService._build(folders, directory['missing'])
+
+    @staticmethod
+    def remove(folder_id: str) -> None:
+        """Forget a folder deleted on this instance"""
+        with FolderDirectoryService._lock:
+            directory = FolderDirectoryService._directory
+            if directory is None or folder_id not in directory['folders']:
+                return
+            folders = dict(directory['folders'])
+            del folders[folder_id]
+            FolderDirectoryService._directory = FolderDirectoryService._build(folders, directory['missing'])
+
+    @staticmethod
+    def get_folders() -> List[Dict[str, Any]]:
+        """Copies of every folder"""
+        return [dict(folder) for folder in FolderDirectoryService.get_directory()['folders'].values()]
+
+    @staticmethod
+    def get_folder(folder_id: str) -> Optional[Dict[str, Any]]:
+        folder = FolderDirectoryService.get_directory()['folders'].get(folder_id)
+        return dict(folder) if folder is not None else None
+
+    @staticmethod
+    def get_max_order() -> int:
+        return FolderDirectoryService.get_directory()['max_order']
+
+    @staticmethod
+    def get_personal_owners(folder_ids: Iterable[str] = ()) -> Dict[str, Any]:
+        """
+        Personal folder id -> owner user id.
+        If any of folder_ids is unknown (e.g. a personal folder just created on
+        another instance) the directory is reloaded, so privacy checks never
+        rely on a directory that predates the folder. Ids still unknown after
+        the reload (files in deleted folders) are remembered until the next one.
+        """
+        directory = FolderDirectoryService.get_directory()
+        unknown = {
+            folder_id for folder_id in folder_ids
+            if folder_id not in directory['folders'] and folder_id not in directory['missing']
+        }
+        if unknown:
+            MetricsService.increment('folder_cache.unknown_folder_reloads')
+            missing = directory['missing'] | unknown
+            directory = FolderDirectoryService.refresh()
+            with FolderDirectoryService._lock:
+                if FolderDirectoryService._directory is directory:
+                    directory = FolderDirectoryService._build(directory['folders'], directory['missing'] | missing)
+                    FolderDirectoryService._directory = directory
+        return directory['personal_owners']
+
+    @staticmethod
+    def start_listener() -> bool:
+        """
+        Keep the directory live with a Firestore snapshot listener so writes on
+        other instances are seen immediately. Returns False if it can't start.
+        """
+        with FolderDirectoryService._lock:
+            FolderDirectoryService._listener_attempted = True
+            if FolderDirectoryService._watch is not None:
+                return True
+
+            def on_snapshot(docs, changes, read_time):
+                directory = FolderDirectoryService._from_docs(docs)
+                with FolderDirectoryService._lock:
+                    FolderDirectoryService._install(directory)
+
+            try:
+                FolderDirectoryService._watch = db.collection('folders').on_snapshot(on_snapshot)
+            except Exception as e:
+                print(f"Error starting folder directory listener, using TTL refresh: {e}")
+                FolderDirectoryService._watch = None
+                return False
+            return FolderDirectoryService._watch is not None
+
+    @staticmethod
+    def stop_listener() -> None:
+        with FolderDirectoryService._lock:
+            watch, FolderDirectoryService._watch = FolderDirectoryService._watch, None
+        if watch is not None:
+            watch.unsubscribe()
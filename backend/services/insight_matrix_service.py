@@ -0,0 +1,254 @@
+"""
+Columnar representation of the insights collection
+Converts the insight stream once into NumPy arrays so scoring runs as vectorized operations
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from scipy import sparse
+from typing import Dict, Any, Iterable, List
+from array_utils import Vocabulary, sequential_sum, top_k
+
+
+class EntryColumn:
+    """
+    Multi-valued field stored as parallel (row, code[, value]) entry arrays,
+    in the same order a row-by-row loop would visit them.
+    """
+
+    def __init__(self, vocabulary: Vocabulary, rows: List[int], codes: List[int], values: List[float] = None):
+        self.names = vocabulary.names
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.codes = np.asarray(codes, dtype=np.int64)
+        self.values = np.asarray(values, dtype=np.float64) if values is not None else None
+
+    def counts(self) -> np.ndarray:
+        """Occurrences per name"""
+        return np.bincount(self.codes, minlength=len(self.names))
+
+    def sums(self, weights: np.ndarray) -> np.ndarray:
+        """Per-name sum of per-entry weights (sequential, like the Python loop)"""
+        return np.bincount(self.codes, weights=weights, minlength=len(self.names))
+
+    def to_csr(self, n_rows: int, values: np.ndarray = None) -> sparse.csr_matrix:
+        """rows x names sparse matrix; duplicate (row, name) entries are summed"""
+        data = self.values if values is None else values
+        return sparse.csr_matrix(
+            (data, (self.rows, self.codes)),
+            shape=(n_rows, len(self.names))
+        )
+
+
+class CategoryColumn:
+    """Single-valued categorical field stored as one code per insight"""
+
+    def __init__(self, vocabulary: Vocabulary, codes: List[int]):
+        self.names = vocabulary.names
+        self.codes = np.asarray(codes, dtype=np.int64)
+
+    def counts(self) -> np.ndarray:
+        return np.bincount(self.codes, minlength=len(self.names))
+
+    def lookup(self, table: Dict[str, float], default: float) -> np.ndarray:
+        """Map each insight's category through a lookup table (e.g. platform weights)"""
+        values = np.array([table.get(name, default) for name in self.names], dtype=np.float64)
+        return values[self.codes] if len(self.codes) else np.zeros(0)
+
+
+class InsightMatrix:
+    """Encoded insights: sparse strength entries plus code arrays for categorical fields"""
+
+    DEMOGRAPHIC_FIELDS = ('age_group', 'gender', 'skin_type', 'skin_tone', 'lifestyle')
+    LIST_FIELDS = ('behaviours', 'channels', 'products')
+
+    def __init__(self):
+        self.n = 0
+        self.ids: List[str] = []
+        self.motivations: EntryColumn = None
+        self.pains: EntryColumn = None
+        self.lists: Dict[str, EntryColumn] = {}
+        self.platform: CategoryColumn = None
+        self.demographics: Dict[str, CategoryColumn] = {}
+        self.purchase_intent: np.ndarray = None
+        self.influencer_effect: np.ndarray = None
+
+    @staticmethod
+    def from_insights(insight_dicts: Iterable[Dict[str, Any]]) -> 'InsightMatrix':
+        """Single pass over insight dicts into columnar arrays"""
+        strength_vocab = {'motivations': Vocabulary(), 'pains': Vocabulary()}
+        strength_entries = {field: ([], [], []) for field in strength_vocab}
+        list_vocab = {field: Vocabulary() for field in InsightMatrix.LIST_FIELDS}
+        list_entries = {field: ([], []) for field in InsightMatrix.LIST_FIELDS}
+        platform_vocab = Vocabulary()
+        platform_codes = []
+        demo_vocab = {field: Vocabulary() for field in InsightMatrix.DEMOGRAPHIC_FIELDS}
+        demo_codes = {field: [] for field in InsightMatrix.DEMOGRAPHIC_FIELDS}
+        ids, intents, influences = [], [], []
+
+        i = -1
+        for i, data in enumerate(insight_dicts):
+            get = data.get
+            ids.append(get('id'))
+            platform_codes.append(platform_vocab[get('platform', 'Other')])
+
+            for field, vocab in strength_vocab.items():
+                items = get(field) or ()
+                if items:
+                    rows, codes, values = strength_entries[field]
+                    rows.extend([i] * len(items))
+                    codes.extend([vocab[item['name']] for item in items])
+                    values.extend([item['strength'] for item in items])
+
+            for field, vocab in list_vocab.items():
+                items = get(field) or ()
+                if items:
+                    rows, codes = list_entries[field]
+                    rows.extend([i] * len(items))
+                    codes.extend([vocab[item] for item in items])
+
+            for field, vocab in demo_vocab.items():
+                demo_codes[field].append(vocab[get(field, 'Unknown')])
+
+            intents.append(get('purchase_intent', 0))
+            influences.append(get('influencer_effect', 0))
+
+        matrix = InsightMatrix()
+        matrix.n = i + 1
+        matrix.ids = ids
+        matrix.motivations = EntryColumn(strength_vocab['motivations'], *strength_entries['motivations'])
+        matrix.pains = EntryColumn(strength_vocab['pains'], *strength_entries['pains'])
+        matrix.lists = {
+            field: EntryColumn(list_vocab[field], *list_entries[field])
+            for field in InsightMatrix.LIST_FIELDS
+        }
+        matrix.platform = CategoryColumn(platform_vocab, platform_codes)
+        matrix.demographics = {
+            field: CategoryColumn(demo_vocab[field], demo_codes[field])
+            for field in InsightMatrix.DEMOGRAPHIC_FIELDS
+        }
+        matrix.purchase_intent = np.asarray(intents)
+        matrix.influencer_effect = np.asarray(influences)
+        return matrix
+
+
+# ==================== Vectorized scoring ====================
+
+def _counts_dict(names: List[str], counts: np.ndarray) -> Dict[str, int]:
+    return {name: count for name, count in zip(names, counts.tolist()) if count}
+
+
+def _demographics(matrix: InsightMatrix) -> Dict[str, Dict[str, int]]:
+    keys = {
+        'age_group': 'age_groups',
+        'gender': 'genders',
+        'skin_type': 'skin_types',
+        'skin_tone': 'skin_tones',
+        'lifestyle': 'lifestyles'
+    }
+    return {
+        keys[field]: _counts_dict(column.names, column.counts())
+        for field, column in matrix.demographics.items()
+    }
+
+
+def bucket_histogram(values: np.ndarray) -> Dict[str, int]:
+    """20-point buckets keyed like the row loop, in first-appearance order"""
+    buckets = values // 20
+    unique, first_index, counts = np.unique(buckets, return_index=True, return_counts=True)
+    distribution = {}
+    for j in np.argsort(first_index, kind='stable'):
+        bucket = unique[j].item()
+        distribution[f"{bucket * 20}-{(bucket + 1) * 20}"] = int(counts[j])
+    return distribution
+
+
+def raw_scores(matrix: InsightMatrix) -> Dict[str, Any]:
+    """RAW scores for the Report page (no platform weights, no WTS)"""
+    if matrix.n == 0:
+        return {}
+
+    formatted = {}
+    for field in ('motivations', 'pains'):
+        column = getattr(matrix, field)
+        scores = column.sums(column.values / 20.0)  # 0-100 → 0-5
+        formatted[field] = [
+            (column.names[j], {"score": round(float(scores[j]), 2)})
+            for j in top_k(scores, 10)
+        ]
+
+    return {
+        'total_insights': matrix.n,
+        'top_motivations': formatted['motivations'],
+        'top_pains': formatted['pains'],
+        'demographics': _demographics(matrix),
+        'behaviour_counts': _counts_dict(matrix.lists['behaviours'].names, matrix.lists['behaviours'].counts()),
+        'channel_counts': _counts_dict(matrix.lists['channels'].names, matrix.lists['channels'].counts()),
+        'product_counts': _counts_dict(matrix.lists['products'].names, matrix.lists['products'].counts()),
+        'platform_counts': _counts_dict(matrix.platform.names, matrix.platform.counts()),
+        'avg_purchase_intent': round(sequential_sum(matrix.purchase_intent) / matrix.n, 1),
+        'avg_influencer_effect': round(sequential_sum(matrix.influencer_effect) / matrix.n, 1),
+        'intent_distribution': bucket_histogram(matrix.purchase_intent),
+        'influence_distribution': bucket_histogram(matrix.influencer_effect)
+    }
+
+
+def _range_distribution(values: np.ndarray) -> Dict[str, int]:
+    ranges = (("0-20", 0, 20), ("21-40", 21, 40), ("41-60", 41, 60), ("61-80", 61, 80), ("81-100", 81, 100))
+    return {
+        label: int(np.count_nonzero((values >= low) & (values <= high)))
+        for label, low, high in ranges
+    }
+
+
+def weighted_scores(matrix: InsightMatrix, platform_weights: Dict[str, float], default_weight: float = 0.8) -> Dict[str, Any]:
+    """Platform-weighted scores for Persona Generation"""
+    if matrix.n == 0:
+        return {}
+
+    row_weights = matrix.platform.lookup(platform_weights, default_weight)
+
+    results = {}
+    top = {}
+    for field in ('motivations', 'pains'):
+        column = getattr(matrix, field)
+        frequency = column.counts()
+        total_strength = column.sums(column.values / 20.0)
+        total_weight = column.sums(row_weights[column.rows])
+        avg_strength = total_strength / frequency
+        avg_weight = total_weight / frequency
+        score = frequency * avg_strength * avg_weight
+
+        results[field] = {
+            name: {
+                "frequency": freq,
+                "avg_strength": avg_s,
+                "avg_weight": avg_w,
+                "score": s
+            }
+            for name, freq, avg_s, avg_w, s in zip(
+                column.names, frequency.tolist(), avg_strength.tolist(),
+                avg_weight.tolist(), score.tolist()
+            )
+        }
+        top[field] = [(column.names[j], results[field][column.names[j]]) for j in top_k(score, 10)]
+
+    intents = matrix.purchase_intent / 20.0
+    influences = matrix.influencer_effect / 20.0
+
+    return {
+        "total_insights": matrix.n,
+        "motivation_scores": results['motivations'],
+        "pain_scores": results['pains'],
+        "top_motivations": top['motivations'],
+        "top_pains": top['pains'],
+        "behaviour_counts": _counts_dict(matrix.lists['behaviours'].names, matrix.lists['behaviours'].counts()),
+        "channel_counts": _counts_dict(matrix.lists['channels'].names, matrix.lists['channels'].counts()),
+        "product_counts": _counts_dict(matrix.lists['products'].names, matrix.lists['products'].counts()),
+        "demographics": _demographics(matrix),
+        "avg_purchase_intent": sequential_sum(intents) / matrix.n,
+        "avg_influencer_effect": sequential_sum(influences) / matrix.n,
+        "intent_distribution": _range_distribution(intents),
+        "influence_distribution": _range_distribution(influences)
+    }
@@ -6,6 +6,9 @@ from firebase_client import db
 from firebase_admin import firestore
 from models import InsightCreate, InsightResponse
 from utils import serialize_firestore_doc
+from services.report_aggregates_service import ReportAggregatesService
+from services.report_cache_service import ReportCacheService
+from services.cluster_assignment_service import ClusterAssignmentService
 from typing import List
 
 class InsightsService:
@@ -17,9 +20,25 @@ class InsightsService:
         data = insight.model_dump()
         data['created_at'] = firestore.SERVER_TIMESTAMP
         
-        # Save to Firestore
+        # Place the insight in the nearest existing persona cluster (no re-clustering)
+        assignment = None
+        try:
+            assignment = ClusterAssignmentService.assign(data)
+        except Exception as e:
+            print(f"Error assigning insight to a cluster, leaving it unassigned: {e}")
+        if assignment:
+            data['cluster_id'] = assignment['cluster_id']
+            data['vector'] = assignment['vector']
+        
+        # Save to Firestore together with the report aggregates and cluster stats (atomic)
         doc_ref = db.collection('insights').document()
-        doc_ref.set(data)
+        batch = db.batch()
+        batch.set(doc_ref, data)
+        ReportAggregatesService.apply_insight(batch, data, sign=1)
+        if assignment:
+            ClusterAssignmentService.apply(batch, data, assignment['cluster_id'], assignment['distance'])
+        batch.commit()
+        ReportCacheService.bump_generation()
         
         # Get the saved document to return
         saved_doc = doc_ref.get()
@@ -55,10 +74,20 @@ class InsightsService:
     def delete_insight(insight_id: str) -> None:
         """Delete an insight by ID"""
         doc_ref = db.collection('insights').document(insight_id)
-        doc = doc_ref.get()
+        cluster_state = ClusterAssignmentService.get_state()
         
-        if not doc.exists:
-            raise ValueError(f"Insight with ID {insight_id} not found")
+        @firestore.transactional
+        def delete_in_transaction(transaction):
+            # Read inside the transaction so concurrent deletes can't decrement twice
+            doc = doc_ref.get(transaction=transaction)
+            if not doc.exists:
+                raise ValueError(f"Insight with ID {insight_id} not found")
+            
+            transaction.delete(doc_ref)
+            data = doc.to_dict()
+            ReportAggregatesService.apply_insight(transaction, data, sign=-1)
+            ClusterAssignmentService.remove(transaction, data, cluster_state)
         
-        doc_ref.delete()
+        delete_in_transaction(db.transaction())
+        ReportCacheService.bump_generation()
         return None
@@ -0,0 +1,140 @@
+"""
+Compiled column-mapping projection
+Resolves a {system_field: user_column} mapping once and projects stored rows
+into columns, so analytics can read mapped fields without a dict per row
+"""
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+_MISSING = object()
+
+
+class MappingProjection:
+    """
+    A mapping resolved into column slots.
+    System fields mapped to the same user column share one slot, so each user
+    column is read once per row.
+    """
+
+    def __init__(self, mappings: Dict[str, str]):
+        self.fields: List[str] = list(mappings)
+        self.sources: List[str] = []
+        slots = {}
+        self.slot_of: Dict[str, int] = {}
+        for system_field, user_column in mappings.items():
+            if user_column not in slots:
+                slots[user_column] = len(self.sources)
+                self.sources.append(user_column)
+            self.slot_of[system_field] = slots[user_column]
+
+    def project(self, chunks: Iterable[List[Dict[str, Any]]]) -> 'MappedTable':
+        """Columns for every row of every chunk, plus the stored row ids"""
+        columns = [[] for _ in self.sources]
+        ids = []
+        for rows in chunks:
+            for slot, user_column in enumerate(self.sources):
+                columns[slot].extend([row.get(user_column) for row in rows])
+            ids.extend([row.get('id', _MISSING) for row in rows])
+        return MappedTable(self, columns, ids)
+
+
+class MappedTable(Sequence):
+    """
+    Mapped rows stored as columns.
+    Indexing yields MappedRow views that behave like the dicts
+    DynamicDataService._map_row builds; column() hands engines a whole field.
+    """
+
+    def __init__(self, projection: MappingProjection, columns: List[List[Any]], ids: List[Any]):
+        self.projection = projection
+        self.columns = columns
+        self.ids = ids
+
+    @property
+    def fields(self) -> List[str]:
+        return self.projection.fields
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.take(range(len(self.ids))[index])
+        if index < 0:
+            index += len(self.ids)
+        if not 0 <= index < len(self.ids):
+            raise IndexError('MappedTable index out of range')
+        return MappedRow(self, index)
+
+    def __iter__(self) -> Iterator['MappedRow']:
+        for index in range(len(self.ids)):
+            yield MappedRow(self, index)
+
+    def column(self, field: str, default: Any = None) -> List[Any]:
+        """Values of one field, matching [row.get(field, default) for row in rows]"""
+        if field == 'id':
+            if 'id' in self.projection.slot_of:
+                mapped = self.columns[self.projection.slot_of['id']]
+                return [mapped[i] if value is _MISSING else value for i, value in enumerate(self.ids)]
+            return [default if value is _MISSING else value for value in self.ids]
+        slot = self.projection.slot_of.get(field)
+        if slot is None:
+            return [default] * len(self.ids)
+        return self.columns[slot]
+
+    def take(self, index: Iterable[int]) -> 'MappedTable':
+        """Rows at the given positions, as a new table"""
+        index = list(index)
+        return MappedTable(
+            self.projection,
+            [[column[i] for i in index] for column in self.columns],
+            [self.ids[i] for i in index]
+        )
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Plain dict rows (same keys and values as DynamicDataService._map_row)"""
+        return [dict(row) for row in self]
+
+
+class MappedRow(Mapping):
+    """Read-only view of one row of a MappedTable"""
+
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table: MappedTable, index: int):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, key: str) -> Any:
+        table = self._table
+        if key == 'id':
+            value = table.ids[self._index]
+            if value is not _MISSING:
+                return value
+        slot = table.projection.slot_of.get(key)
+        if slot is None:
+            raise KeyError(key)
+        return table.columns[slot][self._index]
+
+    def get(self, key: str, default: Optional[Any] = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: object) -> bool:
+        if key == 'id' and self._table.ids[self._index] is not _MISSING:
+            return True
+        return key in self._table.projection.slot_of
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._table.projection.fields
+        if 'id' not in self._table.projection.slot_of and self._table.ids[self._index] is not _MISSING:
+            yield 'id'
+
+    def __len__(self) -> int:
+        extra = 'id' not in self._table.projection.slot_of and self._table.ids[self._index] is not _MISSING
+        return len(self._table.projection.fields) + int(extra)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
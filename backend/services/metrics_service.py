@@ -0,0 +1,57 @@
+"""
+In-process metrics registry (counters and timings)
+Values are per instance and reset on restart
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any
+
+
+class MetricsService:
+    """Thread-safe counters and timing summaries exposed via /api/admin/metrics"""
+
+    _lock = threading.Lock()
+    _counters: Dict[str, int] = {}
+    _timings: Dict[str, Dict[str, float]] = {}
+
+    @staticmethod
+    def increment(name: str, value: int = 1) -> None:
+        with MetricsService._lock:
+            MetricsService._counters[name] = MetricsService._counters.get(name, 0) + value
+
+    @staticmethod
+    def observe(name: str, seconds: float) -> None:
+        """Record one duration sample"""
+        with MetricsService._lock:
+            timing = MetricsService._timings.setdefault(
+                name, {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'last_seconds': 0.0}
+            )
+            timing['count'] += 1
+            timing['total_seconds'] += seconds
+            timing['max_seconds'] = max(timing['max_seconds'], seconds)
+            timing['last_seconds'] = seconds
+
+    @staticmethod
+    @contextmanager
+    def timer(name: str):
+        """Context manager that records the wall-clock duration of its block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            MetricsService.observe(name, time.perf_counter() - started)
+
+    @staticmethod
+    def snapshot() -> Dict[str, Any]:
+        with MetricsService._lock:
+            timings = {}
+            for name, timing in MetricsService._timings.items():
+                timings[name] = {
+                    **timing,
+                    'avg_seconds': timing['total_seconds'] / timing['count'] if timing['count'] else 0.0
+                }
+            return {
+                'counters': dict(MetricsService._counters),
+                'timings': timings
+            }
@@ -2,10 +2,15 @@
 Persona Generation Service
 Orchestrates the complete persona generation workflow
 """
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable
 from datetime import datetime, timezone
 from firebase_client import db
+from config import settings
 import services.clustering_service as clustering
+from services.bulk_writer_service import BulkWriter, delete_collection
+from services.cluster_assignment_service import ClusterAssignmentService
+from services.cluster_summary_service import summarize
+from services.settings_snapshot_service import SettingsSnapshotService
 import random
 
 # Beauty-themed persona images (VERIFIED female portraits only - NO male, NO products)
@@ -203,12 +208,20 @@ def generate_summary_description(persona_profile: Dict[str, Any], wts_data: Dict
     return ". ".join(parts) + "."
 
 
-def generate_personas_from_insights(n_clusters: int = 3) -> Dict[str, Any]:
+class GenerationCancelled(Exception):
+    """Raised by a progress callback to stop generation at a checkpoint"""
+
+
+def generate_personas_from_insights(
+    n_clusters: Optional[int] = 3,
+    progress: Optional[Callable[..., None]] = None,
+    settings_snapshot: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
     """
     Complete persona generation workflow
     
     Steps:
-    1. Build vectors with platform multipliers
+    1. Build name-aligned sparse vectors with platform multipliers
     2. Run K-Means clustering
     3. Assign cluster_ids to insights
     4. Compute cluster summaries
@@ -218,20 +231,34 @@ def generate_personas_from_insights(n_clusters: int = 3) -> Dict[str, Any]:
     8. Save personas to Firestore
     
     Args:
-        n_clusters: Number of clusters/personas to create
+        n_clusters: Number of clusters/personas to create; None picks k automatically
+        progress: Optional callback(state, progress, message, cancellable=True)
+                  called at each stage; it may raise GenerationCancelled while
+                  cancellable is True (i.e. before any Firestore writes)
+        settings_snapshot: Settings used for the whole run (defaults to the
+                           current SettingsSnapshotService snapshot)
     
     Returns:
         Generation result with statistics
     """
+    if progress is None:
+        progress = lambda *args, **kwargs: None
+    
+    # One consistent view of the settings for the whole run
+    if settings_snapshot is None:
+        settings_snapshot = SettingsSnapshotService.get_snapshot()
+    
     try:
         # Step 1: Fetch all insights
+        progress('encoding', 0.0, 'Loading insights')
         insights_ref = db.collection('insights')
         insights_docs = list(insights_ref.stream())
         
-        if len(insights_docs) < n_clusters:
+        min_insights = n_clusters if n_clusters is not None else settings.CLUSTERING_K_MIN + 1
+        if len(insights_docs) < min_insights:
             return {
                 'success': False,
-                'message': f'Need at least {n_clusters} insights to generate {n_clusters} personas. Currently have {len(insights_docs)} insights.',
+                'message': f'Need at least {min_insights} insights to generate personas. Currently have {len(insights_docs)} insights.',
                 'personas_created': 0
             }
         
@@ -245,64 +272,69 @@ def generate_personas_from_insights(n_clusters: int = 3) -> Dict[str, Any]:
         print(f"Processing {len(insights)} insights...")
         
         # Step 2 & 3: Perform clustering
+        progress('clustering', 0.2, f'Clustering {len(insights)} insights')
         clustering_result = clustering.perform_clustering(insights, n_clusters)
+        n_clusters = clustering_result['n_clusters']
         
-        # Step 4: Update insights with cluster_id and vector
-        batch = db.batch()
-        for insight_id, assignment in clustering_result['assignments'].items():
-            insight_ref = insights_ref.document(insight_id)
-            batch.update(insight_ref, {
-                'cluster_id': assignment['cluster_id'],
-                'vector': assignment['vector']
-            })
-        batch.commit()
-        print(f"Updated {len(clustering_result['assignments'])} insights with cluster assignments")
+        # Last cancellation point: everything below replaces stored data
+        progress('writing', 0.6, 'Writing cluster assignments')
+        
+        # Step 4: Update insights with cluster_id and vector (only where they changed)
+        insights_by_id = {insight['id']: insight for insight in insights}
+        with BulkWriter() as writer:
+            for insight_id, assignment in clustering_result['assignments'].items():
+                previous = insights_by_id[insight_id]
+                if previous.get('cluster_id') == assignment['cluster_id'] and previous.get('vector') == assignment['vector']:
+                    writer.skip()
+                    continue
+                writer.update(insights_ref.document(insight_id), {
+                    'cluster_id': assignment['cluster_id'],
+                    'vector': assignment['vector']
+                })
+        print(f"Updated {writer.stats['operations']} insights with cluster assignments ({writer.stats['skipped']} unchanged)")
+        
+        # Centers and running stats used to place new insights incrementally
+        ClusterAssignmentService.save_state(ClusterAssignmentService.build_state(insights, clustering_result))
         
         # Step 5-8: Generate personas for each cluster
         personas_created = []
         existing_names = []
         personas_data = []  # For star persona selection
         
-        # Clear old personas
-        old_personas = db.collection('personas').stream()
-        for doc in old_personas:
-            doc.reference.delete()
+        # Clear old personas and clusters
+        with BulkWriter() as writer:
+            delete_collection(db.collection('personas'), writer)
+            delete_collection(db.collection('clusters'), writer)
         
-        # Clear old clusters
-        old_clusters = db.collection('clusters').stream()
-        for doc in old_clusters:
-            doc.reference.delete()
+        # Step 5-7 inputs: every cluster's summary, WTS and profile (grouped pass for large k)
+        cluster_results = summarize(insights, clustering_result['labels'], n_clusters)
+        threshold = settings_snapshot['persona_threshold']
         
         for cluster_idx in range(n_clusters):
             cluster_id = f"cluster_{cluster_idx}"
             
-            # Get insights for this cluster
-            cluster_insights = [
-                insight for insight in insights
-                if clustering_result['assignments'].get(insight['id'], {}).get('cluster_id') == cluster_id
-            ]
-            
-            if not cluster_insights:
+            if cluster_id not in cluster_results:
                 print(f"No insights for {cluster_id}, skipping...")
                 continue
             
-            print(f"Processing {cluster_id} with {len(cluster_insights)} insights...")
+            cluster_result = cluster_results[cluster_id]
+            print(f"Processing {cluster_id} with {cluster_result['insight_count']} insights...")
+            progress('writing', 0.7 + 0.3 * cluster_idx / n_clusters, f'Building persona for {cluster_id}', cancellable=False)
             
-            # Step 5: Compute cluster summary
-            cluster_summary = clustering.compute_cluster_summary(cluster_insights, cluster_id)
+            # Step 5: Cluster summary
+            cluster_summary = cluster_result['summary']
             
-            # Step 6: Compute WTS classification and TCSS
-            wts_data = clustering.compute_wts_classification(cluster_summary, cluster_insights)
+            # Step 6: WTS classification and TCSS
+            wts_data = cluster_result['wts']
             tcss = wts_data['tcss']
             
             # Check TCSS threshold - skip persona creation if below threshold
-            threshold = clustering.get_persona_threshold()
             if tcss < threshold:
                 print(f"Cluster {cluster_id} TCSS ({tcss:.2f}) below threshold ({threshold:.2f}), skipping persona creation")
                 continue
             
-            # Step 7: Paint persona profile (frequency-based)
-            persona_profile = clustering.paint_persona_profile(cluster_insights)
+            # Step 7: Persona profile (frequency-based)
+            persona_profile = cluster_result['profile']
             
             # Step 8: Generate persona fields
             persona_name = generate_persona_name(persona_profile, wts_data['motivation_wts'])
@@ -385,7 +417,7 @@ def generate_personas_from_insights(n_clusters: int = 3) -> Dict[str, Any]:
                 
                 # Metadata
                 'created_at': datetime.now(timezone.utc).isoformat(),
-                'insight_count': len(cluster_insights),
+                'insight_count': cluster_result['insight_count'],
                 'avg_purchase_intent': float(wts_data['avg_purchase_intent']),
                 'avg_influencer_effect': float(wts_data['avg_influencer_effect']),
                 
@@ -397,6 +429,15 @@ def generate_personas_from_insights(n_clusters: int = 3) -> Dict[str, Any]:
             personas_data.append({
                 'cluster_id': cluster_id,
                 'data': persona_data,
+                'cluster_data': {
+                    'cluster_id': cluster_id,
+                    'center': clustering_result['centers'][cluster_id],
+                    'feature_vocabulary': clustering_result['vocabulary'],
+                    'summary': cluster_summary,
+                    'wts_classification': wts_data,
+                    'persona_profile': persona_profile,
+                    'created_at': datetime.now(timezone.utc).isoformat()
+                },
                 'tcss': tcss,
                 'wts_intent': wts_data['avg_purchase_intent'],
                 'wts_motivation_avg': sum(data['wts'] for data in wts_data['motivation_wts'].values()) / len(wts_data['motivation_wts']) if wts_data['motivation_wts'] else 0,
@@ -426,18 +467,10 @@ def generate_personas_from_insights(n_clusters: int = 3) -> Dict[str, Any]:
         for persona_info in personas_data:
             persona_ref = db.collection('personas').document(persona_info['cluster_id'])
             persona_ref.set(persona_info['data'])
-            personas_created.append(persona_name)
+            personas_created.append(persona_info['data']['name'])
             
-            # Save cluster summary
-            cluster_data = {
-                'cluster_id': cluster_id,
-                'center': clustering_result['centers'][cluster_id],
-                'summary': cluster_summary,
-                'wts_classification': wts_data,
-                'persona_profile': persona_profile,
-                'created_at': datetime.now(timezone.utc).isoformat()
-            }
-            db.collection('clusters').document(cluster_id).set(cluster_data)
+            # Save cluster summary (center is aligned with feature_vocabulary)
+            db.collection('clusters').document(persona_info['cluster_id']).set(persona_info['cluster_data'])
         
         return {
             'success': True,
@@ -445,9 +478,12 @@ def generate_personas_from_insights(n_clusters: int = 3) -> Dict[str, Any]:
             'personas_created': len(personas_created),
             'persona_names': personas_created,
             'insights_processed': len(insights),
-            'clusters_created': n_clusters
+            'clusters_created': n_clusters,
+            'k_selection': clustering_result['k_selection']
         }
         
+    except GenerationCancelled:
+        raise
     except Exception as e:
         print(f"Error in persona generation: {str(e)}")
         import traceback
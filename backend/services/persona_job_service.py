@@ -0,0 +1,299 @@
+"""
+Background persona generation jobs
+Runs generate_personas_from_insights off the request thread and persists its progress
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Any, Dict, Optional
+from firebase_client import db
+from firebase_admin import firestore
+from config import settings
+from services.settings_snapshot_service import SettingsSnapshotService
+
+JOBS_COLLECTION = 'persona_jobs'
+LOCK_DOC_PATH = 'locks/persona_generation'
+
+# Job states, in the order a successful run passes through them
+QUEUED = 'queued'
+ENCODING = 'encoding'
+CLUSTERING = 'clustering'
+WRITING = 'writing'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+TERMINAL_STATES = (DONE, FAILED, CANCELLED)
+
+
+class PersonaJobConflict(Exception):
+    """Another persona generation is already running"""
+
+    def __init__(self, job_id: str):
+        super().__init__(f"Persona generation job {job_id} is already running")
+        self.job_id = job_id
+
+
+class PersonaJobLockLost(Exception):
+    """The job's lease lapsed and the lock is gone or held by another job"""
+
+    def __init__(self, job_id: str):
+        super().__init__(f"Persona generation job {job_id} lost its lock; stopping")
+        self.job_id = job_id
+
+
+class LeaseHeartbeat:
+    """
+    Renews a job's lease every PERSONA_JOB_HEARTBEAT_SECONDS from a side thread,
+    so stages without progress calls (the clustering sweep) keep the lock.
+    A lost lock is remembered and raised by check() at the next checkpoint.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.lost: Optional[PersonaJobLockLost] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._beat, name=f"persona-lease-{job_id}", daemon=True)
+
+    def _beat(self) -> None:
+        while not self._stop.wait(max(1, settings.PERSONA_JOB_HEARTBEAT_SECONDS)):
+            try:
+                PersonaJobService._renew_lock(self.job_id)
+            except PersonaJobLockLost as e:
+                self.lost = e
+                return
+            except Exception as e:
+                # Transient Firestore errors: the next beat (or checkpoint) retries
+                print(f"Error renewing persona job {self.job_id} lease: {e}")
+
+    def start(self) -> 'LeaseHeartbeat':
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def check(self) -> None:
+        if self.lost is not None:
+            raise self.lost
+
+
+class PersonaJobService:
+    """
+    Single-run persona generation with a persisted state machine.
+
+    - the lock doc holds the running job_id and a lease, renewed in a
+      transaction that checks the job still owns it, at every progress update
+      and on a heartbeat in between; a job that loses its lock stops at its
+      next checkpoint instead of writing alongside the new owner
+    - a job whose lease lapsed (its instance died or was throttled) is marked
+      failed when another job takes the lock over or when it is polled
+    - cancellation is cooperative: it is honoured at stage boundaries until
+      old personas start being replaced
+    """
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc)
+
+    @staticmethod
+    def _lease_expiry() -> datetime:
+        return PersonaJobService._now() + timedelta(seconds=settings.PERSONA_JOB_LOCK_TTL_SECONDS)
+
+    @staticmethod
+    def _abandoned(transaction, job_snapshot) -> None:
+        """Stage a failed state for a job whose worker stopped renewing its lease"""
+        transaction.update(job_snapshot.reference, {
+            'state': FAILED,
+            'message': 'Job stopped renewing its lock (worker instance stopped or throttled)',
+            'error': 'Lock lease expired',
+            'updated_at': PersonaJobService._now().isoformat()
+        })
+
+    @staticmethod
+    def _acquire_lock(job_id: str) -> None:
+        lock_ref = db.document(LOCK_DOC_PATH)
+        jobs_ref = db.collection(JOBS_COLLECTION)
+
+        @firestore.transactional
+        def acquire(transaction):
+            lock = lock_ref.get(transaction=transaction)
+            previous = None
+            if lock.exists:
+                data = lock.to_dict()
+                expires_at = data.get('expires_at')
+                if data.get('job_id') and expires_at and expires_at > PersonaJobService._now():
+                    raise PersonaJobConflict(data['job_id'])
+                if data.get('job_id'):
+                    previous = jobs_ref.document(data['job_id']).get(transaction=transaction)
+            # Taking over an expired lease: the previous job is never finishing
+            if previous is not None and previous.exists and previous.to_dict().get('state') not in TERMINAL_STATES:
+                PersonaJobService._abandoned(transaction, previous)
+            transaction.set(lock_ref, {'job_id': job_id, 'expires_at': PersonaJobService._lease_expiry()})
+
+        acquire(db.transaction())
+
+    @staticmethod
+    def _renew_lock(job_id: str) -> None:
+        """Extend the lease; raises PersonaJobLockLost if another job (or nobody) holds the lock"""
+        lock_ref = db.document(LOCK_DOC_PATH)
+
+        @firestore.transactional
+        def renew(transaction):
+            lock = lock_ref.get(transaction=transaction)
+            if not lock.exists or lock.to_dict().get('job_id') != job_id:
+                raise PersonaJobLockLost(job_id)
+            transaction.update(lock_ref, {'expires_at': PersonaJobService._lease_expiry()})
+
+        renew(db.transaction())
+
+    @staticmethod
+    def _release_lock(job_id: str) -> None:
+        lock_ref = db.document(LOCK_DOC_PATH)
+
+        @firestore.transactional
+        def release(transaction):
+            lock = lock_ref.get(transaction=transaction)
+            if lock.exists and lock.to_dict().get('job_id') == job_id:
+                transaction.delete(lock_ref)
+
+        release(db.transaction())
+
+    @staticmethod
+    def _update(job_id: str, updates: Dict[str, Any]) -> None:
+        updates['updated_at'] = PersonaJobService._now().isoformat()
+        db.collection(JOBS_COLLECTION).document(job_id).update(updates)
+
+    @staticmethod
+    def _progress_callback(job_id: str, heartbeat: LeaseHeartbeat):
+        """Persist stage changes, renew the lock lease and surface cancellation or a lost lock"""
+        from services.persona_generation_service import GenerationCancelled
+
+        def report(state: str, progress: float, message: str = '', cancellable: bool = True) -> None:
+            # A lost lock stops the run at any checkpoint, writing stages included
+            heartbeat.check()
+            PersonaJobService._renew_lock(job_id)
+            job = db.collection(JOBS_COLLECTION).document(job_id).get().to_dict() or {}
+            if cancellable and job.get('cancel_requested'):
+                raise GenerationCancelled()
+            PersonaJobService._update(job_id, {'state': state, 'progress': round(progress, 3), 'message': message})
+
+        return report
+
+    @staticmethod
+    def _run(job_id: str, n_clusters: Optional[int], settings_snapshot: Dict[str, Any]) -> None:
+        from services.persona_generation_service import generate_personas_from_insights, GenerationCancelled
+
+        heartbeat = LeaseHeartbeat(job_id).start()
+        try:
+            result = generate_personas_from_insights(
+                n_clusters=n_clusters,
+                progress=PersonaJobService._progress_callback(job_id, heartbeat),
+                settings_snapshot=settings_snapshot
+            )
+            PersonaJobService._update(job_id, {
+                'state': DONE if result['success'] else FAILED,
+                'progress': 1.0,
+                'message': result['message'],
+                'result': result,
+                'error': None if result['success'] else result['message']
+            })
+        except PersonaJobLockLost as e:
+            print(f"Persona job {job_id} aborted: {str(e)}")
+            PersonaJobService._update(job_id, {'state': FAILED, 'message': str(e), 'error': str(e)})
+        except GenerationCancelled:
+            PersonaJobService._update(job_id, {'state': CANCELLED, 'message': 'Cancelled before personas were replaced'})
+        except Exception as e:
+            print(f"Persona job {job_id} failed: {str(e)}")
+            PersonaJobService._update(job_id, {'state': FAILED, 'message': str(e), 'error': str(e)})
+        finally:
+            heartbeat.stop()
+            PersonaJobService._release_lock(job_id)
+
+    @staticmethod
+    def start_job(n_clusters: Optional[int] = None, requested_by: Optional[str] = None, background: bool = True) -> Dict[str, Any]:
+        """
+        Create a job and run it (in a daemon thread unless background=False).
+        Raises PersonaJobConflict if a generation is already running.
+        """
+        job_id = uuid.uuid4().hex
+        PersonaJobService._acquire_lock(job_id)
+
+        try:
+            # Settings are fixed at job start; later edits apply to the next run
+            settings_snapshot = SettingsSnapshotService.get_snapshot()
+            now = PersonaJobService._now().isoformat()
+            job = {
+                'job_id': job_id,
+                'state': QUEUED,
+                'progress': 0.0,
+                'message': '',
+                'n_clusters': n_clusters,
+                'requested_by': requested_by,
+                'persona_threshold': settings_snapshot['persona_threshold'],
+                'cancel_requested': False,
+                'result': None,
+                'error': None,
+                'created_at': now,
+                'updated_at': now
+            }
+            db.collection(JOBS_COLLECTION).document(job_id).set(job)
+        except Exception:
+            PersonaJobService._release_lock(job_id)
+            raise
+
+        if not background:
+            PersonaJobService._run(job_id, n_clusters, settings_snapshot)
+            return PersonaJobService.get_job(job_id)
+
+        threading.Thread(
+            target=PersonaJobService._run,
+            args=(job_id, n_clusters, settings_snapshot),
+            name=f"persona-job-{job_id}",
+            daemon=True
+        ).start()
+        return job
+
+    @staticmethod
+    def _fail_if_abandoned(job_id: str) -> None:
+        """Mark a non-terminal job failed once its lease lapsed or another job holds the lock"""
+        job_ref = db.collection(JOBS_COLLECTION).document(job_id)
+        lock_ref = db.document(LOCK_DOC_PATH)
+
+        @firestore.transactional
+        def check(transaction):
+            job = job_ref.get(transaction=transaction)
+            lock = lock_ref.get(transaction=transaction)
+            if not job.exists or job.to_dict().get('state') in TERMINAL_STATES:
+                return
+            data = lock.to_dict() if lock.exists else {}
+            expires_at = data.get('expires_at')
+            if data.get('job_id') != job_id or not expires_at or expires_at <= PersonaJobService._now():
+                PersonaJobService._abandoned(transaction, job)
+
+        check(db.transaction())
+
+    @staticmethod
+    def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+        doc = db.collection(JOBS_COLLECTION).document(job_id).get()
+        if not doc.exists:
+            return None
+        job = doc.to_dict()
+        if job.get('state') not in TERMINAL_STATES:
+            PersonaJobService._fail_if_abandoned(job_id)
+            job = db.collection(JOBS_COLLECTION).document(job_id).get().to_dict()
+        return job
+
+    @staticmethod
+    def cancel_job(job_id: str) -> Dict[str, Any]:
+        """Request cancellation; the worker stops at its next checkpoint"""
+        job = PersonaJobService.get_job(job_id)
+        if job is None:
+            raise ValueError(f"Persona job {job_id} not found")
+        if job['state'] not in TERMINAL_STATES:
+            PersonaJobService._update(job_id, {'cancel_requested': True})
+            job = PersonaJobService.get_job(job_id)
+        return job
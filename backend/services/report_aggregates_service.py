@@ -0,0 +1,276 @@
+"""
+Service for incrementally maintained report aggregates
+Keeps running totals in a single document so the report never scans every insight
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from firebase_client import db
+from firebase_admin import firestore
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+from array_utils import sequential_sum
+from counter_utils import add_nested, to_increments
+import services.insight_matrix_service as insight_matrix
+from services.insight_matrix_service import InsightMatrix
+from services.scoring_service import ScoringService
+
+
+class ReportAggregatesService:
+    """Maintains per-name sums, counts and histograms for the Report page"""
+
+    AGGREGATES_DOC_PATH = "aggregates/insights_report"
+
+    # Demographic field on the insight -> key in the 'demographics' map
+    DEMOGRAPHIC_FIELDS = {
+        'age_group': 'age_groups',
+        'gender': 'genders',
+        'skin_type': 'skin_types',
+        'skin_tone': 'skin_tones',
+        'lifestyle': 'lifestyles'
+    }
+
+    # List field on the insight -> counts map in the aggregates doc
+    LIST_COUNT_FIELDS = {
+        'behaviours': 'behaviour_counts',
+        'channels': 'channel_counts',
+        'products': 'product_counts'
+    }
+
+    @staticmethod
+    def _key(value: Any, default: str = 'Unknown') -> str:
+        """Firestore map keys must be non-empty strings"""
+        key = str(value) if value is not None else ''
+        return key if key else default
+
+    @staticmethod
+    def _bucket(value: int) -> str:
+        """Same 20-point buckets the report has always used"""
+        return f"{(value // 20) * 20}-{((value // 20) + 1) * 20}"
+
+    @staticmethod
+    def compute_deltas(data: Dict[str, Any], sign: int = 1) -> Dict[str, Any]:
+        """
+        Contribution of one insight to the aggregates.
+        Strengths are summed as raw 0-100 integers so increments stay exact;
+        the /20 normalisation is applied when the report is read.
+
+        Args:
+            data: Insight document data
+            sign: +1 when the insight is created, -1 when it is deleted
+        """
+        key = ReportAggregatesService._key
+        intent = data.get('purchase_intent', 0)
+        influence = data.get('influencer_effect', 0)
+
+        deltas = {
+            'total_insights': sign,
+            'purchase_intent_sum': sign * intent,
+            'influencer_effect_sum': sign * influence,
+            'intent_distribution': {ReportAggregatesService._bucket(intent): sign},
+            'influence_distribution': {ReportAggregatesService._bucket(influence): sign},
+            'platform_counts': {key(data.get('platform', 'Other'), 'Other'): sign},
+            'motivations': {},
+            'pains': {},
+            'demographics': {}
+        }
+
+        for field, target in (('motivations', 'motivations'), ('pains', 'pains')):
+            for item in data.get(field, []):
+                add_nested(deltas[target], {
+                    key(item['name']): {'strength_sum': sign * item['strength'], 'count': sign}
+                })
+
+        for field, target in ReportAggregatesService.LIST_COUNT_FIELDS.items():
+            counts = deltas.setdefault(target, {})
+            for value in data.get(field, []):
+                counts[key(value)] = counts.get(key(value), 0) + sign
+
+        for field, target in ReportAggregatesService.DEMOGRAPHIC_FIELDS.items():
+            deltas['demographics'][target] = {key(data.get(field, 'Unknown')): sign}
+
+        # Drop empty maps so merge writes don't create stray fields
+        return {k: v for k, v in deltas.items() if v != {}}
+
+    @staticmethod
+    def apply_insight(writer, data: Dict[str, Any], sign: int = 1) -> None:
+        """
+        Stage an aggregate update on a WriteBatch or Transaction so it commits
+        atomically with the insight write/delete.
+        """
+        deltas = ReportAggregatesService.compute_deltas(data, sign)
+        increments = to_increments(deltas)
+        increments['updated_at'] = firestore.SERVER_TIMESTAMP
+        writer.set(db.document(ReportAggregatesService.AGGREGATES_DOC_PATH), increments, merge=True)
+
+    @staticmethod
+    def _number(value: float) -> Any:
+        """Integral sums back to int, as the per-insight increments produce them"""
+        return int(value) if float(value).is_integer() else value
+
+    @staticmethod
+    def compute_from_matrix(matrix: InsightMatrix) -> Dict[str, Any]:
+        """
+        Build aggregates from scratch with vectorized per-name sums, equal to
+        adding up compute_deltas of every insight. Raw names are mapped through
+        _key afterwards, so names that share a key are merged.
+        """
+        key = ReportAggregatesService._key
+        number = ReportAggregatesService._number
+        aggregates: Dict[str, Any] = {'total_insights': matrix.n}
+        if matrix.n == 0:
+            return aggregates
+
+        def counts(names: List[Any], values, default: str = 'Unknown') -> Dict[str, Any]:
+            merged: Dict[str, Any] = {}
+            for name, value in zip(names, values):
+                if value:
+                    merged[key(name, default)] = merged.get(key(name, default), 0) + value
+            return merged
+
+        aggregates['purchase_intent_sum'] = number(sequential_sum(matrix.purchase_intent))
+        aggregates['influencer_effect_sum'] = number(sequential_sum(matrix.influencer_effect))
+        aggregates['intent_distribution'] = insight_matrix.bucket_histogram(matrix.purchase_intent)
+        aggregates['influence_distribution'] = insight_matrix.bucket_histogram(matrix.influencer_effect)
+        aggregates['platform_counts'] = counts(matrix.platform.names, matrix.platform.counts().tolist(), 'Other')
+
+        for field in ('motivations', 'pains'):
+            column = getattr(matrix, field)
+            merged: Dict[str, Any] = {}
+            strength_sums = column.sums(column.values).tolist()
+            for name, strength_sum, count in zip(column.names, strength_sums, column.counts().tolist()):
+                stats = merged.setdefault(key(name), {'strength_sum': 0, 'count': 0})
+                stats['strength_sum'] = number(stats['strength_sum'] + strength_sum)
+                stats['count'] += count
+            if merged:
+                aggregates[field] = merged
+
+        for field, target in ReportAggregatesService.LIST_COUNT_FIELDS.items():
+            column = matrix.lists[field]
+            merged = counts(column.names, column.counts().tolist())
+            if merged:
+                aggregates[target] = merged
+
+        aggregates['demographics'] = {
+            target: counts(matrix.demographics[field].names, matrix.demographics[field].counts().tolist())
+            for field, target in ReportAggregatesService.DEMOGRAPHIC_FIELDS.items()
+        }
+        return aggregates
+
+    @staticmethod
+    def compute_from_insights(insight_dicts) -> Dict[str, Any]:
+        """Build aggregates from scratch from an iterable of insight dicts"""
+        return ReportAggregatesService.compute_from_matrix(InsightMatrix.from_insights(insight_dicts))
+
+    @staticmethod
+    def _scan_insights() -> Dict[str, Any]:
+        return ReportAggregatesService.compute_from_matrix(ScoringService.load_matrix())
+
+    @staticmethod
+    def get_aggregates() -> Optional[Dict[str, Any]]:
+        """Read the aggregates document (one read), or None if it doesn't exist"""
+        doc = db.document(ReportAggregatesService.AGGREGATES_DOC_PATH).get()
+        if not doc.exists:
+            return None
+        return doc.to_dict()
+
+    @staticmethod
+    def rebuild() -> Dict[str, Any]:
+        """
+        Recompute aggregates with a full scan and overwrite the stored document.
+        Run while no insights are being written, otherwise concurrent increments may be lost.
+        """
+        aggregates = ReportAggregatesService._scan_insights()
+        aggregates['rebuilt_at'] = datetime.now(timezone.utc).isoformat()
+        db.document(ReportAggregatesService.AGGREGATES_DOC_PATH).set(aggregates)
+        return aggregates
+
+    @staticmethod
+    def _prune(value: Any) -> Any:
+        """Drop zero counters and empty maps left behind by deletes"""
+        if isinstance(value, dict):
+            pruned = {k: ReportAggregatesService._prune(v) for k, v in value.items()}
+            return {k: v for k, v in pruned.items() if v not in (0, {})}
+        return value
+
+    @staticmethod
+    def _diff(expected: Any, actual: Any, path: str, mismatches: List[Dict[str, Any]]) -> None:
+        if isinstance(expected, dict) and isinstance(actual, dict):
+            for key in sorted(set(expected) | set(actual)):
+                ReportAggregatesService._diff(
+                    expected.get(key, 0), actual.get(key, 0),
+                    f"{path}.{key}" if path else key, mismatches
+                )
+        elif expected != actual:
+            mismatches.append({'field': path, 'expected': expected, 'stored': actual})
+
+    @staticmethod
+    def verify() -> Dict[str, Any]:
+        """Compare stored aggregates against a full scan and report drift"""
+        expected = ReportAggregatesService._prune(ReportAggregatesService._scan_insights())
+        stored = ReportAggregatesService.get_aggregates() or {}
+        stored = ReportAggregatesService._prune({
+            k: v for k, v in stored.items() if k not in ('updated_at', 'rebuilt_at')
+        })
+
+        mismatches: List[Dict[str, Any]] = []
+        ReportAggregatesService._diff(expected, stored, '', mismatches)
+        return {
+            'in_sync': not mismatches,
+            'total_insights': expected.get('total_insights', 0),
+            'mismatches': mismatches
+        }
+
+    @staticmethod
+    def to_raw_scores(aggregates: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Format aggregates in the same shape as ScoringService.compute_raw_scores
+        """
+        aggregates = ReportAggregatesService._prune(aggregates)
+        total = aggregates.get('total_insights', 0)
+        if total <= 0:
+            return {}
+
+        def top_scores(items: Dict[str, Any]):
+            scored = [
+                (name, {"score": round(stats.get('strength_sum', 0) / 20.0, 2)})
+                for name, stats in items.items()
+                if stats.get('count', 0) > 0
+            ]
+            # Ties broken by name so the order is stable across reads
+            scored.sort(key=lambda x: (-x[1]['score'], x[0]))
+            return scored[:10]
+
+        demographics = aggregates.get('demographics', {})
+        return {
+            'total_insights': total,
+            'top_motivations': top_scores(aggregates.get('motivations', {})),
+            'top_pains': top_scores(aggregates.get('pains', {})),
+            'demographics': {
+                target: dict(demographics.get(target, {}))
+                for target in ReportAggregatesService.DEMOGRAPHIC_FIELDS.values()
+            },
+            'behaviour_counts': dict(aggregates.get('behaviour_counts', {})),
+            'channel_counts': dict(aggregates.get('channel_counts', {})),
+            'product_counts': dict(aggregates.get('product_counts', {})),
+            'platform_counts': dict(aggregates.get('platform_counts', {})),
+            'avg_purchase_intent': round(aggregates.get('purchase_intent_sum', 0) / total, 1),
+            'avg_influencer_effect': round(aggregates.get('influencer_effect_sum', 0) / total, 1),
+            'intent_distribution': dict(aggregates.get('intent_distribution', {})),
+            'influence_distribution': dict(aggregates.get('influence_distribution', {}))
+        }
+
+    @staticmethod
+    def get_raw_scores() -> Dict[str, Any]:
+        """
+        Raw report scores from the aggregates document.
+        Until it has been rebuilt (CLI or admin endpoint) the scores come from a full
+        scan; the read path never writes the document, so no increments are lost.
+        """
+        aggregates = ReportAggregatesService.get_aggregates()
+        if aggregates is None or 'rebuilt_at' not in aggregates:
+            # Increments alone (no rebuilt_at) would miss insights created before the document existed
+            print("Report aggregates not rebuilt yet, scanning insights...")
+            aggregates = ReportAggregatesService._scan_insights()
+        return ReportAggregatesService.to_raw_scores(aggregates)
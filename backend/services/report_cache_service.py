@@ -0,0 +1,81 @@
+"""
+Read-through cache for the aggregated report
+Entries are keyed on an insights generation counter that every insight write bumps
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+from config import settings
+from services.metrics_service import MetricsService
+
+
+class ReportCacheService:
+    """
+    Serves repeated report requests from memory.
+
+    - create/delete of an insight bumps the generation, invalidating the entry
+    - entries also expire after REPORT_CACHE_TTL_SECONDS so writes made on
+      other instances become visible
+    - concurrent misses for the same generation share one recomputation
+    """
+
+    _lock = threading.Lock()
+    _generation = 0
+    _entry: Optional[Dict[str, Any]] = None  # {'generation', 'expires_at', 'value'}
+    _inflight: Dict[int, Future] = {}
+
+    @staticmethod
+    def bump_generation() -> int:
+        """Invalidate the cached report after an insight write"""
+        with ReportCacheService._lock:
+            ReportCacheService._generation += 1
+            ReportCacheService._entry = None
+            return ReportCacheService._generation
+
+    @staticmethod
+    def get_or_compute(compute: Callable[[], Any]) -> Any:
+        """Return the cached report, or compute it once for all waiting callers"""
+        with ReportCacheService._lock:
+            generation = ReportCacheService._generation
+            entry = ReportCacheService._entry
+            if entry and entry['generation'] == generation and entry['expires_at'] > time.monotonic():
+                MetricsService.increment('report_cache.hits')
+                return entry['value']
+
+            future = ReportCacheService._inflight.get(generation)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                ReportCacheService._inflight[generation] = future
+
+        if not is_leader:
+            # Another request is already recomputing this generation
+            MetricsService.increment('report_cache.coalesced')
+            return future.result()
+
+        MetricsService.increment('report_cache.misses')
+        try:
+            with MetricsService.timer('report_cache.recompute'):
+                value = compute()
+        except Exception as e:
+            with ReportCacheService._lock:
+                ReportCacheService._inflight.pop(generation, None)
+            future.set_exception(e)
+            raise
+
+        with ReportCacheService._lock:
+            ReportCacheService._inflight.pop(generation, None)
+            # Only keep the result if no write happened while computing
+            if ReportCacheService._generation == generation:
+                ReportCacheService._entry = {
+                    'generation': generation,
+                    'expires_at': time.monotonic() + settings.REPORT_CACHE_TTL_SECONDS,
+                    'value': value
+                }
+        future.set_result(value)
+        return value
@@ -1,12 +1,19 @@
-from services.scoring_service import ScoringService
+from services.report_aggregates_service import ReportAggregatesService
+from services.report_cache_service import ReportCacheService
 from models import ReportResponse, MotivationScore, PainScore, DemographicBreakdown
 
 class ReportService:
     
     @staticmethod
     def generate_report() -> ReportResponse:
+        """Get the report, served from cache until an insight is created or deleted"""
+        return ReportCacheService.get_or_compute(ReportService.build_report)
+    
+    @staticmethod
+    def build_report() -> ReportResponse:
         """Generate comprehensive report from raw scoring data (no platform weights)"""
-        scoring_data = ScoringService.compute_raw_scores()
+        # One aggregates read instead of a full insights scan
+        scoring_data = ReportAggregatesService.get_raw_scores()
         
         if not scoring_data:
             # Return empty report
@@ -0,0 +1,99 @@
+"""
+Cached snapshot of app settings (persona threshold, module visibility, module order)
+Loaded together, without creating missing docs, and refreshed after a TTL or on update
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import copy
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from firebase_client import db
+from config import settings
+from services.metrics_service import MetricsService
+from services.module_settings_service import ModuleSettingsService
+from services.module_order_service import ModuleOrderService
+
+PERSONA_THRESHOLD_DOC_PATH = "settings/persona_threshold"
+DEFAULT_PERSONA_THRESHOLD = 2.0
+
+
+class SettingsSnapshotService:
+    """
+    One in-process snapshot of the settings docs.
+
+    - a snapshot is never mutated after it is built, so a generation run can
+      hold one for its whole duration and see consistent values
+    - missing docs fall back to defaults without being written
+    - PUT endpoints call invalidate(); other instances pick changes up after
+      SETTINGS_CACHE_TTL_SECONDS
+    """
+
+    _lock = threading.Lock()
+    _snapshot: Optional[Dict[str, Any]] = None
+    _expires_at = 0.0
+
+    @staticmethod
+    def _load() -> Dict[str, Any]:
+        def read(path: str) -> Optional[Dict[str, Any]]:
+            doc = db.document(path).get()
+            return doc.to_dict() if doc.exists else None
+
+        threshold_doc = read(PERSONA_THRESHOLD_DOC_PATH) or {}
+        module_settings = read(ModuleSettingsService.SETTINGS_DOC_PATH)
+        order_doc = read(ModuleOrderService.ORDER_DOC_PATH) or {}
+
+        return {
+            'persona_threshold': float(threshold_doc.get('minimum_tcss', DEFAULT_PERSONA_THRESHOLD)),
+            'module_settings': module_settings if module_settings is not None else ModuleSettingsService.DEFAULT_SETTINGS.copy(),
+            'module_order': order_doc.get('order', ModuleOrderService.DEFAULT_ORDER.copy()),
+            'loaded_at': datetime.now(timezone.utc).isoformat()
+        }
+
+    @staticmethod
+    def get_snapshot() -> Dict[str, Any]:
+        """Current snapshot; reloaded when the TTL expired or after invalidate()"""
+        with SettingsSnapshotService._lock:
+            if SettingsSnapshotService._snapshot is not None and SettingsSnapshotService._expires_at > time.monotonic():
+                MetricsService.increment('settings_cache.hits')
+                return SettingsSnapshotService._snapshot
+
+            MetricsService.increment('settings_cache.misses')
+            try:
+                snapshot = SettingsSnapshotService._load()
+            except Exception as e:
+                if SettingsSnapshotService._snapshot is None:
+                    raise
+                # Keep serving the last good snapshot if Firestore is unavailable
+                print(f"Error reloading settings snapshot, serving stale values: {e}")
+                return SettingsSnapshotService._snapshot
+
+            SettingsSnapshotService._snapshot = snapshot
+            SettingsSnapshotService._expires_at = time.monotonic() + settings.SETTINGS_CACHE_TTL_SECONDS
+            return snapshot
+
+    @staticmethod
+    def invalidate() -> None:
+        """Drop the cached snapshot after a settings write"""
+        with SettingsSnapshotService._lock:
+            SettingsSnapshotService._snapshot = None
+            SettingsSnapshotService._expires_at = 0.0
+
+    @staticmethod
+    def get_persona_threshold() -> float:
+        try:
+            return SettingsSnapshotService.get_snapshot()['persona_threshold']
+        except Exception as e:
+            print(f"Error getting persona threshold, using default: {e}")
+            return DEFAULT_PERSONA_THRESHOLD
+
+    @staticmethod
+    def get_module_settings() -> Dict[str, bool]:
+        return copy.deepcopy(SettingsSnapshotService.get_snapshot()['module_settings'])
+
+    @staticmethod
+    def get_module_order() -> List[str]:
+        return list(SettingsSnapshotService.get_snapshot()['module_order'])
@@ -3,8 +3,15 @@ Service for managing file metadata in Shared Folder module
 """
 from firebase_client import db
 from firebase_admin import firestore
+from google.api_core import exceptions as google_exceptions
 from datetime import datetime, timezone
 from typing import List, Dict, Any, Optional
+from services.shared_folder_service import SharedFolderService
+from services.folder_directory_service import FolderDirectoryService
+from services.file_search_index_service import FileSearchIndexService
+from services.shared_folder_analytics_service import SharedFolderAnalyticsService
+import base64
+import json
 import uuid
 
 
@@ -22,7 +29,10 @@ class SharedFilesService:
         uploader_user_id: str,
         uploader_name: str
     ) -> Dict[str, Any]:
-        """Create file metadata after frontend uploads to Firebase Storage"""
+        """
+        Create file metadata after frontend uploads to Firebase Storage
+        The folder's fileCount/totalSize and the analytics document are updated in the same transaction
+        """
         file_id = str(uuid.uuid4())
         file_data = {
             "id": file_id,
@@ -38,71 +48,130 @@ class SharedFilesService:
             "downloadCount": 0
         }
         
-        db.collection('sharedFiles').document(file_id).set(file_data)
+        file_ref = db.collection('sharedFiles').document(file_id)
+        folder_ref = db.collection('folders').document(folder_id)
+        
+        @firestore.transactional
+        def create_in_transaction(transaction):
+            # Files may point at a folder that doesn't exist; apply_file skips those
+            folder_doc = folder_ref.get(transaction=transaction)
+            transaction.set(file_ref, file_data)
+            SharedFolderService.apply_file(transaction, folder_doc, file_size, sign=1)
+            SharedFolderAnalyticsService.apply_file(transaction, file_data, sign=1)
+        
+        create_in_transaction(db.transaction())
+        FileSearchIndexService.add(file_data)
         return file_data
     
     @staticmethod
-    def get_all_files(
+    def encode_page_token(file_data: Dict[str, Any]) -> str:
+        """Opaque next-page token: the (uploadedAt, id) keyset cursor of the last file returned"""
+        cursor = json.dumps([file_data.get('uploadedAt'), file_data.get('id')])
+        return base64.urlsafe_b64encode(cursor.encode('utf-8')).decode('ascii')
+    
+    @staticmethod
+    def decode_page_token(page_token: str) -> List[str]:
+        """Inverse of encode_page_token; raises ValueError on a malformed token"""
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(page_token.encode('ascii')))
+        except Exception:
+            raise ValueError("Invalid page token")
+        if not (isinstance(cursor, list) and len(cursor) == 2 and all(isinstance(v, str) for v in cursor)):
+            raise ValueError("Invalid page token")
+        return cursor
+    
+    @staticmethod
+    def get_files_page(
         folder_id: Optional[str] = None,
         uploader_id: Optional[str] = None,
         file_type_filter: Optional[str] = None,
         limit: int = 100,
+        page_token: Optional[str] = None,
         requesting_user_id: str = None,
         is_superadmin: bool = False
-    ) -> List[Dict[str, Any]]:
-        """Get files with optional filters, respecting personal folder privacy"""
-        # Fetch all files first, then filter and sort in Python
-        # This avoids Firestore composite index requirements
-        all_files = []
+    ) -> Dict[str, Any]:
+        """
+        One page of files, newest first, respecting personal folder privacy.
+        Filters combine server-side and pages are read with start_after on
+        (uploadedAt, id), so a page costs about `limit` reads however many files
+        exist (composite indexes are declared in firestore.indexes.json).
+        Files hidden by personal-folder privacy are skipped and the next batch
+        is read until the page is full.
+        Returns {'files', 'next_page_token', 'limit'}; raises ValueError on a bad token.
+        """
+        cursor = SharedFilesService.decode_page_token(page_token) if page_token else None
         
-        try:
-            # Start with base query
-            query = db.collection('sharedFiles')
-            
-            # Apply filters one at a time to avoid composite index issues
-            if folder_id:
-                query = query.where('folderID', '==', folder_id)
-            elif uploader_id:
-                query = query.where('uploaderUserID', '==', uploader_id)
-            elif file_type_filter:
-                query = query.where('previewType', '==', file_type_filter)
+        # A personal folder that isn't the requester's can't yield anything
+        if folder_id and not is_superadmin:
+            owner = FolderDirectoryService.get_personal_owners({folder_id}).get(folder_id)
+            if owner is not None and owner != requesting_user_id:
+                return {'files': [], 'next_page_token': None, 'limit': limit}
+        
+        query = db.collection('sharedFiles')
+        if folder_id:
+            query = query.where('folderID', '==', folder_id)
+        if uploader_id:
+            query = query.where('uploaderUserID', '==', uploader_id)
+        if file_type_filter:
+            query = query.where('previewType', '==', file_type_filter)
+        query = query.order_by('uploadedAt', direction=firestore.Query.DESCENDING) \
+                     .order_by('id', direction=firestore.Query.DESCENDING)
+        
+        files = []
+        exhausted = False
+        while len(files) < limit:
+            batch_size = limit - len(files)
+            page_query = query.limit(batch_size)
+            if cursor:
+                page_query = page_query.start_after({'uploadedAt': cursor[0], 'id': cursor[1]})
+            docs = list(page_query.stream())
             
-            # Fetch without ordering (to avoid composite index requirement)
-            for doc in query.stream():
+            personal_folder_ids = FolderDirectoryService.get_personal_owners(
+                {doc.get('folderID') for doc in docs}
+            ) if not is_superadmin else {}
+            for doc in docs:
                 file_data = doc.to_dict()
                 file_data['id'] = doc.id
-                all_files.append(file_data)
-            
-            # Filter out files from personal folders that don't belong to user
-            # Get all folders to check which are personal
-            all_folders = list(db.collection('folders').stream())
-            personal_folder_ids = {}
-            for folder_doc in all_folders:
-                folder_data = folder_doc.to_dict()
-                if folder_data.get('isPersonal', False):
-                    personal_folder_ids[folder_doc.id] = folder_data.get('ownerUserID')
-            
-            # Filter files based on personal folder ownership
-            filtered_files = []
-            for file in all_files:
-                file_folder_id = file.get('folderID')
+                cursor = [file_data.get('uploadedAt'), doc.id]
                 
-                # If file is in a personal folder
-                if file_folder_id in personal_folder_ids:
-                    folder_owner = personal_folder_ids[file_folder_id]
-                    # Only show to owner or superadmin
-                    if is_superadmin or requesting_user_id == folder_owner:
-                        filtered_files.append(file)
-                else:
-                    # Not in personal folder, show to everyone
-                    filtered_files.append(file)
-            
-            # Sort in Python by uploadedAt (newest first)
-            filtered_files.sort(key=lambda x: x.get('uploadedAt', ''), reverse=True)
-            
-            # Apply limit
-            return filtered_files[:limit]
+                # Files in personal folders are shown only to the owner (or superadmin)
+                folder_owner = personal_folder_ids.get(file_data.get('folderID'), requesting_user_id)
+                if is_superadmin or folder_owner == requesting_user_id:
+                    files.append(file_data)
             
+            if len(docs) < batch_size:
+                exhausted = True
+                break
+        
+        return {
+            'files': files,
+            'next_page_token': None if exhausted else SharedFilesService.encode_page_token(files[-1]),
+            'limit': limit
+        }
+    
+    @staticmethod
+    def get_all_files(
+        folder_id: Optional[str] = None,
+        uploader_id: Optional[str] = None,
+        file_type_filter: Optional[str] = None,
+        limit: int = 100,
+        requesting_user_id: str = None,
+        is_superadmin: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Get the newest files with optional filters, respecting personal folder privacy (first page only)"""
+        try:
+            return SharedFilesService.get_files_page(
+                folder_id=folder_id,
+                uploader_id=uploader_id,
+                file_type_filter=file_type_filter,
+                limit=limit,
+                requesting_user_id=requesting_user_id,
+                is_superadmin=is_superadmin
+            )['files']
+        except google_exceptions.FailedPrecondition as e:
+            # A composite index from firestore.indexes.json isn't deployed; the message links to it
+            print(f"Error fetching files, missing Firestore index: {e}")
+            raise
         except Exception as e:
             print(f"Error fetching files: {e}")
             return []
@@ -120,25 +189,70 @@ class SharedFilesService:
     
     @staticmethod
     def delete_file(file_id: str, requesting_user_id: str, is_superadmin: bool) -> bool:
-        """Delete a file (owner or superadmin only)"""
-        file_doc = db.collection('sharedFiles').document(file_id).get()
+        """Delete a file (owner or superadmin only); the folder counters are decremented atomically"""
+        file_ref = db.collection('sharedFiles').document(file_id)
         
-        if not file_doc.exists:
-            raise ValueError(f"File with ID {file_id} not found")
+        @firestore.transactional
+        def delete_in_transaction(transaction):
+            # Read inside the transaction so concurrent deletes can't decrement twice
+            file_doc = file_ref.get(transaction=transaction)
+            if not file_doc.exists:
+                raise ValueError(f"File with ID {file_id} not found")
+            
+            file_data = file_doc.to_dict()
+            
+            # Check permission: must be owner or superadmin
+            if not is_superadmin and file_data.get('uploaderUserID') != requesting_user_id:
+                raise PermissionError("You can only delete your own files")
+            
+            folder_ref = db.collection('folders').document(file_data['folderID'])
+            folder_doc = folder_ref.get(transaction=transaction)
+            
+            # Delete the file metadata
+            transaction.delete(file_ref)
+            SharedFolderService.apply_file(transaction, folder_doc, file_data.get('fileSize', 0), sign=-1)
+            SharedFolderAnalyticsService.apply_file(transaction, file_data, sign=-1)
         
-        file_data = file_doc.to_dict()
+        delete_in_transaction(db.transaction())
+        FileSearchIndexService.remove(file_id)
+        SharedFolderAnalyticsService.remove_download_entry(file_id)
+        return True
+    
+    @staticmethod
+    def move_file(file_id: str, target_folder_id: str) -> Dict[str, Any]:
+        """Move a file to another folder, moving its count and size between the folder counters"""
+        file_ref = db.collection('sharedFiles').document(file_id)
+        target_ref = db.collection('folders').document(target_folder_id)
         
-        # Check permission: must be owner or superadmin
-        if not is_superadmin and file_data.get('uploaderUserID') != requesting_user_id:
-            raise PermissionError("You can only delete your own files")
+        @firestore.transactional
+        def move_in_transaction(transaction):
+            file_doc = file_ref.get(transaction=transaction)
+            if not file_doc.exists:
+                raise ValueError(f"File with ID {file_id} not found")
+            target_doc = target_ref.get(transaction=transaction)
+            if not target_doc.exists:
+                raise ValueError(f"Folder with ID {target_folder_id} not found")
+            
+            file_data = file_doc.to_dict()
+            if file_data.get('folderID') == target_folder_id:
+                return file_data
+            source_ref = db.collection('folders').document(file_data['folderID'])
+            source_doc = source_ref.get(transaction=transaction)
+            
+            transaction.update(file_ref, {'folderID': target_folder_id})
+            SharedFolderService.apply_file(transaction, source_doc, file_data.get('fileSize', 0), sign=-1)
+            SharedFolderService.apply_file(transaction, target_doc, file_data.get('fileSize', 0), sign=1)
+            moved = dict(file_data, folderID=target_folder_id)
+            SharedFolderAnalyticsService.apply_file(transaction, moved, sign=1, moved_from=file_data)
+            return moved
         
-        # Delete the file metadata
-        db.collection('sharedFiles').document(file_id).delete()
-        return True
+        file_data = move_in_transaction(db.transaction())
+        file_data['id'] = file_id
+        return file_data
     
     @staticmethod
     def increment_download_count(file_id: str) -> bool:
-        """Increment download count for analytics"""
+        """Increment download count for analytics (and the most-downloaded list when the file makes it)"""
         file_ref = db.collection('sharedFiles').document(file_id)
         file_doc = file_ref.get()
         
@@ -148,22 +262,33 @@ class SharedFilesService:
         file_ref.update({
             "downloadCount": firestore.Increment(1)
         })
+        try:
+            SharedFolderAnalyticsService.record_download(file_id, file_doc.to_dict().get('downloadCount', 0) + 1)
+        except Exception as e:
+            # The count itself is saved; the list catches up on the next download or rebuild
+            print(f"Error updating most-downloaded list: {e}")
         return True
     
     @staticmethod
-    def search_files(search_term: str, limit: int = 50) -> List[Dict[str, Any]]:
-        """Search files by filename (case-insensitive contains)"""
-        # Firestore doesn't have native case-insensitive search or LIKE
-        # We'll fetch all files and filter in Python (acceptable for moderate datasets)
-        all_files = SharedFilesService.get_all_files(limit=1000)  # Get more for search
-        
-        search_lower = search_term.lower()
-        filtered = [
-            f for f in all_files
-            if search_lower in f['fileName'].lower()
-        ]
+    def search_files(search_term: str, limit: int = 50, requesting_user_id: str = None,
+                     is_superadmin: bool = False) -> List[Dict[str, Any]]:
+        """
+        Search files by filename (case- and accent-insensitive substring), best
+        matches first, respecting personal folder privacy.
+        Served from the in-memory search index (see FileSearchIndexService).
+        """
+        def is_visible(file_data: Dict[str, Any]) -> bool:
+            if is_superadmin:
+                return True
+            folder_id = file_data.get('folderID')
+            owner = FolderDirectoryService.get_personal_owners({folder_id}).get(folder_id, requesting_user_id)
+            return owner == requesting_user_id
         
-        return filtered[:limit]
+        try:
+            return FileSearchIndexService.search(search_term, limit, is_visible)
+        except Exception as e:
+            print(f"Error searching files: {e}")
+            return []
     
     @staticmethod
     def get_file_count_by_folder(folder_id: str) -> int:
@@ -1,110 +1,307 @@
 """
 Service for Shared Folder analytics
+Totals are kept in one incrementally maintained document so the dashboard
+never scans every file
 """
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from firebase_client import db
-from typing import List, Dict, Any
-from collections import defaultdict
-from datetime import datetime
+from firebase_admin import firestore
+from services.folder_directory_service import FolderDirectoryService
+from counter_utils import add_nested, to_increments
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timezone
+import heapq
 
 
 class SharedFolderAnalyticsService:
-    """Service for generating analytics data"""
-    
+    """Maintains and formats analytics data"""
+
+    AGGREGATES_DOC_PATH = "aggregates/shared_folder_analytics"
+
+    # Files shown in mostDownloadedFiles, and how many are kept so deletes don't empty the list
+    TOP_DOWNLOADS = 10
+    TOP_DOWNLOADS_KEEP = 20
+
     @staticmethod
-    def get_analytics() -> Dict[str, Any]:
-        """Generate complete analytics for Shared Folder"""
-        
-        # Fetch all files
-        all_files = list(db.collection('sharedFiles').stream())
-        
-        # Fetch all folders
-        all_folders_docs = list(db.collection('folders').stream())
-        folder_map = {doc.id: doc.to_dict()['name'] for doc in all_folders_docs}
-        
-        # Initialize counters
-        total_files = len(all_files)
-        total_storage = 0
-        files_by_folder = defaultdict(lambda: {"fileCount": 0, "totalSize": 0})
-        uploads_by_user = defaultdict(lambda: {"fileCount": 0, "totalSize": 0, "name": ""})
-        most_downloaded = []
-        upload_timeline = defaultdict(int)
-        
-        # Process each file
-        for doc in all_files:
+    def _key(value: Any) -> str:
+        """Firestore map keys must be non-empty strings"""
+        key = str(value) if value is not None else ''
+        return key if key else 'unknown'
+
+    @staticmethod
+    def _week(uploaded_at: Optional[str]) -> Optional[str]:
+        """Timeline bucket, e.g. '2024-W01' (None when the date can't be parsed)"""
+        if not uploaded_at:
+            return None
+        try:
+            dt = datetime.fromisoformat(uploaded_at.replace('Z', '+00:00'))
+            return f"{dt.year}-W{dt.isocalendar()[1]:02d}"
+        except (ValueError, AttributeError):
+            return None
+
+    @staticmethod
+    def compute_deltas(file_data: Dict[str, Any], sign: int = 1) -> Dict[str, Any]:
+        """
+        Contribution of one file to the analytics document.
+
+        Args:
+            file_data: sharedFiles document data
+            sign: +1 when the file is created, -1 when it is deleted
+        """
+        key = SharedFolderAnalyticsService._key
+        file_size = file_data.get('fileSize', 0) or 0
+        uploader_id = file_data.get('uploaderUserID', 'unknown')
+        deltas = {
+            'total_files': sign,
+            'total_storage': sign * file_size,
+            'folders': {key(file_data.get('folderID', 'unknown')): {'fileCount': sign, 'totalSize': sign * file_size}},
+            'uploaders': {key(uploader_id): {
+                'fileCount': sign,
+                'totalSize': sign * file_size,
+                'name': str(file_data.get('uploaderName', uploader_id))
+            }},
+            'timeline': {}
+        }
+        week = SharedFolderAnalyticsService._week(file_data.get('uploadedAt'))
+        if week:
+            deltas['timeline'][week] = sign
+        return {k: v for k, v in deltas.items() if v != {}}
+
+    @staticmethod
+    def apply_file(writer, file_data: Dict[str, Any], sign: int = 1,
+                   moved_from: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Stage an analytics update on a WriteBatch or Transaction so it commits
+        atomically with the file write/delete. For a move, pass the new file
+        data with sign=1 and the old data as moved_from (one write to the doc).
+        """
+        deltas = SharedFolderAnalyticsService.compute_deltas(file_data, sign)
+        if moved_from is not None:
+            add_nested(deltas, SharedFolderAnalyticsService.compute_deltas(moved_from, -1))
+        increments = to_increments(deltas)
+        increments['updated_at'] = firestore.SERVER_TIMESTAMP
+        writer.set(db.document(SharedFolderAnalyticsService.AGGREGATES_DOC_PATH), increments, merge=True)
+
+    @staticmethod
+    def _download_entry(file_id: str, file_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": file_id,
+            "fileName": file_data.get('fileName', 'Unknown'),
+            "downloadCount": file_data.get('downloadCount', 0),
+            "uploaderName": file_data.get('uploaderName', 'Unknown')
+        }
+
+    @staticmethod
+    def _rank_downloads(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Bounded most-downloaded list, most downloads first"""
+        return heapq.nsmallest(
+            SharedFolderAnalyticsService.TOP_DOWNLOADS_KEEP, entries,
+            key=lambda x: (-x["downloadCount"], x["id"])
+        )
+
+    @staticmethod
+    def record_download(file_id: str, download_count: int) -> None:
+        """
+        Keep the bounded most-downloaded list current after a download.
+        Most downloads can't enter the list, which is checked without a
+        transaction so they never contend on the analytics document.
+        """
+        doc_ref = db.document(SharedFolderAnalyticsService.AGGREGATES_DOC_PATH)
+        doc = doc_ref.get()
+        if not doc.exists:
+            return
+        top = doc.to_dict().get('top_downloads', [])
+        full = len(top) >= SharedFolderAnalyticsService.TOP_DOWNLOADS_KEEP
+        listed = any(entry['id'] == file_id for entry in top)
+        if full and not listed and download_count <= top[-1]['downloadCount']:
+            return
+
+        file_ref = db.collection('sharedFiles').document(file_id)
+
+        @firestore.transactional
+        def update_in_transaction(transaction):
+            aggregates = doc_ref.get(transaction=transaction)
+            file_doc = file_ref.get(transaction=transaction)
+            if not aggregates.exists or not file_doc.exists:
+                return
+            entries = [entry for entry in aggregates.to_dict().get('top_downloads', []) if entry['id'] != file_id]
+            entries.append(SharedFolderAnalyticsService._download_entry(file_id, file_doc.to_dict()))
+            transaction.update(doc_ref, {'top_downloads': SharedFolderAnalyticsService._rank_downloads(entries)})
+
+        update_in_transaction(db.transaction())
+
+    @staticmethod
+    def remove_download_entry(file_id: str) -> None:
+        """Drop a deleted file from the most-downloaded list (get_analytics queries past it if it runs short)"""
+        doc_ref = db.document(SharedFolderAnalyticsService.AGGREGATES_DOC_PATH)
+
+        @firestore.transactional
+        def update_in_transaction(transaction):
+            aggregates = doc_ref.get(transaction=transaction)
+            if not aggregates.exists:
+                return
+            top = aggregates.to_dict().get('top_downloads', [])
+            if any(entry['id'] == file_id for entry in top):
+                transaction.update(doc_ref, {'top_downloads': [entry for entry in top if entry['id'] != file_id]})
+
+        update_in_transaction(db.transaction())
+
+    @staticmethod
+    def _top_downloads_from_query() -> List[Dict[str, Any]]:
+        """Most-downloaded files straight from Firestore (single-field index on downloadCount)"""
+        docs = db.collection('sharedFiles') \
+            .order_by('downloadCount', direction=firestore.Query.DESCENDING) \
+            .limit(SharedFolderAnalyticsService.TOP_DOWNLOADS_KEEP).stream()
+        return SharedFolderAnalyticsService._rank_downloads([
+            SharedFolderAnalyticsService._download_entry(doc.id, doc.to_dict()) for doc in docs
+        ])
+
+    @staticmethod
+    def compute_from_files(file_docs) -> Dict[str, Any]:
+        """Build the analytics document from scratch from an iterable of file snapshots"""
+        aggregates: Dict[str, Any] = {'total_files': 0, 'total_storage': 0}
+        downloads = []
+        for doc in file_docs:
             file_data = doc.to_dict()
-            
-            # Total storage
-            file_size = file_data.get('fileSize', 0)
-            total_storage += file_size
-            
-            # Files by folder
-            folder_id = file_data.get('folderID', 'unknown')
-            files_by_folder[folder_id]["fileCount"] += 1
-            files_by_folder[folder_id]["totalSize"] += file_size
-            files_by_folder[folder_id]["folderName"] = folder_map.get(folder_id, "Unknown")
-            
-            # Uploads by user
-            uploader_id = file_data.get('uploaderUserID', 'unknown')
-            uploads_by_user[uploader_id]["fileCount"] += 1
-            uploads_by_user[uploader_id]["totalSize"] += file_size
-            uploads_by_user[uploader_id]["name"] = file_data.get('uploaderName', uploader_id)
-            
-            # Most downloaded files
-            most_downloaded.append({
-                "id": doc.id,
-                "fileName": file_data.get('fileName', 'Unknown'),
-                "downloadCount": file_data.get('downloadCount', 0),
-                "uploaderName": file_data.get('uploaderName', 'Unknown')
-            })
-            
-            # Upload timeline (by week)
-            uploaded_at = file_data.get('uploadedAt')
-            if uploaded_at:
-                try:
-                    dt = datetime.fromisoformat(uploaded_at.replace('Z', '+00:00'))
-                    week_key = f"{dt.year}-W{dt.isocalendar()[1]:02d}"
-                    upload_timeline[week_key] += 1
-                except:
-                    pass
-        
-        # Sort and format
+            add_nested(aggregates, SharedFolderAnalyticsService.compute_deltas(file_data))
+            downloads.append(SharedFolderAnalyticsService._download_entry(doc.id, file_data))
+        aggregates['top_downloads'] = SharedFolderAnalyticsService._rank_downloads(downloads)
+        return aggregates
+
+    @staticmethod
+    def get_aggregates() -> Optional[Dict[str, Any]]:
+        """Read the analytics document (one read), or None if it was never built"""
+        doc = db.document(SharedFolderAnalyticsService.AGGREGATES_DOC_PATH).get()
+        if not doc.exists:
+            return None
+        return doc.to_dict()
+
+    @staticmethod
+    def rebuild() -> Dict[str, Any]:
+        """
+        Recompute the analytics document with a full scan of sharedFiles and overwrite it.
+        Run while no files are being uploaded or deleted, otherwise concurrent increments may be lost.
+        """
+        aggregates = SharedFolderAnalyticsService.compute_from_files(db.collection('sharedFiles').stream())
+        aggregates['rebuilt_at'] = datetime.now(timezone.utc).isoformat()
+        db.document(SharedFolderAnalyticsService.AGGREGATES_DOC_PATH).set(aggregates)
+        return aggregates
+
+    @staticmethod
+    def _prune(value: Any) -> Any:
+        """Drop zero counters, emptied folders/uploaders and empty maps left behind by deletes"""
+        if isinstance(value, dict):
+            return {
+                k: SharedFolderAnalyticsService._prune(v) for k, v in value.items()
+                if v not in (0, {}) and not (isinstance(v, dict) and v.get('fileCount', 1) == 0)
+            }
+        return value
+
+    @staticmethod
+    def verify() -> Dict[str, Any]:
+        """Compare the stored analytics document against a full scan and report drift"""
+        expected = SharedFolderAnalyticsService.compute_from_files(db.collection('sharedFiles').stream())
+        stored = SharedFolderAnalyticsService.get_aggregates() or {}
+
+        mismatches: List[Dict[str, Any]] = []
+
+        def diff(expected_value: Any, stored_value: Any, path: str) -> None:
+            if isinstance(expected_value, dict) and isinstance(stored_value, dict):
+                for key in sorted(set(expected_value) | set(stored_value)):
+                    diff(expected_value.get(key, 0), stored_value.get(key, 0), f"{path}.{key}" if path else key)
+            elif expected_value != stored_value:
+                mismatches.append({'field': path, 'expected': expected_value, 'stored': stored_value})
+
+        diff(
+            SharedFolderAnalyticsService._prune({k: v for k, v in expected.items() if k != 'top_downloads'}),
+            SharedFolderAnalyticsService._prune({
+                k: v for k, v in stored.items() if k not in ('top_downloads', 'updated_at', 'rebuilt_at')
+            }),
+            ''
+        )
+        # Only the shown part of the downloads list has to match; ties may list different files
+        top = SharedFolderAnalyticsService.TOP_DOWNLOADS
+        expected_counts = [entry['downloadCount'] for entry in expected['top_downloads'][:top]]
+        stored_counts = [entry['downloadCount'] for entry in stored.get('top_downloads', [])[:top]]
+        if expected_counts != stored_counts:
+            mismatches.append({'field': 'top_downloads', 'expected': expected_counts, 'stored': stored_counts})
+
+        return {
+            'in_sync': not mismatches,
+            'total_files': expected.get('total_files', 0),
+            'mismatches': mismatches
+        }
+
+    @staticmethod
+    def format_analytics(aggregates: Dict[str, Any]) -> Dict[str, Any]:
+        """Shape the analytics document as SharedFolderAnalyticsResponse"""
+        aggregates = SharedFolderAnalyticsService._prune(
+            {k: v for k, v in aggregates.items() if k != 'top_downloads'}
+        )
+
+        # Folder names from the in-process folder directory
+        folder_map = {folder['id']: folder['name'] for folder in FolderDirectoryService.get_folders()}
+
         files_by_folder_list = [
             {
                 "folderID": fid,
-                "folderName": data["folderName"],
-                "fileCount": data["fileCount"],
-                "totalSize": data["totalSize"]
+                "folderName": folder_map.get(fid, "Unknown"),
+                "fileCount": data.get("fileCount", 0),
+                "totalSize": data.get("totalSize", 0)
             }
-            for fid, data in files_by_folder.items()
+            for fid, data in aggregates.get('folders', {}).items()
         ]
-        files_by_folder_list.sort(key=lambda x: x["fileCount"], reverse=True)
-        
+        files_by_folder_list.sort(key=lambda x: (-x["fileCount"], x["folderID"]))
+
         uploads_by_user_list = [
             {
                 "uploaderUserID": uid,
-                "uploaderName": data["name"],
-                "fileCount": data["fileCount"],
-                "totalSize": data["totalSize"]
+                "uploaderName": data.get("name", uid),
+                "fileCount": data.get("fileCount", 0),
+                "totalSize": data.get("totalSize", 0)
             }
-            for uid, data in uploads_by_user.items()
+            for uid, data in aggregates.get('uploaders', {}).items()
         ]
-        uploads_by_user_list.sort(key=lambda x: x["fileCount"], reverse=True)
-        
-        # Top 10 most downloaded
-        most_downloaded.sort(key=lambda x: x["downloadCount"], reverse=True)
-        most_downloaded = most_downloaded[:10]
-        
+        uploads_by_user_list.sort(key=lambda x: (-x["fileCount"], x["uploaderUserID"]))
+
         # Timeline (sorted by period)
         upload_timeline_list = [
             {"period": period, "fileCount": count}
-            for period, count in sorted(upload_timeline.items())
+            for period, count in sorted(aggregates.get('timeline', {}).items())
         ]
-        
+
         return {
-            "totalFiles": total_files,
-            "totalStorageBytes": total_storage,
+            "totalFiles": aggregates.get('total_files', 0),
+            "totalStorageBytes": aggregates.get('total_storage', 0),
             "filesByFolder": files_by_folder_list,
             "uploadsByUser": uploads_by_user_list,
-            "mostDownloadedFiles": most_downloaded,
+            "mostDownloadedFiles": [],
             "uploadTimeline": upload_timeline_list
         }
+
+    @staticmethod
+    def get_analytics() -> Dict[str, Any]:
+        """
+        Complete analytics for Shared Folder from the analytics document.
+        Until it has been rebuilt (CLI or admin endpoint) the totals come from a full
+        scan; the read path never writes the document, so no increments are lost.
+        """
+        aggregates = SharedFolderAnalyticsService.get_aggregates()
+        if aggregates is None or 'rebuilt_at' not in aggregates:
+            # Increments alone (no rebuilt_at) would miss files uploaded before the document existed
+            print("Shared folder analytics not rebuilt yet, scanning files...")
+            aggregates = SharedFolderAnalyticsService.compute_from_files(db.collection('sharedFiles').stream())
+
+        top = aggregates.get('top_downloads', [])
+        shown = SharedFolderAnalyticsService.TOP_DOWNLOADS
+        if len(top) < shown and aggregates.get('total_files', 0) > len(top):
+            # Deletes ran the kept list short; fill it from one small indexed query.
+            # The stored list catches up on the next download or rebuild
+            top = SharedFolderAnalyticsService._top_downloads_from_query()
+
+        analytics = SharedFolderAnalyticsService.format_analytics(aggregates)
+        analytics["mostDownloadedFiles"] = top[:shown]
+        return analytics
@@ -5,24 +5,47 @@ from firebase_client import db
 from firebase_admin import firestore
 from datetime import datetime, timezone
 from typing import List, Dict, Any, Optional
+from services.bulk_writer_service import BulkWriter
+from services.folder_directory_service import FolderDirectoryService
 import uuid
 
 
 class SharedFolderService:
     """Service for folder CRUD operations"""
     
+    @staticmethod
+    def apply_file(writer, folder_doc, file_size: int, sign: int = 1) -> None:
+        """
+        Stage a fileCount/totalSize update on a WriteBatch or Transaction so it
+        commits atomically with the file write/delete.
+        folder_doc is the folder snapshot read in the same transaction. Missing
+        folders and folders without counters yet (created before counters were
+        maintained) are skipped: an Increment would start them from this one file,
+        and _with_counters keeps counting them until reconcile_counters seeds them.
+        A move is sign=-1 on the old folder and sign=+1 on the new one.
+        """
+        if not folder_doc.exists or 'fileCount' not in folder_doc.to_dict():
+            return
+        writer.update(folder_doc.reference, {
+            'fileCount': firestore.Increment(sign),
+            'totalSize': firestore.Increment(sign * (file_size or 0))
+        })
+    
+    @staticmethod
+    def _with_counters(folder_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Fill counters on folders created before they were maintained (until reconciled)"""
+        if 'fileCount' not in folder_data:
+            folder_data['fileCount'] = db.collection('sharedFiles').where('folderID', '==', folder_data['id']).count().get()[0][0].value
+        folder_data.setdefault('totalSize', 0)
+        return folder_data
+    
     @staticmethod
     def create_folder(name: str, created_by: str, icon: str = "folder", color: str = "#A62639", is_personal: bool = False, owner_user_id: str = None) -> Dict[str, Any]:
         """Create a new folder (Superadmin only, or auto-create for personal folders)"""
         folder_id = str(uuid.uuid4())
         
         # Get current max order
-        existing_folders = list(db.collection('folders').stream())
-        max_order = 0
-        for folder in existing_folders:
-            folder_order = folder.to_dict().get('order', 0)
-            if folder_order > max_order:
-                max_order = folder_order
+        max_order = FolderDirectoryService.get_max_order()
         
         folder_data = {
             "id": folder_id,
@@ -33,10 +56,13 @@ class SharedFolderService:
             "color": color,
             "order": max_order + 1,
             "isPersonal": is_personal,
-            "ownerUserID": owner_user_id if is_personal else None
+            "ownerUserID": owner_user_id if is_personal else None,
+            "fileCount": 0,
+            "totalSize": 0
         }
         
         db.collection('folders').document(folder_id).set(folder_data)
+        FolderDirectoryService.put(folder_data)
         return folder_data
     
     @staticmethod
@@ -62,14 +88,17 @@ class SharedFolderService:
     
     @staticmethod
     def get_all_folders(user_id: str = None, include_personal: bool = False) -> List[Dict[str, Any]]:
-        """Get all folders with file counts, ordered by order field"""
+        """Get all folders with file counts (stored on each folder), ordered by order field"""
         folders = []
-        folder_docs = list(db.collection('folders').stream())
+        if FolderDirectoryService.is_live():
+            all_folders = FolderDirectoryService.get_folders()
+        else:
+            # Counters change with every upload, so read them fresh and refresh the directory with the same scan
+            all_folders = FolderDirectoryService.refresh(db.collection('folders').stream())['folders'].values()
         
         # First pass: collect all folders and check for missing order fields
-        for doc in folder_docs:
-            folder_data = doc.to_dict()
-            folder_data['id'] = doc.id
+        for folder_data in all_folders:
+            folder_data = dict(folder_data)
             
             # Filter personal folders unless requested
             is_personal = folder_data.get('isPersonal', False)
@@ -80,11 +109,7 @@ class SharedFolderService:
                 if not (include_personal and folder_data.get('ownerUserID') == user_id):
                     continue
             
-            # Get file count for this folder
-            file_count = db.collection('sharedFiles').where('folderID', '==', doc.id).count().get()[0][0].value
-            folder_data['fileCount'] = file_count
-            
-            folders.append(folder_data)
+            folders.append(SharedFolderService._with_counters(folder_data))
         
         # Assign order if missing (only for non-personal folders)
         for i, folder in enumerate(folders):
@@ -92,6 +117,7 @@ class SharedFolderService:
                 if 'order' not in folder or folder.get('order') is None or folder.get('order') == 0:
                     new_order = i + 1
                     db.collection('folders').document(folder['id']).update({'order': new_order})
+                    FolderDirectoryService.put({'id': folder['id'], 'order': new_order})
                     folder['order'] = new_order
                     print(f"Updated folder {folder['name']} with order {new_order}")
         
@@ -109,12 +135,7 @@ class SharedFolderService:
         
         folder_data = doc.to_dict()
         folder_data['id'] = doc.id
-        
-        # Get file count
-        file_count = db.collection('sharedFiles').where('folderID', '==', folder_id).count().get()[0][0].value
-        folder_data['fileCount'] = file_count
-        
-        return folder_data
+        return SharedFolderService._with_counters(folder_data)
     
     @staticmethod
     def update_folder(folder_id: str, name: str, icon: Optional[str] = None, color: Optional[str] = None) -> Dict[str, Any]:
@@ -137,19 +158,25 @@ class SharedFolderService:
         updated_doc = folder_ref.get()
         folder_data = updated_doc.to_dict()
         folder_data['id'] = folder_id
+        FolderDirectoryService.put(folder_data)
         return folder_data
     
     @staticmethod
     def delete_folder(folder_id: str) -> bool:
         """Delete a folder only if it has no files (Superadmin only)"""
-        # Check if folder has any files
-        file_count = db.collection('sharedFiles').where('folderID', '==', folder_id).count().get()[0][0].value
+        # Check if folder has any files; a non-zero counter is enough to refuse,
+        # an empty one is confirmed with a count so drift can't orphan files
+        folder_doc = db.collection('folders').document(folder_id).get()
+        file_count = (folder_doc.to_dict() or {}).get('fileCount', 0) if folder_doc.exists else 0
+        if file_count <= 0:
+            file_count = db.collection('sharedFiles').where('folderID', '==', folder_id).count().get()[0][0].value
         
         if file_count > 0:
             raise ValueError(f"Cannot delete folder: contains {file_count} file(s)")
         
         # Delete the folder
         db.collection('folders').document(folder_id).delete()
+        FolderDirectoryService.remove(folder_id)
         return True
     
     @staticmethod
@@ -181,6 +208,8 @@ class SharedFolderService:
         
         db.collection('folders').document(folder_id).update({'order': swap_order})
         db.collection('folders').document(folders[swap_index]['id']).update({'order': current_order})
+        FolderDirectoryService.put({'id': folder_id, 'order': swap_order})
+        FolderDirectoryService.put({'id': folders[swap_index]['id'], 'order': current_order})
         
         return True
     
@@ -210,6 +239,48 @@ class SharedFolderService:
                 "createdAt": datetime.now(timezone.utc).isoformat(),
                 "icon": folder["icon"],
                 "color": folder["color"],
-                "order": i + 1
+                "order": i + 1,
+                "fileCount": 0,
+                "totalSize": 0
             }
             db.collection('folders').document(folder_id).set(folder_data)
+            FolderDirectoryService.put(folder_data)
+    
+    @staticmethod
+    def reconcile_counters(apply: bool = True) -> Dict[str, Any]:
+        """
+        Recount files per folder with one scan of sharedFiles and compare with the
+        stored fileCount/totalSize. With apply=True, drifted folders are overwritten.
+        Run while no files are being uploaded or deleted, otherwise concurrent
+        increments may be lost.
+        """
+        expected: Dict[str, Dict[str, int]] = {}
+        total_files = 0
+        for doc in db.collection('sharedFiles').stream():
+            file_data = doc.to_dict()
+            counters = expected.setdefault(file_data.get('folderID'), {'fileCount': 0, 'totalSize': 0})
+            counters['fileCount'] += 1
+            counters['totalSize'] += file_data.get('fileSize', 0) or 0
+            total_files += 1
+        
+        mismatches = []
+        folder_ids = set()
+        with BulkWriter() as writer:
+            for doc in db.collection('folders').stream():
+                folder_ids.add(doc.id)
+                stored = doc.to_dict()
+                counters = expected.get(doc.id, {'fileCount': 0, 'totalSize': 0})
+                drifted = [field for field, value in counters.items() if stored.get(field) != value]
+                for field in drifted:
+                    mismatches.append({'folder_id': doc.id, 'field': field, 'expected': counters[field], 'stored': stored.get(field)})
+                if apply and drifted:
+                    writer.update(doc.reference, counters)
+        
+        return {
+            'in_sync': not mismatches,
+            'total_files': total_files,
+            'folders_checked': len(folder_ids),
+            'orphaned_files': sum(c['fileCount'] for folder_id, c in expected.items() if folder_id not in folder_ids),
+            'mismatches': mismatches,
+            'repaired': len({m['folder_id'] for m in mismatches}) if apply else 0
+        }
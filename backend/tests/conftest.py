@@ -0,0 +1,183 @@
+"""
+Shared fixtures for backend tests
+Services import `db` from firebase_client at import time, so an in-memory
+Firestore is installed in its place before any service is imported.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import copy
+import itertools
+import types
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import pytest
+from firebase_admin import firestore
+
+
+def _apply(current: Optional[Dict[str, Any]], data: Dict[str, Any], merge: bool) -> Dict[str, Any]:
+    """Field values with Increment / SERVER_TIMESTAMP resolved; merge=True merges nested maps"""
+    result = copy.deepcopy(current) if current else {}
+    for key, value in data.items():
+        if isinstance(value, firestore.Increment):
+            result[key] = result.get(key, 0) + value.value
+        elif value is firestore.SERVER_TIMESTAMP:
+            result[key] = datetime.now(timezone.utc)
+        elif isinstance(value, dict):
+            existing = result.get(key) if merge and isinstance(result.get(key), dict) else None
+            result[key] = _apply(existing, value, merge)
+        else:
+            result[key] = copy.deepcopy(value)
+    return result
+
+
+class FakeSnapshot:
+    def __init__(self, reference: 'FakeDocument', data: Optional[Dict[str, Any]]):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data)
+
+
+class FakeDocument:
+    def __init__(self, client: 'FakeFirestore', path: str):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def get(self, transaction=None) -> FakeSnapshot:
+        return FakeSnapshot(self, copy.deepcopy(self._client.store.get(self.path)))
+
+    def set(self, data: Dict[str, Any], merge: bool = False) -> None:
+        current = self._client.store.get(self.path) if merge else None
+        self._client.store[self.path] = _apply(current, data, merge)
+
+    def update(self, data: Dict[str, Any]) -> None:
+        if self.path not in self._client.store:
+            raise KeyError(f"No document to update: {self.path}")
+        # Top-level fields are replaced, as update() does for a map value
+        current = self._client.store[self.path]
+        current.update(_apply({key: current[key] for key in data if key in current}, data, merge=False))
+
+    def delete(self) -> None:
+        self._client.store.pop(self.path, None)
+
+    def collection(self, name: str) -> 'FakeCollection':
+        return FakeCollection(self._client, f"{self.path}/{name}")
+
+
+class FakeCollection:
+    """Collection reference and query; supports the filters the services use"""
+
+    def __init__(self, client: 'FakeFirestore', path: str, filters=()):
+        self._client = client
+        self.path = path
+        self._filters = list(filters)
+
+    def document(self, doc_id: Optional[str] = None) -> FakeDocument:
+        return FakeDocument(self._client, f"{self.path}/{doc_id or f'auto{next(self._client.ids):06d}'}")
+
+    def where(self, field: str, op: str, value: Any) -> 'FakeCollection':
+        return FakeCollection(self._client, self.path, self._filters + [(field, op, value)])
+
+    def select(self, field_paths) -> 'FakeCollection':
+        """Projections return whole documents"""
+        return self
+
+    def count(self):
+        """Aggregation query: get() returns [[result]] with result.value"""
+        total = sum(1 for _ in self.stream())
+        return types.SimpleNamespace(get=lambda transaction=None: [[types.SimpleNamespace(value=total)]])
+
+    @staticmethod
+    def _matches(data: Dict[str, Any], field: str, op: str, value: Any) -> bool:
+        current = data.get(field)
+        if op == '==':
+            return current == value
+        if op == 'array_contains':
+            return value in (current or [])
+        if op == 'array_contains_any':
+            return any(item in (current or []) for item in value)
+        raise NotImplementedError(op)
+
+    def stream(self, transaction=None):
+        prefix = self.path + '/'
+        for path, data in sorted(self._client.store.items()):
+            if not path.startswith(prefix) or '/' in path[len(prefix):]:
+                continue
+            if all(self._matches(data, *condition) for condition in self._filters):
+                yield FakeSnapshot(FakeDocument(self._client, path), copy.deepcopy(data))
+
+
+class FakeBatch:
+    """WriteBatch / Transaction: writes are applied on commit"""
+
+    def __init__(self):
+        self._writes = []
+
+    def set(self, ref: FakeDocument, data: Dict[str, Any], merge: bool = False) -> None:
+        self._writes.append(lambda: ref.set(data, merge=merge))
+
+    def update(self, ref: FakeDocument, data: Dict[str, Any]) -> None:
+        self._writes.append(lambda: ref.update(data))
+
+    def delete(self, ref: FakeDocument) -> None:
+        self._writes.append(ref.delete)
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        for write in writes:
+            write()
+        return []
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.store: Dict[str, Dict[str, Any]] = {}
+        self.ids = itertools.count()
+
+    def collection(self, name: str) -> FakeCollection:
+        return FakeCollection(self, name)
+
+    def document(self, path: str) -> FakeDocument:
+        return FakeDocument(self, path)
+
+    def batch(self) -> FakeBatch:
+        return FakeBatch()
+
+    def transaction(self, **kwargs) -> FakeBatch:
+        return FakeBatch()
+
+    def get_all(self, refs, transaction=None):
+        return [ref.get() for ref in refs]
+
+    def paths(self, prefix: str):
+        return sorted(path for path in self.store if path.startswith(prefix))
+
+
+fake_db = FakeFirestore()
+sys.modules['firebase_client'] = types.SimpleNamespace(db=fake_db)
+
+
+def _transactional(func):
+    """Single-threaded stand-in for firestore.transactional: run once, then commit"""
+    def run(transaction, *args, **kwargs):
+        result = func(transaction, *args, **kwargs)
+        transaction.commit()
+        return result
+    return run
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """Empty in-memory Firestore for one test"""
+    from firebase_admin import firestore
+    monkeypatch.setattr(firestore, 'transactional', _transactional)
+    fake_db.store.clear()
+    yield fake_db
+    fake_db.store.clear()
@@ -0,0 +1,84 @@
+"""
+Incremental analytics: aggregates of a split run merged together must give
+the same result as one run over all rows
+"""
+import pytest
+
+from config import settings
+from benchmarks.synthetic import make_keywords, make_social_posts
+from services.analytics_aggregate_service import (
+    AnalyticsAggregateService, compare_results, finalize_search, finalize_social,
+    merge_posts, merge_search, merge_social, search_partial, social_partial
+)
+from services.analytics_engine_service import AnalyticsEngineService
+from services.chunked_dataset_service import ChunkedDatasetService
+
+
+@pytest.mark.parametrize('sort_posts', [True, False])
+@pytest.mark.parametrize('seed, cut', [(0, 1), (1, 37), (2, 199)])
+def test_split_social_matches_full_run(seed, cut, sort_posts):
+    rows = make_social_posts(200, seed=seed)
+    rows[3]['views'] = ''
+    rows[cut]['likes'] = None
+
+    first_state, _ = social_partial(rows[:cut])
+    first = AnalyticsEngineService.social_media_analytics(rows[:cut], sort_posts=sort_posts)
+    appended, new_posts = social_partial(rows[cut:], first_state['rows'], with_rows=True)
+    merged = finalize_social(
+        merge_social(first_state, appended),
+        merge_posts(first.get('post_level_data') or [], new_posts, sort_posts)
+    )
+
+    assert compare_results(merged, AnalyticsEngineService.social_media_analytics(rows, sort_posts=sort_posts)) == []
+
+
+@pytest.mark.parametrize('seed, cut', [(0, 1), (1, 64), (2, 199)])
+def test_split_search_matches_full_run(seed, cut):
+    rows = make_keywords(200, seed=seed)
+
+    first_state, _ = search_partial(rows[:cut])
+    first = AnalyticsEngineService.search_marketing_analytics(rows[:cut])
+    appended, new_rows = search_partial(rows[cut:], first_state['rows'], with_rows=True)
+    merged = finalize_search(merge_search(first_state, appended), (first.get('opportunity_map') or []) + new_rows)
+
+    assert compare_results(merged, AnalyticsEngineService.search_marketing_analytics(rows)) == []
+
+
+def stored_run(module, rows, mappings, options):
+    """What POST /api/analytics/{module} stores after a full run: the result record and the aggregates"""
+    manifest = ChunkedDatasetService.write_stream(module, list(mappings.values()), rows, 'tester', append=True)
+    analytics, state, status = AnalyticsAggregateService.run(module, 'tester', manifest, mappings, options, None)
+    input_hash = AnalyticsEngineService.input_hash(module, ChunkedDatasetService.dataset_hash(manifest), mappings, options)
+    AnalyticsAggregateService.save_state(module, state, manifest, mappings, options, input_hash)
+    return {'input_hash': input_hash, 'data': analytics}
+
+
+@pytest.mark.parametrize('module, make_rows, options', [
+    ('social_media', make_social_posts, {'sort_posts': True}),
+    ('search_marketing', make_keywords, {}),
+])
+def test_run_incremental_reads_appended_chunks_only(db, monkeypatch, module, make_rows, options):
+    monkeypatch.setattr(settings, 'DATASET_CHUNK_ROWS', 40)
+    rows = make_rows(150, seed=5)
+    mappings = {field: field for field in rows[0]}
+    stored = stored_run(module, rows[:100], mappings, options)
+
+    manifest = ChunkedDatasetService.write_stream(module, list(mappings), rows[100:], 'tester', append=True)
+    state, merged = AnalyticsAggregateService.run_incremental(module, manifest, mappings, options, stored)
+    full, _, _ = AnalyticsAggregateService.run(module, 'tester', manifest, mappings, options, None, incremental=False)
+
+    assert state['rows'] == 150
+    assert compare_results(merged, full) == []
+
+
+def test_run_incremental_skips_edited_dataset(db, monkeypatch):
+    monkeypatch.setattr(settings, 'DATASET_CHUNK_ROWS', 40)
+    rows = make_keywords(100, seed=6)
+    mappings = {field: field for field in rows[0]}
+    stored = stored_run('search_marketing', rows[:80], mappings, {})
+
+    # An edit inside the covered chunks can't reuse the stored aggregates
+    rows[0] = dict(rows[0], search_volume=1)
+    manifest = ChunkedDatasetService.write('search_marketing', list(mappings), rows, 'tester')
+
+    assert AnalyticsAggregateService.run_incremental('search_marketing', manifest, mappings, {}, stored) is None
@@ -0,0 +1,236 @@
+"""
+ChunkedDatasetService.patch: row/column operations, version checks and the
+copy-on-write manifest switch
+"""
+import pytest
+
+from config import settings
+from services.chunked_dataset_service import ChunkedDatasetService, DatasetPatchError, DatasetVersionConflict
+
+MODULE = 'social_media'
+CHUNKS_PREFIX = f'{MODULE}_dynamic_data/shared/chunks/'
+
+
+@pytest.fixture
+def dataset(db, monkeypatch):
+    """Version-1 dataset of 7 rows in chunks of 3: [r0 r1 r2] [r3 r4 r5] [r6]"""
+    monkeypatch.setattr(settings, 'DATASET_CHUNK_ROWS', 3)
+    rows = [{'id': f'r{i}', 'Platform': 'TikTok', 'Likes': i} for i in range(7)]
+    return ChunkedDatasetService.write(MODULE, ['Platform', 'Likes'], rows, 'tester')
+
+
+def rows():
+    return list(ChunkedDatasetService.iter_rows(MODULE))
+
+
+def stored_chunk_ids(db):
+    return {path[len(CHUNKS_PREFIX):] for path in db.paths(CHUNKS_PREFIX)}
+
+
+def chunk_ids(manifest):
+    return [chunk['id'] for chunk in manifest['chunks']]
+
+
+def test_insert_appends_to_last_chunk(dataset):
+    result = ChunkedDatasetService.patch(MODULE, 1, [
+        {'op': 'insert', 'row': {'id': 'new', 'Platform': 'Instagram', 'Likes': 9}}
+    ], 'tester')
+
+    assert result['version'] == 2
+    assert rows()[-1] == {'id': 'new', 'Platform': 'Instagram', 'Likes': 9}
+    assert result['row_count'] == 8
+    # Only the last (partial) chunk is rewritten
+    assert result['chunks_written'] == 1
+    assert chunk_ids(result)[:2] == chunk_ids(dataset)[:2]
+
+
+def test_insert_generates_missing_id(dataset):
+    ChunkedDatasetService.patch(MODULE, 1, [{'op': 'insert', 'row': {'Platform': 'X'}}], 'tester')
+
+    assert rows()[-1]['id'].startswith('row-')
+
+
+def test_insert_existing_id_is_rejected(dataset):
+    with pytest.raises(DatasetPatchError):
+        ChunkedDatasetService.patch(MODULE, 1, [{'op': 'insert', 'row': {'id': 'r4'}}], 'tester')
+
+
+def test_update_rewrites_only_its_chunk(dataset):
+    result = ChunkedDatasetService.patch(MODULE, 1, [
+        {'op': 'update', 'id': 'r4', 'values': {'Likes': 40}}
+    ], 'tester')
+
+    assert rows()[4] == {'id': 'r4', 'Platform': 'TikTok', 'Likes': 40}
+    assert result['chunks_written'] == 1
+    assert chunk_ids(result)[0] == chunk_ids(dataset)[0]
+    assert chunk_ids(result)[1] != chunk_ids(dataset)[1]
+    assert chunk_ids(result)[2] == chunk_ids(dataset)[2]
+
+
+def test_update_cannot_change_row_id(dataset):
+    with pytest.raises(DatasetPatchError):
+        ChunkedDatasetService.patch(MODULE, 1, [{'op': 'update', 'id': 'r4', 'values': {'id': 'r9'}}], 'tester')
+
+
+def test_delete_removes_row(dataset):
+    result = ChunkedDatasetService.patch(MODULE, 1, [{'op': 'delete', 'id': 'r1'}], 'tester')
+
+    assert [row['id'] for row in rows()] == ['r0', 'r2', 'r3', 'r4', 'r5', 'r6']
+    assert result['row_count'] == 6
+
+
+def test_unknown_row_is_rejected(dataset):
+    with pytest.raises(DatasetPatchError):
+        ChunkedDatasetService.patch(MODULE, 1, [{'op': 'delete', 'id': 'missing'}], 'tester')
+
+
+def test_add_column_touches_no_chunks(dataset):
+    result = ChunkedDatasetService.patch(MODULE, 1, [{'op': 'add_column', 'column': 'Notes'}], 'tester')
+
+    assert result['columns'] == ['Platform', 'Likes', 'Notes']
+    assert result['chunks_written'] == 0
+    assert chunk_ids(result) == chunk_ids(dataset)
+
+
+def test_rename_column_across_chunks(dataset):
+    result = ChunkedDatasetService.patch(MODULE, 1, [
+        {'op': 'rename_column', 'column': 'Likes', 'new_name': 'Reactions'}
+    ], 'tester')
+
+    assert result['columns'] == ['Platform', 'Reactions']
+    assert rows() == [{'id': f'r{i}', 'Platform': 'TikTok', 'Reactions': i} for i in range(7)]
+    assert result['chunks_written'] == 3
+
+
+def test_rename_to_existing_column_is_rejected(dataset):
+    with pytest.raises(DatasetPatchError):
+        ChunkedDatasetService.patch(MODULE, 1, [
+            {'op': 'rename_column', 'column': 'Likes', 'new_name': 'Platform'}
+        ], 'tester')
+
+
+def test_remove_column_across_chunks(dataset):
+    result = ChunkedDatasetService.patch(MODULE, 1, [{'op': 'remove_column', 'column': 'Likes'}], 'tester')
+
+    assert result['columns'] == ['Platform']
+    assert rows() == [{'id': f'r{i}', 'Platform': 'TikTok'} for i in range(7)]
+
+
+def test_unknown_operation_is_rejected(dataset):
+    with pytest.raises(DatasetPatchError):
+        ChunkedDatasetService.patch(MODULE, 1, [{'op': 'truncate'}], 'tester')
+
+
+def test_stale_version_conflicts(dataset):
+    ChunkedDatasetService.patch(MODULE, 1, [{'op': 'delete', 'id': 'r0'}], 'tester')
+
+    with pytest.raises(DatasetVersionConflict) as conflict:
+        ChunkedDatasetService.patch(MODULE, 1, [{'op': 'delete', 'id': 'r1'}], 'tester')
+    assert conflict.value.current_version == 2
+    assert [row['id'] for row in rows()][:1] == ['r1']
+
+
+def test_failed_patch_leaves_dataset_unchanged(db, dataset):
+    with pytest.raises(DatasetPatchError):
+        ChunkedDatasetService.patch(MODULE, 1, [
+            {'op': 'update', 'id': 'r0', 'values': {'Likes': 100}},
+            {'op': 'delete', 'id': 'missing'}
+        ], 'tester')
+
+    assert ChunkedDatasetService.get_manifest(MODULE)['version'] == 1
+    assert rows()[0]['Likes'] == 0
+    assert stored_chunk_ids(db) == set(chunk_ids(dataset))
+
+
+def test_unreferenced_chunks_are_deleted(db, dataset):
+    result = ChunkedDatasetService.patch(MODULE, 1, [
+        {'op': 'delete', 'id': 'r3'},
+        {'op': 'delete', 'id': 'r4'},
+        {'op': 'delete', 'id': 'r5'}
+    ], 'tester')
+
+    # The emptied middle chunk is dropped, nothing new is needed
+    assert result['chunks_deleted'] == 1
+    assert result['chunks_written'] == 0
+    assert stored_chunk_ids(db) == set(chunk_ids(result))
+    assert chunk_ids(result) == [chunk_ids(dataset)[0], chunk_ids(dataset)[2]]
+
+
+def test_replaced_chunks_are_deleted(db, dataset):
+    result = ChunkedDatasetService.patch(MODULE, 1, [
+        {'op': 'rename_column', 'column': 'Platform', 'new_name': 'Channel'}
+    ], 'tester')
+
+    assert result['chunks_deleted'] == 3
+    assert stored_chunk_ids(db) == set(chunk_ids(result))
+    assert not stored_chunk_ids(db) & set(chunk_ids(dataset))
+
+
+def test_manifest_hash_matches_chunks(dataset):
+    result = ChunkedDatasetService.patch(MODULE, 1, [
+        {'op': 'update', 'id': 'r6', 'values': {'Likes': 60}},
+        {'op': 'insert', 'row': {'id': 'r7', 'Platform': 'TikTok', 'Likes': 7}}
+    ], 'tester')
+
+    chunk_hashes = [ChunkedDatasetService.chunk_hash(chunk) for chunk in ChunkedDatasetService.iter_chunks(MODULE)]
+    assert result['content_hash'] == ChunkedDatasetService.content_hash(result['columns'], chunk_hashes)
+
+
+def test_old_layout_is_converted_on_patch(db, monkeypatch):
+    monkeypatch.setattr(settings, 'DATASET_CHUNK_ROWS', 3)
+    db.document(f'{MODULE}_dynamic_data/shared').set({
+        'columns': ['Platform'],
+        'rows': [{'id': f'r{i}', 'Platform': 'TikTok'} for i in range(4)]
+    })
+
+    result = ChunkedDatasetService.patch(MODULE, 0, [{'op': 'delete', 'id': 'r0'}], 'tester')
+
+    assert ChunkedDatasetService.is_chunked(result)
+    assert 'rows' not in ChunkedDatasetService.get_manifest(MODULE)
+    assert [row['id'] for row in rows()] == ['r1', 'r2', 'r3']
+
+
+def test_patch_endpoint_returns_409_for_stale_version(dataset, monkeypatch):
+    from fastapi.testclient import TestClient
+    import server
+
+    monkeypatch.setattr(server, 'check_diagnostic_permission', lambda *args: True)
+    client = TestClient(server.app)
+    headers = {'X-User-Name': 'tester', 'X-User-Role': 'superadmin'}
+    body = {'version': 1, 'operations': [{'op': 'delete', 'id': 'r0'}]}
+
+    assert client.patch(f'/api/dynamic-data/{MODULE}', json=body, headers=headers).status_code == 200
+    response = client.patch(f'/api/dynamic-data/{MODULE}', json=body, headers=headers)
+
+    assert response.status_code == 409
+    assert response.json()['detail']['current_version'] == 2
+
+
+def stored_chunk_sizes(db):
+    return [ChunkedDatasetService._rows_size(db.store[path]['rows']) for path in db.paths(CHUNKS_PREFIX)]
+
+
+def test_wide_rows_close_chunks_on_size(db, monkeypatch):
+    monkeypatch.setattr(settings, 'DATASET_CHUNK_ROWS', 250)
+    monkeypatch.setattr(settings, 'DATASET_CHUNK_BYTES', 4000)
+    wide = [{'id': f'r{i}', 'Notes': 'x' * 900} for i in range(10)]
+
+    manifest = ChunkedDatasetService.write(MODULE, ['Notes'], wide, 'tester')
+
+    # ~900 bytes a row: three rows fit next to the chunk overhead, not 250
+    assert [chunk['row_count'] for chunk in manifest['chunks']] == [3, 3, 3, 1]
+    assert max(stored_chunk_sizes(db)) <= 4000
+    assert rows() == wide
+
+
+def test_widening_update_splits_chunk(db, dataset, monkeypatch):
+    monkeypatch.setattr(settings, 'DATASET_CHUNK_BYTES', 2500)
+
+    result = ChunkedDatasetService.patch(MODULE, 1, [
+        {'op': 'update', 'id': 'r3', 'values': {'Notes': 'x' * 900}},
+        {'op': 'update', 'id': 'r4', 'values': {'Notes': 'y' * 900}}
+    ], 'tester')
+
+    assert [chunk['row_count'] for chunk in result['chunks']] == [3, 1, 2, 1]
+    assert max(stored_chunk_sizes(db)) <= 2500
+    assert [row['id'] for row in rows()] == [f'r{i}' for i in range(7)]
@@ -0,0 +1,26 @@
+"""
+DatasetIngestService._convert: cell values stored for each inferred column type
+"""
+import pytest
+
+from services.dataset_ingest_service import DatasetIngestService
+
+
+@pytest.mark.parametrize('value, expected', [
+    (3, 3),
+    (3.0, 3),
+    ('1,200', 1200),
+    (3.7, 3.7),
+    (True, 'True'),
+    ('abc', 'abc'),
+])
+def test_convert_integer_column(value, expected):
+    converted = DatasetIngestService._convert(value, 'integer')
+
+    assert converted == expected
+    assert type(converted) is type(expected)
+
+
+def test_convert_number_column_keeps_bool_as_text():
+    assert DatasetIngestService._convert(False, 'number') == 'False'
+    assert DatasetIngestService._convert('2.5', 'number') == 2.5
@@ -0,0 +1,107 @@
+"""
+FileSearchIndex matching and ranking, tombstones, and the visibility filter
+applied to fresh documents by FileSearchIndexService.search
+"""
+import pytest
+
+from services.file_search_index_service import FileSearchIndex, FileSearchIndexService
+
+
+@pytest.fixture
+def index():
+    index = FileSearchIndex()
+    for file_id, name in [
+        ('report', 'Report.pdf'),
+        ('q3', 'Q3 report final.pdf'),
+        ('exact', 'report'),
+        ('sub', 'MyReports.xlsx'),
+        ('cafe', 'Café menu.docx'),
+        ('ab', 'ab.txt'),
+    ]:
+        index.add(file_id, name)
+    return index
+
+
+def test_ranking_exact_prefix_word_substring(index):
+    assert index.ranked('report') == ['exact', 'report', 'q3', 'sub']
+
+
+def test_ranking_is_case_and_accent_insensitive(index):
+    assert index.ranked('CAFE') == ['cafe']
+    assert index.ranked('  Café ') == ['cafe']
+
+
+def test_ties_go_to_shorter_then_newer_names(index):
+    index.add('newer', 'Report.doc')
+
+    # Same rank: 'report.doc' is shorter than 'report.pdf'
+    assert index.ranked('report.')[:2] == ['newer', 'report']
+    index.add('newest', 'Report.xyz')
+    assert index.ranked('report.')[:2] == ['newest', 'newer']
+
+
+def test_count_keeps_the_best_matches(index):
+    assert index.ranked('report', count=2) == ['exact', 'report']
+
+
+def test_trigram_candidates_are_verified(index):
+    # Every trigram of 'port f' is indexed, but only one name holds the whole term
+    assert index.ranked('port f') == ['q3']
+    assert index.candidates('zzz') == []
+
+
+def test_short_terms_scan_names(index):
+    assert index.ranked('ab') == ['ab']
+    assert index.ranked('xl') == ['sub']
+    assert index.ranked('') == []
+
+
+def test_removed_files_are_tombstoned(index):
+    index.remove('report')
+
+    assert 'report' not in index.ranked('report')
+    assert 'report' not in index.ranked('re')
+    assert len(index) == 5
+    assert len(index.ids) == 6
+
+
+def test_re_adding_a_file_replaces_its_name(index):
+    index.add('sub', 'Budget.xlsx')
+
+    assert 'sub' not in index.ranked('report')
+    assert index.ranked('budget') == ['sub']
+
+
+@pytest.fixture
+def search_files(db, monkeypatch):
+    monkeypatch.setattr(FileSearchIndexService, '_index', None)
+    for i, (name, folder) in enumerate([
+        ('Plan A.pdf', 'public'), ('Plan B.pdf', 'private'), ('Plan C.pdf', 'public'), ('Other.pdf', 'public')
+    ]):
+        db.collection('sharedFiles').document(f'f{i}').set({
+            'fileName': name, 'folderID': folder, 'uploadedAt': f'2025-01-0{i + 1}T00:00:00+00:00'
+        })
+    return db
+
+
+def test_search_applies_visibility_to_fresh_documents(search_files):
+    results = FileSearchIndexService.search('plan', 10, lambda file_data: file_data['folderID'] == 'public')
+
+    assert [file_data['id'] for file_data in results] == ['f2', 'f0']
+
+
+def test_search_fills_limit_past_hidden_matches(search_files):
+    # The first ranked batch (f2, f1) is all hidden, so the rest are ranked and read
+    results = FileSearchIndexService.search('plan', 1, lambda file_data: file_data['id'] == 'f0')
+
+    assert [file_data['id'] for file_data in results] == ['f0']
+
+
+def test_search_drops_files_deleted_elsewhere(search_files):
+    FileSearchIndexService.search('plan', 10, lambda file_data: True)
+    search_files.collection('sharedFiles').document('f0').delete()
+
+    results = FileSearchIndexService.search('plan', 10, lambda file_data: True)
+
+    assert [file_data['id'] for file_data in results] == ['f2', 'f1']
+    assert 'f0' not in FileSearchIndexService._index.slot_of
@@ -0,0 +1,101 @@
+"""
+PersonaJobService lock lease: renewal ownership checks, heartbeat and
+takeover of jobs whose lease expired
+"""
+from datetime import timedelta
+
+import pytest
+
+from services.persona_job_service import (
+    PersonaJobService, PersonaJobConflict, PersonaJobLockLost, LeaseHeartbeat,
+    JOBS_COLLECTION, LOCK_DOC_PATH, CLUSTERING, FAILED
+)
+from services.persona_generation_service import GenerationCancelled
+
+
+def make_job(db, job_id, state=CLUSTERING, **fields):
+    db.collection(JOBS_COLLECTION).document(job_id).set({'job_id': job_id, 'state': state, 'cancel_requested': False, **fields})
+
+
+def hold_lock(db, job_id, seconds):
+    db.document(LOCK_DOC_PATH).set({'job_id': job_id, 'expires_at': PersonaJobService._now() + timedelta(seconds=seconds)})
+
+
+def job(db, job_id):
+    return db.collection(JOBS_COLLECTION).document(job_id).get().to_dict()
+
+
+def test_live_lease_conflicts(db):
+    hold_lock(db, 'old', 60)
+
+    with pytest.raises(PersonaJobConflict):
+        PersonaJobService._acquire_lock('new')
+
+
+def test_expired_lease_takeover_fails_previous_job(db):
+    make_job(db, 'old')
+    hold_lock(db, 'old', -1)
+
+    PersonaJobService._acquire_lock('new')
+
+    assert db.document(LOCK_DOC_PATH).get().to_dict()['job_id'] == 'new'
+    assert job(db, 'old')['state'] == FAILED
+
+
+def test_renew_extends_own_lease(db):
+    hold_lock(db, 'job', 1)
+
+    PersonaJobService._renew_lock('job')
+
+    assert db.document(LOCK_DOC_PATH).get().to_dict()['expires_at'] > PersonaJobService._now() + timedelta(seconds=60)
+
+
+def test_renew_does_not_touch_another_jobs_lock(db):
+    hold_lock(db, 'new', 1)
+    before = db.document(LOCK_DOC_PATH).get().to_dict()
+
+    with pytest.raises(PersonaJobLockLost):
+        PersonaJobService._renew_lock('old')
+    assert db.document(LOCK_DOC_PATH).get().to_dict() == before
+
+
+def test_progress_aborts_after_lock_taken_over(db):
+    make_job(db, 'old')
+    hold_lock(db, 'new', 60)
+    report = PersonaJobService._progress_callback('old', LeaseHeartbeat('old'))
+
+    # Even the non-cancellable writing checkpoints stop
+    with pytest.raises(PersonaJobLockLost):
+        report('writing', 0.8, cancellable=False)
+
+
+def test_progress_raises_lost_lock_seen_by_heartbeat(db):
+    make_job(db, 'job')
+    hold_lock(db, 'job', 60)
+    heartbeat = LeaseHeartbeat('job')
+    heartbeat.lost = PersonaJobLockLost('job')
+
+    with pytest.raises(PersonaJobLockLost):
+        PersonaJobService._progress_callback('job', heartbeat)('writing', 0.6)
+
+
+def test_progress_honours_cancellation(db):
+    make_job(db, 'job', cancel_requested=True)
+    hold_lock(db, 'job', 60)
+
+    with pytest.raises(GenerationCancelled):
+        PersonaJobService._progress_callback('job', LeaseHeartbeat('job'))('writing', 0.6)
+
+
+def test_get_job_fails_job_with_expired_lease(db):
+    make_job(db, 'job')
+    hold_lock(db, 'job', -1)
+
+    assert PersonaJobService.get_job('job')['state'] == FAILED
+
+
+def test_get_job_leaves_running_job(db):
+    make_job(db, 'job')
+    hold_lock(db, 'job', 60)
+
+    assert PersonaJobService.get_job('job')['state'] == CLUSTERING
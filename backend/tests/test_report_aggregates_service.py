@@ -0,0 +1,90 @@
+"""
+ReportAggregatesService: per-insight deltas summed (as the increments do) give
+the same report as a full scan, deletes cancel creates, and reads never write
+"""
+import pytest
+
+from benchmarks.synthetic import make_insights
+from counter_utils import add_nested
+from services.insight_matrix_service import InsightMatrix
+from services.report_aggregates_service import ReportAggregatesService
+from services.scoring_service import ScoringService
+
+
+def summed(insights, sign=1):
+    aggregates = {}
+    for insight in insights:
+        add_nested(aggregates, ReportAggregatesService.compute_deltas(insight, sign))
+    return aggregates
+
+
+def test_compute_deltas_for_one_insight():
+    deltas = ReportAggregatesService.compute_deltas({
+        'purchase_intent': 45,
+        'influencer_effect': 100,
+        'platform': '',
+        'motivations': [{'name': 'Shade match', 'strength': 80}],
+        'pains': [],
+        'channels': ['TikTok', 'TikTok'],
+        'age_group': '18-24'
+    }, sign=-1)
+
+    assert deltas['total_insights'] == -1
+    assert deltas['purchase_intent_sum'] == -45
+    assert deltas['intent_distribution'] == {'40-60': -1}
+    assert deltas['influence_distribution'] == {'100-120': -1}
+    # Empty map keys fall back to a default; empty maps are dropped
+    assert deltas['platform_counts'] == {'Other': -1}
+    assert deltas['motivations'] == {'Shade match': {'strength_sum': -80, 'count': -1}}
+    assert 'pains' not in deltas
+    assert deltas['channel_counts'] == {'TikTok': -2}
+    assert deltas['demographics']['age_groups'] == {'18-24': -1}
+    assert deltas['demographics']['genders'] == {'Unknown': -1}
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_summed_deltas_match_full_scan(seed):
+    insights = make_insights(300, seed=seed)
+
+    aggregates = summed(insights)
+
+    assert aggregates == ReportAggregatesService.compute_from_insights(insights)
+    assert ReportAggregatesService.to_raw_scores(aggregates) == \
+        ScoringService.compute_raw_scores(InsightMatrix.from_insights(insights))
+
+
+def test_deletes_cancel_creates():
+    insights = make_insights(50, seed=3)
+    aggregates = summed(insights)
+
+    add_nested(aggregates, summed(insights[:20], sign=-1))
+
+    assert ReportAggregatesService.to_raw_scores(aggregates) == \
+        ReportAggregatesService.to_raw_scores(summed(insights[20:]))
+
+
+def test_to_raw_scores_of_empty_aggregates():
+    assert ReportAggregatesService.to_raw_scores({}) == {}
+    assert ReportAggregatesService.to_raw_scores(summed(make_insights(5), sign=0)) == {}
+
+
+def test_get_raw_scores_scans_until_rebuilt_without_writing(db):
+    insights = make_insights(10, seed=4)
+    for insight in insights[:9]:
+        db.collection('insights').document(insight['id']).set(insight)
+    # Only the last insight went through the increments
+    db.collection('insights').document(insights[9]['id']).set(insights[9])
+    batch = db.batch()
+    ReportAggregatesService.apply_insight(batch, insights[9])
+    batch.commit()
+    stored = ReportAggregatesService.get_aggregates()
+
+    assert ReportAggregatesService.get_raw_scores()['total_insights'] == 10
+    assert ReportAggregatesService.get_aggregates() == stored
+
+    ReportAggregatesService.rebuild()
+    batch = db.batch()
+    ReportAggregatesService.apply_insight(batch, insights[0], sign=-1)
+    batch.commit()
+
+    assert ReportAggregatesService.get_raw_scores()['total_insights'] == 9
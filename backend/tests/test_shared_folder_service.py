@@ -0,0 +1,114 @@
+"""
+Folder fileCount/totalSize counters kept by file create, delete and move,
+and reconcile_counters for drifted or legacy (counter-less) folders
+"""
+import pytest
+
+from services.shared_files_service import SharedFilesService
+from services.shared_folder_service import SharedFolderService
+
+
+@pytest.fixture
+def folders(db):
+    db.collection('folders').document('a').set({'id': 'a', 'name': 'A', 'fileCount': 0, 'totalSize': 0})
+    db.collection('folders').document('b').set({'id': 'b', 'name': 'B', 'fileCount': 0, 'totalSize': 0})
+    # Created before counters were maintained
+    db.collection('folders').document('legacy').set({'id': 'legacy', 'name': 'Legacy'})
+
+
+def upload(folder_id, size, uploader='u1'):
+    return SharedFilesService.create_file(folder_id, f'{folder_id}-{size}.pdf', 'pdf', size, 'url', 'pdf', uploader, 'User')
+
+
+def counters(db, folder_id):
+    data = db.collection('folders').document(folder_id).get().to_dict()
+    return data.get('fileCount'), data.get('totalSize')
+
+
+def test_create_increments_folder(db, folders):
+    upload('a', 100)
+    upload('a', 50)
+
+    assert counters(db, 'a') == (2, 150)
+    assert counters(db, 'b') == (0, 0)
+
+
+def test_delete_decrements_folder(db, folders):
+    kept = upload('a', 100)
+    removed = upload('a', 50)
+
+    SharedFilesService.delete_file(removed['id'], 'u1', is_superadmin=False)
+
+    assert counters(db, 'a') == (1, 100)
+    assert SharedFilesService.get_file_by_id(kept['id']) is not None
+
+
+def test_delete_by_other_user_leaves_counters(db, folders):
+    file_data = upload('a', 100)
+
+    with pytest.raises(PermissionError):
+        SharedFilesService.delete_file(file_data['id'], 'u2', is_superadmin=False)
+    assert counters(db, 'a') == (1, 100)
+
+
+def test_move_shifts_counters(db, folders):
+    file_data = upload('a', 100)
+    upload('a', 30)
+
+    SharedFilesService.move_file(file_data['id'], 'b')
+
+    assert counters(db, 'a') == (1, 30)
+    assert counters(db, 'b') == (1, 100)
+
+
+def test_move_to_same_folder_is_a_no_op(db, folders):
+    file_data = upload('a', 100)
+
+    SharedFilesService.move_file(file_data['id'], 'a')
+
+    assert counters(db, 'a') == (1, 100)
+
+
+def test_legacy_folder_is_not_seeded_by_increments(db, folders):
+    file_data = upload('legacy', 100)
+    SharedFilesService.move_file(file_data['id'], 'a')
+    upload('legacy', 40)
+
+    # An Increment would have started the counters from these writes alone
+    assert counters(db, 'legacy') == (None, None)
+    assert counters(db, 'a') == (1, 100)
+    # Reads count the folder's files until it is reconciled
+    legacy = db.collection('folders').document('legacy').get().to_dict()
+    assert SharedFolderService._with_counters(legacy)['fileCount'] == 1
+
+
+def test_reconcile_seeds_legacy_and_repairs_drift(db, folders):
+    upload('legacy', 100)
+    upload('legacy', 20)
+    upload('a', 50)
+    db.collection('folders').document('a').update({'fileCount': 7})
+
+    report = SharedFolderService.reconcile_counters(apply=False)
+
+    assert not report['in_sync']
+    assert {(m['folder_id'], m['field']) for m in report['mismatches']} == {
+        ('legacy', 'fileCount'), ('legacy', 'totalSize'), ('a', 'fileCount')
+    }
+    assert counters(db, 'legacy') == (None, None)
+
+    report = SharedFolderService.reconcile_counters()
+
+    assert report['repaired'] == 2
+    assert counters(db, 'legacy') == (2, 120)
+    assert counters(db, 'a') == (1, 50)
+    assert SharedFolderService.reconcile_counters(apply=False)['in_sync']
+
+
+def test_reconcile_reports_orphaned_files(db, folders):
+    upload('missing', 10)
+
+    report = SharedFolderService.reconcile_counters(apply=False)
+
+    assert report['orphaned_files'] == 1
+    # Only the legacy folder (no counters yet) differs
+    assert {m['folder_id'] for m in report['mismatches']} == {'legacy'}